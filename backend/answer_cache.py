@@ -0,0 +1,281 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import delete, func, or_, select
+
+from backend.config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_SYNC_SECONDS,
+)
+from backend.coordination import worker_id
+from backend.database import session_scope
+from backend.models import AnswerCacheInvalidation
+
+logger = logging.getLogger("AnswerCache")
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    return _SPACE_RE.sub(" ", question).strip().lower().rstrip("?!. ")
+
+
+def question_hash(question: str) -> str:
+    return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+
+# Scopes that span several files; any re-embed invalidates all of them.
+MULTI_SCOPE_PREFIX = "multi:"
+
+
+def scope_key(file_ids, params=""):
+    """
+    Cache scope for a retrieval over file_ids (None = every file).
+    A single file with default retrieval params is scoped by its file_id.
+    """
+    if file_ids is not None and len(file_ids) == 1 and not params:
+        return file_ids[0]
+    files = "*" if file_ids is None else ",".join(sorted(file_ids))
+    digest = hashlib.sha256(f"{files}|{params}".encode("utf-8")).hexdigest()[:16]
+    return MULTI_SCOPE_PREFIX + digest
+
+
+class _Entry:
+    __slots__ = ("question", "embedding", "answer", "created_at")
+
+    def __init__(self, question, embedding, answer):
+        self.question = question
+        self.embedding = embedding
+        self.answer = answer
+        self.created_at = time.monotonic()
+
+
+class AnswerCache:
+    """
+    In-memory answer cache scoped per file_id (or per set of files, see
+    scope_key).
+    Exact repeats match on the normalized question hash (no embedding call
+    needed); near-duplicates match when the cosine similarity of the query
+    embeddings reaches `similarity`. Entries expire after ttl seconds and the
+    least recently used entry is evicted once max_entries is reached.
+    """
+
+    def __init__(
+        self,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        ttl=ANSWER_CACHE_TTL_SECONDS,
+        similarity=ANSWER_CACHE_SIMILARITY,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # (scope, qhash) -> _Entry, in LRU order
+        self._by_scope = {}  # scope -> set of qhash
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _expired(self, entry):
+        return self.ttl > 0 and time.monotonic() - entry.created_at > self.ttl
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_scope.get(key[0])
+        if keys is not None:
+            keys.discard(key[1])
+            if not keys:
+                del self._by_scope[key[0]]
+
+    def get_exact(self, scope, question):
+        key = (scope, question_hash(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.answer
+
+    def get_similar(self, scope, embedding):
+        """Best cached answer in scope whose question is close enough, else None."""
+        query = _unit(embedding)
+        with self._lock:
+            best_key, best_score = None, self.similarity
+            for qhash in list(self._by_scope.get(scope, ())):
+                key = (scope, qhash)
+                entry = self._entries[key]
+                if self._expired(entry):
+                    self._remove(key)
+                    continue
+                if entry.embedding is None or entry.embedding.shape != query.shape:
+                    continue
+                score = float(np.dot(entry.embedding, query))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            return self._entries[best_key].answer
+
+    def record_miss(self):
+        """
+        Counts one lookup that neither get_exact nor get_similar answered.
+        Callers record it once per question, so lexical-mode queries (exact
+        lookup only) and semantic fallbacks both count exactly once.
+        """
+        with self._lock:
+            self.misses += 1
+
+    def put(self, scope, question, embedding, answer):
+        key = (scope, question_hash(question))
+        entry = _Entry(question, _unit(embedding) if embedding is not None else None, answer)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._by_scope.setdefault(scope, set()).add(key[1])
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate(self, file_id):
+        """
+        Drops every cached answer for file_id, plus every multi-file scope
+        (called after re-embedding).
+        """
+        dropped = 0
+        with self._lock:
+            scopes = [file_id] + [s for s in self._by_scope if s.startswith(MULTI_SCOPE_PREFIX)]
+            for scope in scopes:
+                keys = self._by_scope.pop(scope, set())
+                for qhash in keys:
+                    self._entries.pop((scope, qhash), None)
+                dropped += len(keys)
+            if dropped:
+                self.invalidations += 1
+        if dropped:
+            logger.info(f"🧹 Invalidated {dropped} cached answers for {file_id}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "scopes": len(self._by_scope),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "similarity_threshold": self.similarity,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _unit(vector):
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(arr)
+    return arr / norm if norm else arr
+
+
+_cache = AnswerCache()
+
+
+def get_answer_cache():
+    return _cache
+
+
+# ---------------- Invalidation across processes ----------------
+
+# log rows older than this are pruned; a worker that hasn't polled for
+# this long has bigger problems than a stale answer
+_LOG_RETENTION_SECONDS = 3600
+_PRUNE_EVERY_SECONDS = 600
+# ids are handed out before commit, so on a server database a lower id can
+# become visible after a higher one; rows this recent are read again
+_REORDER_SLACK_SECONDS = 30
+
+
+def publish_invalidation(db, file_id):
+    """
+    Logs that file_id's answers are stale, in the caller's transaction, so
+    every other worker (and the API, after a bulk ingest) drops them too.
+    The local cache is invalidated separately, right away.
+    """
+    db.add(AnswerCacheInvalidation(file_id=file_id, worker=worker_id(), created_at=time.time()))
+
+
+class InvalidationListener:
+    """Applies invalidations logged by other processes to this process's cache."""
+
+    def __init__(self, cache=None, interval=ANSWER_CACHE_SYNC_SECONDS):
+        self.cache = cache or _cache
+        self.interval = interval
+        self.last_id = None
+        self._recent = {}  # id -> created_at of rows inside the reorder slack
+        self._last_prune = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """One sync round; returns the number of invalidations applied."""
+        with session_scope() as db:
+            if self.last_id is None:
+                # answers cached before this process started don't exist
+                self.last_id = db.scalar(select(func.max(AnswerCacheInvalidation.id))) or 0
+                return 0
+            horizon = time.time() - _REORDER_SLACK_SECONDS
+            rows = db.execute(
+                select(AnswerCacheInvalidation.id, AnswerCacheInvalidation.file_id,
+                       AnswerCacheInvalidation.worker, AnswerCacheInvalidation.created_at)
+                .where(or_(AnswerCacheInvalidation.id > self.last_id, AnswerCacheInvalidation.created_at > horizon))
+                .order_by(AnswerCacheInvalidation.id)
+            ).all()
+
+            if time.monotonic() - self._last_prune > _PRUNE_EVERY_SECONDS:
+                self._last_prune = time.monotonic()
+                db.execute(delete(AnswerCacheInvalidation)
+                           .where(AnswerCacheInvalidation.created_at < time.time() - _LOG_RETENTION_SECONDS))
+                db.commit()
+
+        me = worker_id()
+        fresh = [row for row in rows if row[0] not in self._recent]
+        file_ids = {file_id for _, file_id, worker, _ in fresh if worker != me}
+        for file_id in file_ids:
+            self.cache.invalidate(file_id)
+
+        self._recent.update((row_id, created_at) for row_id, _, _, created_at in fresh)
+        self._recent = {row_id: t for row_id, t in self._recent.items() if t > horizon}
+        if rows:
+            self.last_id = max(self.last_id, rows[-1][0])
+        return len(file_ids)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("❌ Answer-cache invalidation sync failed")
+
+    def start(self):
+        self.poll()
+        self._thread = threading.Thread(target=self._run, name="answer-cache-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
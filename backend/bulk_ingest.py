@@ -0,0 +1,446 @@
+"""
+Loads a directory of PDFs straight into the library, without HTTP.
+
+    python -m backend.bulk_ingest /data/customer_pdfs
+    python -m backend.bulk_ingest /data/customer_pdfs --dry-run         # plan only, ingests nothing
+    python -m backend.bulk_ingest /data/customer_pdfs --fake-embedder --scratch-dir /tmp/bench   # offline benchmark
+
+Files are hashed and matched against file_info, so duplicates and
+documents already embedded are skipped. PDFs are extracted on a process
+pool, one document per worker; extracted pages are chunked and embedded in
+large cross-document groups, then stored through embed_file, which finds
+every vector in the embedding cache. Progress is checkpointed by the same
+state the API uses: a file_info row once the PDF is copied, num_pages plus
+the extracted .jsonl once it is extracted, embedding_status once it is
+embedded. Re-running the command resumes where an interrupted run stopped.
+It may run next to the API: writes take the same per-file locks in
+LOCK_DIR, and the API's workers drop cached answers for re-embedded files.
+
+Documents that fail (unreadable PDF, a row that can't be stored, an
+embedding error) are appended to --failures-file and counted in the
+progress lines; a re-run retries them.
+
+--dry-run only reads: it neither creates nor migrates tables.
+
+--fake-embedder writes fake vectors and marks documents embedded, and the
+API would later dedupe real uploads against them. It is refused unless
+--scratch-dir is given and the SQLite DATABASE_URL, UPLOAD_DIR,
+EXTRACT_DIR, LEXICAL_INDEX_DIR and the vector store (CHROMA_PATH or
+LOCAL_INDEX_DIR) all live inside it.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+
+from backend.chunking import chunk_pages, get_chunker
+from backend import rate_limit
+from backend.clients import registry
+from backend.coordination import file_lock, startup_lock
+from backend.config import (
+    setup_logging,
+    BULK_INGEST_RATE_SHARE,
+    CHROMA_HOST,
+    CHROMA_PATH,
+    EMBED_BATCH_SIZE,
+    EMBED_CACHE_ENABLED,
+    EMBED_MAX_CONCURRENCY,
+    EXTRACT_WORKERS,
+    LEXICAL_INDEX_DIR,
+    LOCAL_INDEX_DIR,
+    VECTOR_BACKEND,
+)
+from backend.database import DATABASE_URL, Base, engine, ensure_schema, session_scope
+from backend.embedder import FakeEmbedder, embed_texts, get_embedder
+from backend.library import bump_version, init_library_state
+from backend.models import FileInfo
+from backend.pdf_extract import PdfUnreadableError, extract_pages, read_pages, write_pages
+from backend.routers.embed import EXTRACT_DIR, UPLOAD_DIR, embed_file
+
+logger = logging.getLogger("BulkIngest")
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def find_pdfs(root):
+    paths = []
+    for dirpath, _, names in os.walk(root):
+        paths.extend(os.path.join(dirpath, n) for n in names if n.lower().endswith(".pdf"))
+    return sorted(paths)
+
+
+def _extract_worker(file_id, pdf_path):
+    """Runs in the process pool: one whole document per worker."""
+    try:
+        return file_id, extract_pages(pdf_path, workers=1), None
+    except PdfUnreadableError:
+        return file_id, None, "PDF is encrypted or unreadable"
+    except Exception as e:
+        return file_id, None, f"Extraction failed: {e}"
+
+
+class Progress:
+    """docs/sec, chunks/sec and ETA, printed at most every `interval` seconds."""
+
+    def __init__(self, total, interval=5.0):
+        self.total = total
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.last = 0.0
+        self.docs = 0
+        self.chunks = 0
+        self.failed = 0
+
+    def update(self, docs=0, chunks=0, failed=0, force=False):
+        self.docs += docs
+        self.chunks += chunks
+        self.failed += failed
+        now = time.perf_counter()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+        elapsed = max(now - self.start, 1e-9)
+        finished = self.docs + self.failed
+        docs_rate = self.docs / elapsed
+        eta = (self.total - finished) / (finished / elapsed) if finished else float("inf")
+        logger.info(
+            f"📈 {finished}/{self.total} docs ({self.failed} failed) | {docs_rate:.2f} docs/s | "
+            f"{self.chunks / elapsed:.1f} chunks/s | ETA {_fmt_eta(eta)}"
+        )
+
+
+def _fmt_eta(seconds):
+    if seconds == float("inf"):
+        return "?"
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{secs:02d}s" if hours else f"{minutes}m{secs:02d}s"
+
+
+# ---------------- Plan ----------------
+
+def _library_readable():
+    inspector = inspect(engine)
+    if not inspector.has_table(FileInfo.__tablename__):
+        return False
+    columns = {c["name"] for c in inspector.get_columns(FileInfo.__tablename__)}
+    return "content_hash" in columns
+
+
+def plan(paths, hash_workers):
+    """
+    Classifies every PDF by its checkpoint:
+      done      already embedded
+      embed     extracted (num_pages and .jsonl present), not embedded
+      extract   known file, text missing
+      new       content not in the library yet
+    Duplicate content inside the directory is planned once.
+    """
+    with ThreadPoolExecutor(max_workers=hash_workers) as pool:
+        hashes = list(pool.map(file_sha256, paths))
+
+    by_hash = {}
+    for path, content_hash in zip(paths, hashes):
+        by_hash.setdefault(content_hash, path)
+
+    known = {}
+    all_hashes = list(by_hash)
+    if not _library_readable():
+        # fresh or not yet migrated database (dry run): nothing is known yet
+        all_hashes = []
+    with session_scope() as db:
+        # IN lists in slices, well under SQLite's bound-parameter limit
+        for i in range(0, len(all_hashes), 500):
+            rows = db.query(FileInfo.content_hash, FileInfo.file_id, FileInfo.num_pages, FileInfo.embedding_status) \
+                .filter(FileInfo.content_hash.in_(all_hashes[i:i + 500]))
+            known.update((row.content_hash, (row.file_id, row.num_pages, row.embedding_status)) for row in rows)
+
+    steps = {"done": [], "embed": [], "extract": [], "new": []}
+    for content_hash, path in by_hash.items():
+        if content_hash not in known:
+            steps["new"].append((None, path, content_hash))
+            continue
+        file_id, num_pages, embedded = known[content_hash]
+        if embedded:
+            steps["done"].append((file_id, path, content_hash))
+        elif num_pages and os.path.exists(os.path.join(EXTRACT_DIR, f"{file_id}.jsonl")):
+            steps["embed"].append((file_id, path, content_hash))
+        else:
+            steps["extract"].append((file_id, path, content_hash))
+    return steps, len(paths) - len(by_hash)
+
+
+# ---------------- Checkpoints ----------------
+
+def record_failure(args, path, file_id, error):
+    """Appends one failed document to the failures file (a JSON line each)."""
+    logger.error(f"❌ {path}: {error}")
+    if not args.failures_file:
+        return
+    with open(args.failures_file, "a", encoding="utf-8") as out:
+        out.write(json.dumps({"path": path, "file_id": file_id, "error": error,
+                              "at": datetime.utcnow().isoformat()}) + "\n")
+
+
+def register_file(path, content_hash):
+    """
+    Copies the PDF into UPLOAD_DIR and records it. Returns (file_id, None),
+    or (None, error) when the row can't be stored; the copy is removed then.
+    If another process recorded the same bytes meanwhile, its file_id is used.
+    """
+    file_id = str(uuid.uuid4())
+    stored = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
+    tmp_path = os.path.join(UPLOAD_DIR, f"{file_id}.part")
+    shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, stored)
+    with session_scope() as db:
+        db.add(FileInfo(
+            file_id=file_id,
+            file_name=os.path.basename(path),
+            uploaded_at=datetime.utcnow().isoformat(),
+            embedding_status=False,
+            content_hash=content_hash,
+            file_size=os.path.getsize(path),
+        ))
+        bump_version(db)
+        try:
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            os.remove(stored)
+            owner = db.query(FileInfo.file_id).filter(FileInfo.content_hash == content_hash).first()
+            if owner:
+                return owner.file_id, None
+            return None, f"Could not record the file: {e.orig}"
+    return file_id, None
+
+
+def ensure_pdf(file_id, path):
+    """Puts the source PDF back if an earlier run or a delete removed the stored copy."""
+    stored = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
+    if not os.path.exists(stored):
+        shutil.copyfile(path, stored)
+    return stored
+
+
+def record_extraction(file_id, pages):
+    # the .jsonl only appears complete, so a crash mid-write is re-extracted
+    path = os.path.join(EXTRACT_DIR, f"{file_id}.jsonl")
+    with file_lock(file_id):
+        write_pages(f"{path}.part", pages)
+        os.replace(f"{path}.part", path)
+    with session_scope() as db:
+        record = db.get(FileInfo, file_id)
+        if record is not None:
+            record.num_pages = len(pages)
+            db.commit()
+
+
+# ---------------- Embedding ----------------
+
+def chunk_texts(pages):
+    """Same chunks embed_file will produce for these pages."""
+    return [c.text for c in chunk_pages(enumerate(pages, start=1), get_chunker())]
+
+
+def embed_group(group, args, progress):
+    """
+    group: [(file_id, path, chunk texts)]. Embeds every chunk of the group in
+    one large batched run (filling the embedding cache), then lets
+    embed_file store each document, which now resolves all its vectors from
+    the cache.
+    """
+    texts = [text for _, _, texts in group for text in texts]
+    try:
+        embed_texts(texts, batch_size=args.batch_size, max_concurrency=args.embed_concurrency, key="bulk")
+    except Exception as e:
+        # can't tell which document broke the shared run: embed_file below
+        # embeds each one on its own (cached vectors are kept) and records
+        # the ones that still fail
+        logger.warning(f"⚠️ Group embedding of {len(group)} documents failed ({e}), embedding them one by one")
+
+    for file_id, path, _ in group:
+        try:
+            result = embed_file(file_id)
+        except HTTPException as e:
+            record_failure(args, path, file_id, str(e.detail))
+            progress.update(failed=1)
+            continue
+        except Exception as e:
+            record_failure(args, path, file_id, f"Embedding failed: {e}")
+            progress.update(failed=1)
+            continue
+        progress.update(docs=1, chunks=result["total_chunks"])
+
+
+def _load_pages(file_id):
+    return [text for _, text in read_pages(os.path.join(EXTRACT_DIR, f"{file_id}.jsonl"))]
+
+
+def run(args):
+    paths = find_pdfs(args.directory)
+    steps, duplicates = plan(paths, args.hash_workers)
+    logger.info(
+        f"🗂️ {len(paths)} PDFs: {len(steps['new'])} new, {len(steps['extract'])} to extract, "
+        f"{len(steps['embed'])} to embed, {len(steps['done'])} already done, {duplicates} duplicates"
+    )
+    if args.dry_run:
+        return steps
+
+    todo = steps["new"] + steps["extract"] + steps["embed"]
+    progress = Progress(len(todo), args.progress_interval)
+    group, group_chunks = [], 0
+
+    def add_to_group(file_id, path, pages):
+        nonlocal group, group_chunks
+        texts = chunk_texts(pages)
+        group.append((file_id, path, texts))
+        group_chunks += len(texts)
+        if group_chunks >= args.group_chunks:
+            embed_group(group, args, progress)
+            group, group_chunks = [], 0
+
+    # already extracted: straight to embedding
+    for file_id, path, _ in steps["embed"]:
+        add_to_group(file_id, path, _load_pages(file_id))
+
+    to_extract = [(file_id, path, h) for file_id, path, h in steps["extract"]] + steps["new"]
+    pending = iter(to_extract)
+    in_flight = {}
+    # spawn: the pool must not inherit this process's DB connections and threads
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        def submit_next():
+            for file_id, path, content_hash in pending:
+                if file_id is None:
+                    file_id, error = register_file(path, content_hash)
+                    if error:
+                        record_failure(args, path, None, error)
+                        progress.update(failed=1)
+                        continue
+                pdf_path = ensure_pdf(file_id, path)
+                in_flight[pool.submit(_extract_worker, file_id, pdf_path)] = (file_id, path)
+                return True
+            return False
+
+        # bounded look-ahead keeps extracted-but-not-embedded pages in check
+        while len(in_flight) < args.workers * 2 and submit_next():
+            pass
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                _, path = in_flight.pop(future)
+                file_id, pages, error = future.result()
+                if error or not pages:
+                    record_failure(args, path, file_id, error or "PDF has no pages")
+                    progress.update(failed=1)
+                else:
+                    record_extraction(file_id, pages)
+                    add_to_group(file_id, path, pages)
+                submit_next()
+
+    if group:
+        embed_group(group, args, progress)
+    progress.update(force=True)
+    return steps
+
+
+def outside_scratch(scratch_dir):
+    """Settings that would let --fake-embedder write outside scratch_dir."""
+    root = os.path.realpath(scratch_dir)
+
+    def inside(path):
+        return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+    url = make_url(DATABASE_URL)
+    problems = []
+    if url.get_backend_name() != "sqlite":
+        problems.append("DATABASE_URL (must be SQLite)")
+    elif url.database and url.database != ":memory:" and not inside(url.database):
+        problems.append("DATABASE_URL")
+    locations = {"UPLOAD_DIR": UPLOAD_DIR, "EXTRACT_DIR": EXTRACT_DIR, "LEXICAL_INDEX_DIR": LEXICAL_INDEX_DIR}
+    if VECTOR_BACKEND == "local":
+        locations["LOCAL_INDEX_DIR"] = LOCAL_INDEX_DIR
+    elif CHROMA_HOST:
+        problems.append("CHROMA_HOST (a shared server)")
+    else:
+        locations["CHROMA_PATH"] = CHROMA_PATH
+    problems.extend(name for name, path in locations.items() if not path or not inside(path))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", help="directory searched recursively for *.pdf")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be done")
+    parser.add_argument("--fake-embedder", action="store_true", help="deterministic offline embedder")
+    parser.add_argument("--scratch-dir", help="with --fake-embedder: directory every data location must be in")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="extraction processes")
+    parser.add_argument("--hash-workers", type=int, default=8)
+    parser.add_argument("--group-chunks", type=int, default=2048,
+                        help="chunks embedded together across documents")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--embed-concurrency", type=int, default=EMBED_MAX_CONCURRENCY)
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument("--rate-share", type=float, default=BULK_INGEST_RATE_SHARE,
+                        help="part of each rate limit this run may use while the API runs "
+                             "(start the API with the same BULK_INGEST_RATE_SHARE); 0 = whole quota")
+    parser.add_argument("--failures-file", default="bulk_ingest_failures.jsonl",
+                        help="failed documents are appended here ('' to only log them)")
+    args = parser.parse_args()
+    if not 0 <= args.rate_share < 1:
+        parser.error("--rate-share must be at least 0 and below 1")
+    if not EMBED_CACHE_ENABLED and not args.dry_run:
+        # embed_file would re-embed every document on its own, one small run each
+        parser.error("cross-document embedding goes through the embedding cache; set EMBED_CACHE_ENABLED=true")
+    if args.fake_embedder and not args.dry_run:
+        # fake vectors in the real library would be served, and deduped against, forever
+        if not args.scratch_dir:
+            parser.error("--fake-embedder needs --scratch-dir holding the DB and every store")
+        problems = outside_scratch(args.scratch_dir)
+        if problems:
+            parser.error(f"--fake-embedder: not inside {args.scratch_dir}: {', '.join(problems)}")
+
+    setup_logging()
+    rate_limit.use_bulk_ingest_share(args.rate_share)
+    if args.fake_embedder:
+        registry.register("embedder", FakeEmbedder)
+    if not args.dry_run:
+        # a dry run only reads; it must not create or migrate tables
+        with startup_lock():
+            Base.metadata.create_all(bind=engine)
+            ensure_schema()
+            init_library_state()
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        os.makedirs(EXTRACT_DIR, exist_ok=True)
+        logger.info(f"🧩 Embedding with {get_embedder().model_name}")
+
+    start = time.perf_counter()
+    run(args)
+    logger.info(f"🏁 Bulk ingest finished in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
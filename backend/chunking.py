@@ -0,0 +1,175 @@
+import re
+from dataclasses import dataclass
+
+from backend.config import (
+    CHUNK_STRATEGY,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+)
+
+STRATEGIES = ("fixed", "sentence", "tokens")
+
+# Rough stand-in for a model tokenizer: words (long ones split every 16
+# characters) and individual punctuation marks.
+TOKEN_RE = re.compile(r"\w{1,16}|[^\w\s]")
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text: str) -> int:
+    return len(TOKEN_RE.findall(text))
+
+
+@dataclass
+class Chunk:
+    text: str
+    page: int
+    start: int  # character offset within the page
+    end: int
+
+
+class Chunker:
+    """Splits one page of text into (start, end) character spans."""
+
+    name = ""
+
+    def spans(self, text):
+        raise NotImplementedError
+
+    def chunk_page(self, page, text):
+        for start, end in self.spans(text):
+            piece = text[start:end]
+            if piece.strip():
+                yield Chunk(piece, page, start, end)
+
+
+class FixedWindowChunker(Chunker):
+    """Fixed character windows with overlap (the original behaviour)."""
+
+    name = "fixed"
+
+    def __init__(self, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be >= 0 and smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def spans(self, text):
+        start = 0
+        while start < len(text):
+            end = min(start + self.chunk_size, len(text))
+            yield start, end
+            if end == len(text):
+                break
+            start = end - self.overlap
+
+
+class SentenceChunker(Chunker):
+    """
+    Packs whole sentences (and short paragraphs) into chunks of at most
+    max_chars, so a chunk only ever breaks between sentences. The last
+    overlap_sentences sentences of a chunk are repeated at the start of the
+    next one when they belong to the same paragraph. Sentences longer than
+    max_chars fall back to fixed windows.
+    """
+
+    name = "sentence"
+
+    def __init__(self, max_chars=CHUNK_SIZE, overlap_sentences=1):
+        if max_chars <= 0:
+            raise ValueError("max_chars must be positive")
+        if overlap_sentences < 0:
+            raise ValueError("overlap_sentences must be >= 0")
+        self.max_chars = max_chars
+        self.overlap_sentences = overlap_sentences
+        self._fallback = FixedWindowChunker(max_chars, min(CHUNK_OVERLAP, max_chars // 4))
+
+    def _sentences(self, text):
+        """Yields (start, end, paragraph_no) for every sentence."""
+        para_start = 0
+        paragraphs = [(m.start(), m.end()) for m in PARAGRAPH_RE.finditer(text)]
+        bounds = []
+        for sep_start, sep_end in paragraphs:
+            bounds.append((para_start, sep_start))
+            para_start = sep_end
+        bounds.append((para_start, len(text)))
+
+        for para_no, (p_start, p_end) in enumerate(bounds):
+            sent_start = p_start
+            for m in SENTENCE_END_RE.finditer(text, p_start, p_end):
+                yield sent_start, m.start(), para_no
+                sent_start = m.end()
+            if sent_start < p_end:
+                yield sent_start, p_end, para_no
+
+    def spans(self, text):
+        window = []  # sentences of the chunk being built
+        for start, end, para in self._sentences(text):
+            if end - start > self.max_chars:
+                if window:
+                    yield window[0][0], window[-1][1]
+                    window = []
+                for s, e in self._fallback.spans(text[start:end]):
+                    yield start + s, start + e
+                continue
+
+            if window and end - window[0][0] > self.max_chars:
+                yield window[0][0], window[-1][1]
+                carry = window[-self.overlap_sentences:] if self.overlap_sentences else []
+                # overlap never crosses a paragraph or overflows the budget
+                window = [
+                    s for s in carry
+                    if s[2] == para and end - s[0] <= self.max_chars and s != window[0]
+                ]
+            window.append((start, end, para))
+        if window:
+            yield window[0][0], window[-1][1]
+
+
+class TokenBudgetChunker(Chunker):
+    """Chunks of at most max_tokens approximate tokens, overlapping by overlap_tokens."""
+
+    name = "tokens"
+
+    def __init__(self, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be >= 0 and smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def spans(self, text):
+        tokens = [(m.start(), m.end()) for m in TOKEN_RE.finditer(text)]
+        step = self.max_tokens - self.overlap_tokens
+        i = 0
+        while i < len(tokens):
+            window = tokens[i:i + self.max_tokens]
+            yield window[0][0], window[-1][1]
+            if i + self.max_tokens >= len(tokens):
+                break
+            i += step
+
+
+def get_chunker(strategy=CHUNK_STRATEGY, **kwargs):
+    if strategy == "fixed":
+        return FixedWindowChunker(**kwargs)
+    if strategy == "sentence":
+        return SentenceChunker(**kwargs)
+    if strategy == "tokens":
+        return TokenBudgetChunker(**kwargs)
+    raise ValueError(f"Unknown chunking strategy: {strategy}")
+
+
+def chunk_pages(pages, chunker=None):
+    """
+    Streams chunks from an iterable of (page_number, text).
+    Only one page is held in memory at a time; chunks never span pages.
+    """
+    chunker = chunker or get_chunker()
+    for page, text in pages:
+        yield from chunker.chunk_page(page, text)
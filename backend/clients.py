@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger("Clients")
+
+
+class ClientRegistry:
+    """
+    Process-wide home of the heavy clients (vector store, embedder, chat
+    model). Each is built by its registered factory on first use, once, and
+    shared afterwards; nothing is constructed at import time.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._init_seconds = {}
+        self._errors = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._factories:
+            raise KeyError(f"No client registered as {name!r}")
+        # one lock per client so a slow build doesn't block the others
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                start = time.perf_counter()
+                try:
+                    instance = self._factories[name]()
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._init_seconds[name] = time.perf_counter() - start
+                self._errors.pop(name, None)
+                self._instances[name] = instance
+                logger.info(f"🔌 Client {name} initialised in {self._init_seconds[name]:.2f}s")
+        return instance
+
+    @property
+    def names(self):
+        return list(self._factories)
+
+    def is_ready(self, name):
+        return name in self._instances
+
+    def warm_up(self, names=None):
+        """Builds the given clients (default: all) now; failures are recorded, not raised."""
+        for name in names or self.names:
+            try:
+                self.get(name)
+            except Exception:
+                logger.exception(f"❌ Warm-up of {name} failed")
+
+    def status(self):
+        return {
+            name: {
+                "ready": name in self._instances,
+                "init_seconds": round(self._init_seconds[name], 3) if name in self._init_seconds else None,
+                "error": self._errors.get(name),
+            }
+            for name in self._factories
+        }
+
+
+registry = ClientRegistry()
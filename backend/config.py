@@ -7,9 +7,152 @@ import io
 
 load_dotenv()
 
-LOG_DIR = os.getenv("LOG_DIR")
+LOG_DIR = os.getenv("LOG_DIR", "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# ----------- Embedding pipeline -----------
+# "google" talks to Gemini, "fake" is a deterministic offline stand-in
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "google")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/gemini-embedding-001")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_BASE_DELAY = float(os.getenv("EMBED_RETRY_BASE_DELAY", "1.0"))
+FAKE_EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "768"))
+FAKE_EMBED_LATENCY_MS = float(os.getenv("FAKE_EMBED_LATENCY_MS", "0"))
+
+# ----------- Vector storage -----------
+CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma_db")
+# set to reach a Chroma server (`chroma run --path chroma_db --port 8001`)
+# over HTTP instead of opening CHROMA_PATH in-process; required with
+# several workers
+CHROMA_HOST = os.getenv("CHROMA_HOST", "")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8001"))
+# "single" (one pdf_collection), "per_file" (a collection per file),
+# or "sharded" (files hashed onto VECTOR_SHARDS collections)
+VECTOR_LAYOUT = os.getenv("VECTOR_LAYOUT", "single")
+VECTOR_SHARDS = int(os.getenv("VECTOR_SHARDS", "16"))
+# "chroma", or "local": per-file memory-mapped .npy matrices searched by
+# brute force (see backend/local_index.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+# "float32", "float16" or "int8" for the scanned copy
+LOCAL_INDEX_PRECISION = os.getenv("LOCAL_INDEX_PRECISION", "float32")
+# leading dimensions kept in the scanned copy (0 = all)
+LOCAL_INDEX_DIM = int(os.getenv("LOCAL_INDEX_DIM", "0"))
+# candidates per requested result re-scored against the float32 vectors
+LOCAL_INDEX_RESCORE_FACTOR = int(os.getenv("LOCAL_INDEX_RESCORE_FACTOR", "4"))
+
+# ----------- Query path -----------
+# "google" for Gemini, "fake" for an offline stand-in with simulated latency
+LLM_BACKEND = os.getenv("LLM_BACKEND", "google")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+EMBED_QUERY_TIMEOUT_SECONDS = float(os.getenv("EMBED_QUERY_TIMEOUT_SECONDS", "15"))
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024"))
+# candidates fetched per requested result when per-file caps/thresholds apply
+CROSS_DOC_OVERFETCH = int(os.getenv("CROSS_DOC_OVERFETCH", "4"))
+CROSS_DOC_MAX_CANDIDATES = int(os.getenv("CROSS_DOC_MAX_CANDIDATES", "200"))
+# "vector", "hybrid" (vector + BM25 fused with reciprocal rank fusion),
+# or "lexical" (BM25 only, no embedding call)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
+# hybrid queries spanning more files than this use vector search alone,
+# since BM25 loads every file's index in scope
+LEXICAL_MAX_SCOPE_FILES = int(os.getenv("LEXICAL_MAX_SCOPE_FILES", "64"))
+# candidates taken from each retriever before fusion, per requested result
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "3"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Post-retrieval: over-fetch top_k × factor candidates, pick top_k with MMR
+# (1.0 = relevance only), merge touching chunks, pack into a token budget
+CONTEXT_CANDIDATE_FACTOR = int(os.getenv("CONTEXT_CANDIDATE_FACTOR", "4"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+BATCH_QUERY_MAX_QUESTIONS = int(os.getenv("BATCH_QUERY_MAX_QUESTIONS", "100"))
+BATCH_QUERY_CONCURRENCY = int(os.getenv("BATCH_QUERY_CONCURRENCY", "8"))
+
+# ----------- Embedding cache -----------
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+
+# ----------- Upload -----------
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# ----------- PDF extraction -----------
+# "pymupdf" (fast), "pypdf2", or "auto" (PyMuPDF with PyPDF2 fallback)
+EXTRACT_ENGINE = os.getenv("EXTRACT_ENGINE", "auto")
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# documents shorter than this are extracted in-process
+EXTRACT_PARALLEL_MIN_PAGES = int(os.getenv("EXTRACT_PARALLEL_MIN_PAGES", "64"))
+
+# ----------- Chunking -----------
+# "fixed" (character windows), "sentence", or "tokens"
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "fixed")
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "700"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "160"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "20"))
+
+# ----------- Answer cache (/query) -----------
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# cosine similarity above which a new question reuses a cached answer
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+# ----------- Database -----------
+# SQLite waits this long for a competing writer instead of failing with
+# "database is locked"
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# run DB work from async endpoints on an async driver (needs aiosqlite for
+# SQLite) instead of the threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+# ----------- Rate limiting (model APIs) -----------
+# requests / tokens per minute for the whole deployment, 0 = no limit; each
+# API worker and the bulk-ingest CLI enforce their share (see Deployment).
+# Quota errors (429) still pause the service for their retry-after
+EMBED_RPM = int(os.getenv("EMBED_RPM", "0"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "0"))
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+# first pause after a 429 without retry-after, doubled per attempt
+RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "2.0"))
+# seconds of quota that may be spent in one burst; the API counts per
+# minute, so RPM/TPM set to 90% of the quota with 6s of burst never exceed it
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "6"))
+
+# ----------- Startup -----------
+# clients built right after startup instead of on first use:
+# comma-separated names (vector_store, embedder, chat_model), "all" or ""
+WARMUP_CLIENTS = os.getenv("WARMUP_CLIENTS", "")
+
+# ----------- Deployment (several workers) -----------
+# API worker processes; start uvicorn with the same --workers. Rate limits
+# are split between them (a larger --workers detected at startup wins)
+WORKERS = int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+# fraction of every rate limit kept for the bulk-ingest CLI running next to
+# the API; the API workers share the rest. Opt-in: set the same value for
+# the API and the CLI when they run together. 0 (default) = the API keeps
+# the whole quota, and the CLI does too when run on its own
+BULK_INGEST_RATE_SHARE = float(os.getenv("BULK_INGEST_RATE_SHARE", "0"))
+# lock files coordinating the workers and the bulk-ingest CLI; all of
+# them must run on this host
+LOCK_DIR = os.getenv("LOCK_DIR", "locks")
+# how long a write to a document waits for another worker writing it
+FILE_LOCK_TIMEOUT_SECONDS = float(os.getenv("FILE_LOCK_TIMEOUT_SECONDS", "600"))
+# how often a worker drops answers invalidated by the other processes
+ANSWER_CACHE_SYNC_SECONDS = float(os.getenv("ANSWER_CACHE_SYNC_SECONDS", "1.0"))
+
+# ----------- Background ingest jobs -----------
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
 def setup_logging():
     # Root Logger
     logger = logging.getLogger()
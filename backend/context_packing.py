@@ -0,0 +1,153 @@
+import logging
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from backend.chunking import TOKEN_RE, count_tokens
+from backend.config import MMR_LAMBDA, CONTEXT_TOKEN_BUDGET
+
+logger = logging.getLogger("ContextPacking")
+
+
+@dataclass
+class PackStats:
+    candidates: int = 0
+    selected: int = 0
+    blocks: int = 0
+    raw_tokens: int = 0      # selected chunks joined as-is
+    context_tokens: int = 0  # after merging overlaps and packing
+    tokens_saved: int = 0
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def _relevance(hits):
+    """Scores min-max scaled to [0, 1]; works for cosine, BM25 and RRF alike."""
+    scores = np.array([h.score for h in hits], dtype=np.float32)
+    span = float(scores.max() - scores.min())
+    if span <= 0:
+        return np.ones(len(hits), dtype=np.float32)
+    return (scores - scores.min()) / span
+
+
+def mmr_select(hits, k, lam=MMR_LAMBDA):
+    """
+    Maximal marginal relevance over the candidates' embeddings: each pick
+    maximises lam * relevance - (1 - lam) * max similarity to the picks so
+    far. Hits without an embedding (lexical-only) count as dissimilar to
+    everything. Returns the picks in selection order.
+    """
+    if len(hits) <= k or lam >= 1.0:
+        return list(hits[:k])
+
+    relevance = _relevance(hits)
+    dim = next((len(h.embedding) for h in hits if h.embedding is not None), 0)
+    vectors = np.zeros((len(hits), dim), dtype=np.float32)
+    for i, h in enumerate(hits):
+        if h.embedding is not None and len(h.embedding) == dim:
+            vectors[i] = h.embedding
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+    similarity = vectors @ vectors.T
+
+    redundancy = np.zeros(len(hits), dtype=np.float32)
+    available = np.ones(len(hits), dtype=bool)
+    picked = []
+    for _ in range(k):
+        marginal = lam * relevance - (1.0 - lam) * redundancy
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return [hits[i] for i in picked]
+
+
+def merge_adjacent(hits):
+    """
+    Joins chunks of the same file and page whose character spans touch or
+    overlap, so the chunker's overlap is sent once. Blocks keep the rank of
+    their best chunk; chunks without offsets are left as they are.
+    """
+    groups = {}
+    loose = []
+    for rank, h in enumerate(hits):
+        start, end = h.metadata.get("start"), h.metadata.get("end")
+        if start is None or end is None:
+            loose.append((rank, h))
+        else:
+            groups.setdefault((h.file_id, h.metadata.get("page")), []).append((rank, h))
+
+    blocks = list(loose)
+    for members in groups.values():
+        members.sort(key=lambda item: item[1].metadata["start"])
+        rank, current = members[0]
+        chunk_ids = [current.metadata.get("chunk_id")]
+        for next_rank, nxt in members[1:]:
+            cur_end = current.metadata["end"]
+            nxt_start, nxt_end = nxt.metadata["start"], nxt.metadata["end"]
+            if nxt_start <= cur_end:
+                tail = nxt.document[cur_end - nxt_start:] if nxt_end > cur_end else ""
+                current = replace(
+                    current,
+                    document=current.document + tail,
+                    metadata={**current.metadata, "end": max(cur_end, nxt_end)},
+                    score=max(current.score, nxt.score),
+                )
+                chunk_ids.append(nxt.metadata.get("chunk_id"))
+                rank = min(rank, next_rank)
+            else:
+                blocks.append((rank, replace(current, metadata={**current.metadata, "chunk_ids": chunk_ids})))
+                rank, current, chunk_ids = next_rank, nxt, [nxt.metadata.get("chunk_id")]
+        blocks.append((rank, replace(current, metadata={**current.metadata, "chunk_ids": chunk_ids})))
+
+    blocks.sort(key=lambda item: item[0])
+    return [h for _, h in blocks]
+
+
+def _truncate(text, max_tokens):
+    """Cuts text after its max_tokens-th token."""
+    for n, match in enumerate(TOKEN_RE.finditer(text), start=1):
+        if n == max_tokens:
+            return text[:match.end()]
+    return text
+
+
+def pack(blocks, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Greedily keeps blocks in rank order while they fit the token budget;
+    blocks that do not fit are skipped in favour of smaller later ones. If
+    not even the best block fits, it is truncated to the budget.
+    """
+    packed, used = [], 0
+    for block in blocks:
+        tokens = count_tokens(block.document)
+        if used + tokens <= budget:
+            packed.append(block)
+            used += tokens
+    if not packed and blocks:
+        packed = [replace(blocks[0], document=_truncate(blocks[0].document, budget))]
+        used = count_tokens(packed[0].document)
+    return packed, used
+
+
+def select_and_pack(candidates, top_k, budget=CONTEXT_TOKEN_BUDGET, lam=MMR_LAMBDA):
+    """
+    Post-retrieval stage: MMR picks top_k diverse chunks out of the
+    over-fetched candidates, touching chunks are merged, and the result is
+    packed into the token budget.
+    Returns (selected chunks, context blocks, PackStats).
+    """
+    stats = PackStats(candidates=len(candidates))
+    selected = mmr_select(candidates, top_k, lam)
+    blocks, used = pack(merge_adjacent(selected), budget)
+
+    stats.selected = len(selected)
+    stats.blocks = len(blocks)
+    stats.raw_tokens = sum(count_tokens(h.document) for h in selected)
+    stats.context_tokens = used
+    stats.tokens_saved = max(stats.raw_tokens - used, 0)
+    logger.info(f"🧩 Context packed: {stats.candidates} candidates → {stats.selected} chunks → "
+                f"{stats.blocks} blocks, {used} tokens ({stats.tokens_saved} saved)")
+    return selected, blocks, stats
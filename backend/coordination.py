@@ -0,0 +1,173 @@
+"""
+Coordination between API worker processes on one host (uvicorn --workers N)
+and the bulk-ingest CLI: per-file write and job-submit locks, a startup
+lock, and a liveness lock every worker holds for as long as it runs.
+All of them are lock files in LOCK_DIR, so they work across processes and
+threads alike.
+"""
+import glob
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from filelock import FileLock, Timeout
+
+from backend.config import FILE_LOCK_TIMEOUT_SECONDS, LOCK_DIR, WORKERS
+
+logger = logging.getLogger("Coordination")
+
+os.makedirs(LOCK_DIR, exist_ok=True)
+
+HOST = socket.gethostname()
+
+_locks = {}
+_locks_guard = threading.Lock()
+_worker = None  # (pid, worker id, liveness lock)
+
+
+def _named_lock(name):
+    # one FileLock per path: it is reentrant per thread, and a second thread
+    # or process blocks on the OS-level lock
+    path = os.path.join(LOCK_DIR, f"{name}.lock")
+    with _locks_guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = FileLock(path)
+    return lock
+
+
+@contextmanager
+def file_lock(file_id, timeout=FILE_LOCK_TIMEOUT_SECONDS):
+    """
+    Serialises writes to one document (extracted text, vectors, lexical
+    index, PDF swap) across threads and workers. Raises 409 when another
+    writer holds the file for longer than timeout seconds.
+    """
+    lock = _named_lock(f"file-{file_id}")
+    try:
+        lock.acquire(timeout=timeout)
+    except Timeout:
+        raise HTTPException(409, "Another worker is still writing this document, try again later")
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+@contextmanager
+def job_lock(file_id):
+    """
+    Makes "is a job active for this file? else queue one" atomic across
+    threads and workers. Separate from file_lock, which a running job
+    holds for the whole extraction.
+    """
+    with _named_lock(f"job-{file_id}"):
+        yield
+
+
+@contextmanager
+def startup_lock():
+    """Held while a worker creates/migrates tables, so N workers don't race on DDL."""
+    with _named_lock("startup"):
+        yield
+
+
+def detected_workers():
+    """
+    Worker count of the uvicorn server that spawned this process: spawned
+    children inherit the parent's argv and environment. 1 outside uvicorn.
+    """
+    if multiprocessing.parent_process() is None:
+        return 1
+    argv = sys.argv
+    for i, arg in enumerate(argv):
+        if arg == "--workers" and i + 1 < len(argv):
+            value = argv[i + 1]
+        elif arg.startswith("--workers="):
+            value = arg.split("=", 1)[1]
+        else:
+            continue
+        try:
+            return max(1, int(value))
+        except ValueError:
+            return 1
+    return max(1, int(os.getenv("WEB_CONCURRENCY") or 1))
+
+
+def api_workers():
+    """API worker processes the rate limits are split between."""
+    return max(WORKERS, detected_workers())
+
+
+def worker_id():
+    """
+    host:pid:token of this process. The token makes it unique per process
+    lifetime, so a reused pid never inherits a dead worker's jobs.
+    """
+    global _worker
+    if _worker is None or _worker[0] != os.getpid():
+        token = uuid.uuid4().hex[:12]
+        _worker = (os.getpid(), f"{HOST}:{os.getpid()}:{token}", None)
+    return _worker[1]
+
+
+def hold_worker_lock():
+    """Taken at startup and never released: while it is held this worker counts as alive."""
+    global _worker
+    wid = worker_id()
+    if _worker[2] is None:
+        lock = FileLock(_liveness_path(wid), thread_local=False)
+        lock.acquire()
+        _worker = (_worker[0], wid, lock)
+    return wid
+
+
+def _liveness_path(wid):
+    return os.path.join(LOCK_DIR, f"worker-{wid.rsplit(':', 1)[-1]}.lock")
+
+
+def _lock_held(path):
+    lock = FileLock(path, thread_local=False)
+    try:
+        lock.acquire(timeout=0)
+    except Timeout:
+        return True
+    lock.release()
+    return False
+
+
+def live_workers():
+    """API workers on this host that hold their liveness lock right now."""
+    own = _liveness_path(_worker[1]) if _worker and _worker[2] is not None else None
+    paths = glob.glob(os.path.join(LOCK_DIR, "worker-*.lock"))
+    return sum(1 for path in paths if path != own and _lock_held(path))
+
+
+def worker_alive(wid):
+    """
+    False when wid is unknown or is a worker of this host whose liveness
+    lock is free (its process is gone). Workers on other hosts can't be
+    checked and count as alive.
+    """
+    if not wid or wid.count(":") < 2:
+        return False
+    if wid == worker_id():
+        return True
+    if wid.rsplit(":", 2)[0] != HOST:
+        return True
+    path = _liveness_path(wid)
+    if not os.path.exists(path):
+        return False
+    if _lock_held(path):
+        return True
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return False
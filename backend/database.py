@@ -1,23 +1,210 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import MetaData, UniqueConstraint, create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.orm import sessionmaker, declarative_base
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
+import logging
 import os
 
+from backend.config import (
+    DB_ASYNC,
+    DB_BUSY_TIMEOUT_MS,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+)
+
 load_dotenv()
 
+logger = logging.getLogger("Database")
+
 DATABASE_URL = os.getenv("DATABASE_URL")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
 
 engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
 )
 
+
+def _tune_sqlite(dbapi_connection, connection_record):
+    """
+    WAL lets readers run alongside the single writer, and busy_timeout
+    makes a blocked writer wait instead of raising "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    finally:
+        cursor.close()
+
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _tune_sqlite)
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 Base = declarative_base()
 
+
+# ---------------- Optional async engine ----------------
+
+AsyncSessionLocal = None
+
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _async_url(url):
+    """
+    DATABASE_URL with its driver swapped for the async one, including
+    driver-qualified URLs (postgresql+psycopg2://, sqlite+pysqlite://).
+    """
+    url = make_url(url)
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return url
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}")
+
+
+if DB_ASYNC:
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async_url = _async_url(DATABASE_URL)
+
+        # aiosqlite picks its own pool class, sizing only applies to servers
+        pool_args = {} if IS_SQLITE else {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+        async_engine = create_async_engine(async_url, pool_pre_ping=True, **pool_args)
+        if IS_SQLITE:
+            event.listen(async_engine.sync_engine, "connect", _tune_sqlite)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        logger.info(f"🗃️ Async DB engine enabled ({async_engine.url.drivername})")
+    except ImportError as e:
+        logger.warning(f"⚠️ DB_ASYNC=true but the async driver is missing ({e}); using the threadpool")
+    except InvalidRequestError as e:
+        # e.g. a backend without an async driver mapping, left on its sync driver
+        logger.warning(f"⚠️ DB_ASYNC=true but {async_url.drivername} is not an async driver ({e}); using the threadpool")
+
+
+def _model_unique_sets(table):
+    """Column sets the model declares unique (primary key, constraints, unique indexes)."""
+    sets = {frozenset(c.name for c in table.primary_key.columns)}
+    sets.update(frozenset(c.name for c in con.columns) for con in table.constraints
+                if isinstance(con, UniqueConstraint))
+    sets.update(frozenset(c.name for c in ix.columns) for ix in table.indexes if ix.unique)
+    return sets
+
+
+def _rebuild_sqlite_table(conn, table):
+    """
+    SQLite can't drop a constraint: copy the rows into a table created from
+    the current model, swap it in, then recreate the model's indexes.
+    """
+    tmp_name = f"{table.name}__rebuild"
+    old_columns = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    columns = ", ".join(c.name for c in table.columns if c.name in old_columns)
+    conn.execute(text(f"DROP TABLE IF EXISTS {tmp_name}"))
+    conn.execute(CreateTable(table.to_metadata(MetaData(), name=tmp_name)))
+    conn.execute(text(f"INSERT INTO {tmp_name} ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {tmp_name} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def _drop_stale_unique(conn, inspector, table):
+    """
+    Removes unique constraints/indexes an older model had and the current
+    one doesn't (e.g. the original UNIQUE(file_name), which rejected a new
+    version of a document uploaded under the same name).
+    """
+    wanted = _model_unique_sets(table)
+    stale_constraints = [u for u in inspector.get_unique_constraints(table.name)
+                         if frozenset(u["column_names"]) not in wanted]
+    stale_indexes = [ix for ix in inspector.get_indexes(table.name)
+                     if ix.get("unique") and frozenset(ix["column_names"]) not in wanted]
+
+    for ix in stale_indexes:
+        conn.execute(text(f"DROP INDEX {ix['name']}"))
+        logger.info(f"🛠️ Dropped stale unique index {ix['name']} on {table.name}")
+    if not stale_constraints:
+        return
+    columns = [", ".join(u["column_names"]) for u in stale_constraints]
+    if IS_SQLITE or any(not u.get("name") for u in stale_constraints):
+        _rebuild_sqlite_table(conn, table)
+    else:
+        for u in stale_constraints:
+            conn.execute(text(f"ALTER TABLE {table.name} DROP CONSTRAINT {u['name']}"))
+    logger.info(f"🛠️ Dropped stale unique constraint(s) on {table.name}({'; '.join(columns)})")
+
+
+def ensure_schema():
+    """
+    create_all() never alters existing tables, so add any columns and
+    indexes that newer models introduced to a database created earlier,
+    and drop unique constraints the models no longer declare.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            _drop_stale_unique(conn, inspect(conn), table)
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@contextmanager
+def session_scope():
+    """Session for code outside a request (jobs, caches); rolled back on error, always closed."""
+    db = SessionLocal()
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _run_sync(fn, *args):
+    with session_scope() as db:
+        return fn(db, *args)
+
+
+async def run_db(fn, *args):
+    """
+    Runs fn(session, *args) without blocking the event loop: on the async
+    engine when DB_ASYNC is enabled, otherwise on a pooled session in the
+    threadpool. fn is plain synchronous ORM code either way.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args)
+    return await run_in_threadpool(_run_sync, fn, *args)
@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import threading
+import time
+from array import array
+
+from sqlalchemy import delete, func, select, update
+
+from backend.config import EMBED_CACHE_MAX_ENTRIES
+from backend.database import session_scope
+from backend.models import EmbeddingCacheEntry
+
+logger = logging.getLogger("EmbeddingCache")
+
+# stay well under SQLite's bound-parameter limit
+_KEY_BATCH = 500
+_UPSERT_BATCH = 100  # 5 parameters per row
+
+
+def _upsert(db, rows):
+    """
+    INSERT ... ON CONFLICT DO UPDATE: two workers caching the same text at
+    once both succeed, where a read-then-insert merge() would hit a
+    duplicate key in one of them.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            db.merge(EmbeddingCacheEntry(**row))
+        return
+    stmt = insert(EmbeddingCacheEntry).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[EmbeddingCacheEntry.cache_key],
+        set_={
+            "dim": stmt.excluded.dim,
+            "vector": stmt.excluded.vector,
+            "last_used_at": stmt.excluded.last_used_at,
+        },
+    ))
+
+
+def cache_key(model: str, text: str) -> str:
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def _pack(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes):
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache stored in the app DB.
+    Entries are keyed on (model, sha256(text)) and evicted least-recently-used
+    once the table grows past max_entries.
+    """
+
+    def __init__(self, max_entries=EMBED_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, model, texts):
+        """Returns {text: vector} for every text already in the cache."""
+        keys = {cache_key(model, t): t for t in texts}
+        found = {}
+        with session_scope() as db:
+            key_list = list(keys)
+            for i in range(0, len(key_list), _KEY_BATCH):
+                part = key_list[i:i + _KEY_BATCH]
+                rows = db.execute(
+                    select(EmbeddingCacheEntry.cache_key, EmbeddingCacheEntry.vector)
+                    .where(EmbeddingCacheEntry.cache_key.in_(part))
+                ).all()
+                for key, blob in rows:
+                    found[keys[key]] = _unpack(blob)
+
+                hit_keys = [key for key, _ in rows]
+                if hit_keys:
+                    db.execute(
+                        update(EmbeddingCacheEntry)
+                        .where(EmbeddingCacheEntry.cache_key.in_(hit_keys))
+                        .values(last_used_at=time.time())
+                    )
+            db.commit()
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model, texts, vectors):
+        if not texts:
+            return
+        now = time.time()
+        rows = {}
+        for text, vector in zip(texts, vectors):
+            key = cache_key(model, text)
+            rows[key] = {"cache_key": key, "model": model, "dim": len(vector),
+                         "vector": _pack(vector), "last_used_at": now}
+        rows = list(rows.values())
+        with session_scope() as db:
+            for i in range(0, len(rows), _UPSERT_BATCH):
+                _upsert(db, rows[i:i + _UPSERT_BATCH])
+            db.commit()
+            self._evict(db)
+
+    def _evict(self, db):
+        total = db.scalar(select(func.count()).select_from(EmbeddingCacheEntry))
+        overflow = total - self.max_entries
+        if overflow <= 0:
+            return
+        oldest = (
+            select(EmbeddingCacheEntry.cache_key)
+            .order_by(EmbeddingCacheEntry.last_used_at)
+            .limit(overflow)
+            .scalar_subquery()
+        )
+        db.execute(delete(EmbeddingCacheEntry).where(EmbeddingCacheEntry.cache_key.in_(oldest)))
+        db.commit()
+        with self._lock:
+            self.evictions += overflow
+        logger.info(f"🧹 Evicted {overflow} cached embeddings (cap={self.max_entries})")
+
+    def stats(self):
+        with session_scope() as db:
+            entries = db.scalar(select(func.count()).select_from(EmbeddingCacheEntry))
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
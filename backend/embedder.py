@@ -0,0 +1,345 @@
+import asyncio
+import hashlib
+import logging
+import math
+import random
+import struct
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.config import (
+    EMBEDDER_BACKEND,
+    EMBED_CACHE_ENABLED,
+    EMBEDDING_MODEL,
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_CONCURRENCY,
+    EMBED_MAX_RETRIES,
+    EMBED_RETRY_BASE_DELAY,
+    FAKE_EMBED_DIM,
+    FAKE_EMBED_LATENCY_MS,
+    EMBED_QUERY_TIMEOUT_SECONDS,
+    QUERY_EMBED_CACHE_SIZE,
+)
+from backend.clients import registry
+from backend.embed_cache import get_embedding_cache
+from backend.metrics import external_call, track_stage
+from backend.rate_limit import estimate_tokens, get_scheduler, is_rate_limited
+
+logger = logging.getLogger("Embedder")
+
+
+class Embedder:
+    """Common interface for every embedding backend."""
+
+    model_name = ""
+
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    async def aembed_query(self, text):
+        # SDK calls are blocking; keep them off the event loop
+        return await asyncio.to_thread(self.embed_query, text)
+
+    async def aembed_queries(self, texts):
+        return await asyncio.to_thread(self.embed_queries, texts)
+
+
+class GoogleEmbedder(Embedder):
+    """Wraps a single long-lived GoogleGenerativeAIEmbeddings client."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        self.model_name = model_name
+        self._client = GoogleGenerativeAIEmbeddings(model=model_name)
+
+    def embed_documents(self, texts):
+        return self._client.embed_documents(list(texts))
+
+    def embed_query(self, text):
+        return self._client.embed_query(text)
+
+    def embed_queries(self, texts):
+        # one batched request, embedded as queries rather than documents
+        return self._client.embed_documents(list(texts), task_type="retrieval_query")
+
+
+class FakeEmbedder(Embedder):
+    """
+    Deterministic offline embedder for load tests.
+    The same text always maps to the same unit vector.
+    latency_ms is slept once per call to mimic a network round-trip.
+    """
+
+    def __init__(self, dim=FAKE_EMBED_DIM, latency_ms=FAKE_EMBED_LATENCY_MS):
+        self.model_name = f"fake-{dim}"
+        self.dim = dim
+        self.latency_ms = latency_ms
+
+    def _vector(self, text):
+        values = []
+        counter = 0
+        seed = text.encode("utf-8")
+        while len(values) < self.dim:
+            digest = hashlib.blake2b(seed + counter.to_bytes(4, "little"), digest_size=64).digest()
+            # 16 unsigned ints per digest, mapped into [-1, 1)
+            values.extend(v / 2**31 - 1.0 for v in struct.unpack("<16I", digest))
+            counter += 1
+        values = values[: self.dim]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+    def embed_queries(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._vector(text)
+
+    async def aembed_queries(self, texts):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+
+def _create_embedder():
+    if EMBEDDER_BACKEND == "fake":
+        embedder = FakeEmbedder()
+    elif EMBEDDER_BACKEND == "google":
+        embedder = GoogleEmbedder()
+    else:
+        raise ValueError(f"Unknown EMBEDDER_BACKEND: {EMBEDDER_BACKEND}")
+    logger.info(f"🧩 Embedder ready: {embedder.model_name}")
+    return embedder
+
+
+registry.register("embedder", _create_embedder)
+
+
+def get_embedder():
+    """Return the process-wide embedder selected by EMBEDDER_BACKEND."""
+    return registry.get("embedder")
+
+
+class QueryEmbeddingCache:
+    """Small in-memory LRU of question embeddings, keyed on (model, question)."""
+
+    def __init__(self, max_entries=QUERY_EMBED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+query_embedding_cache = QueryEmbeddingCache()
+
+
+async def embed_query(text, embedder=None, timeout=EMBED_QUERY_TIMEOUT_SECONDS):
+    """
+    Embeds a question through the shared embedder with a per-call timeout.
+    Repeated questions are served from the query-embedding LRU.
+    """
+    embedder = embedder or get_embedder()
+    key = (embedder.model_name, " ".join(text.split()))
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        # the timeout covers waiting for a rate-limit slot too
+        with external_call("embedding"):
+            vector = await asyncio.wait_for(
+                get_scheduler("embedding").acall(lambda: embedder.aembed_query(text), cost=estimate_tokens(text)),
+                timeout,
+            )
+        query_embedding_cache.put(key, vector)
+    return vector
+
+
+async def embed_queries(texts, embedder=None, timeout=EMBED_QUERY_TIMEOUT_SECONDS, priority="interactive"):
+    """Batched embed_query: cached questions are reused, the rest go out in one call."""
+    embedder = embedder or get_embedder()
+    keys = [(embedder.model_name, " ".join(t.split())) for t in texts]
+    vectors = [query_embedding_cache.get(k) for k in keys]
+
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        batch = [texts[i] for i in missing]
+        with external_call("embedding"):
+            fresh = await asyncio.wait_for(
+                get_scheduler("embedding").acall(
+                    lambda: embedder.aembed_queries(batch), cost=estimate_tokens(batch), priority=priority
+                ),
+                timeout,
+            )
+        for i, vector in zip(missing, fresh):
+            vectors[i] = vector
+            query_embedding_cache.put(keys[i], vector)
+    return vectors
+
+
+def _embed_batch_with_retry(embedder, batch, batch_no, max_retries, base_delay, priority="background", key=None):
+    with track_stage("embed_batch"):
+        return _embed_with_retry(embedder, batch, batch_no, max_retries, base_delay, priority, key)
+
+
+def _embed_with_retry(embedder, batch, batch_no, max_retries, base_delay, priority="background", key=None):
+    scheduler = get_scheduler("embedding")
+    cost = estimate_tokens(batch)
+    attempt = 0
+    while True:
+        scheduler.acquire(cost, priority, key)
+        try:
+            with external_call("embedding"):
+                return embedder.embed_documents(batch)
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries:
+                logger.error(f"❌ Embedding batch {batch_no} failed after {max_retries} retries: {e}")
+                raise
+            if is_rate_limited(e):
+                # pauses every embedding caller, honouring retry-after
+                scheduler.backoff(e, attempt)
+                continue
+            # exponential backoff with jitter
+            delay = base_delay * 2 ** (attempt - 1) * (0.5 + random.random())
+            logger.warning(f"🔁 Embedding batch {batch_no} failed ({e}), retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def _embed_in_batches(
+    texts,
+    embedder,
+    batch_size,
+    max_concurrency,
+    max_retries,
+    base_delay,
+    on_batch_done=None,
+    priority="background",
+    key=None,
+):
+    """
+    Embeds texts in batches of batch_size, keeping at most max_concurrency
+    batches in flight. Each batch is retried independently.
+    on_batch_done(batch, vectors) is called as each batch finishes.
+    """
+    if not texts:
+        return []
+    if batch_size < 1 or max_concurrency < 1:
+        raise ValueError("batch_size and max_concurrency must be >= 1")
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    logger.info(
+        f"🚚 Embedding {len(texts)} texts in {len(batches)} batches "
+        f"(batch_size={batch_size}, concurrency={max_concurrency})"
+    )
+
+    results = [None] * len(batches)
+
+    def run(batch_no):
+        vectors = _embed_batch_with_retry(
+            embedder, batches[batch_no], batch_no, max_retries, base_delay, priority, key
+        )
+        if len(vectors) != len(batches[batch_no]):
+            raise RuntimeError(f"Embedding batch {batch_no} returned {len(vectors)} vectors")
+        results[batch_no] = vectors
+        if on_batch_done:
+            on_batch_done(batches[batch_no], vectors)
+
+    if len(batches) == 1 or max_concurrency == 1:
+        for batch_no in range(len(batches)):
+            run(batch_no)
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as pool:
+            # list() re-raises the first batch failure
+            list(pool.map(run, range(len(batches))))
+
+    return [vector for batch in results for vector in batch]
+
+
+def embed_texts(
+    texts,
+    embedder=None,
+    batch_size=EMBED_BATCH_SIZE,
+    max_concurrency=EMBED_MAX_CONCURRENCY,
+    max_retries=EMBED_MAX_RETRIES,
+    base_delay=EMBED_RETRY_BASE_DELAY,
+    on_progress=None,
+    use_cache=EMBED_CACHE_ENABLED,
+    priority="background",
+    key=None,
+):
+    """
+    Returns one vector per text, in order.
+    Repeated texts are embedded once, and texts already in the embedding
+    cache skip the API entirely. on_progress(n) receives the number of
+    input texts resolved by each cache lookup / finished batch, one call
+    at a time. priority and key (usually the file id) place the batches
+    in the embedding rate-limit scheduler.
+    """
+    embedder = embedder or get_embedder()
+    texts = list(texts)
+    if not texts:
+        return []
+
+    counts = Counter(texts)
+    unique = list(counts)
+
+    resolved = {}
+    cache = None
+    if use_cache:
+        cache = get_embedding_cache()
+        resolved = cache.get_many(embedder.model_name, unique)
+        if resolved:
+            logger.info(f"♻️ Embedding cache hits: {len(resolved)}/{len(unique)} unique texts")
+            if on_progress:
+                on_progress(sum(counts[t] for t in resolved))
+
+    missing = [t for t in unique if t not in resolved]
+    progress_lock = threading.Lock()
+
+    def batch_done(batch, vectors):
+        # cache each batch as it lands so a later failure doesn't waste it
+        if cache is not None:
+            cache.put_many(embedder.model_name, batch, vectors)
+        if on_progress:
+            with progress_lock:
+                on_progress(sum(counts[t] for t in batch))
+
+    vectors = _embed_in_batches(
+        missing, embedder, batch_size, max_concurrency, max_retries, base_delay, batch_done, priority, key
+    )
+    resolved.update(zip(missing, vectors))
+
+    return [resolved[t] for t in texts]
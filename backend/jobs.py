@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from backend.config import JOB_WORKERS
+from backend.coordination import job_lock, worker_alive, worker_id
+from backend.database import session_scope
+from backend.metrics import FAILURES
+from backend.models import IngestJob
+from backend.routers.embed import embed_file
+from backend.routers.extract import extract_text
+
+logger = logging.getLogger("IngestJobs")
+
+JOB_KINDS = ("extract", "embed", "ingest")
+ACTIVE_STATUSES = ("queued", "running")
+
+# Bounded pool: at most JOB_WORKERS documents are processed at once,
+# the rest wait in the executor queue with status "queued".
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="ingest")
+
+# minimum seconds between progress writes for a single job
+_PROGRESS_INTERVAL = 0.5
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def job_to_dict(job: IngestJob):
+    return {
+        "job_id": job.job_id,
+        "file_id": job.file_id,
+        "kind": job.kind,
+        "status": job.status,
+        "pages_total": job.pages_total,
+        "pages_done": job.pages_done,
+        "chunks_total": job.chunks_total,
+        "chunks_done": job.chunks_done,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+def _update_job(job_id, **fields):
+    with session_scope() as db:
+        job = db.get(IngestJob, job_id)
+        if job is None:
+            return
+        for key, value in fields.items():
+            setattr(job, key, value)
+        job.updated_at = _now()
+        db.commit()
+
+
+class _ProgressReporter:
+    """Throttles progress callbacks into occasional DB writes."""
+
+    def __init__(self, job_id, done_field, total_field):
+        self.job_id = job_id
+        self.done_field = done_field
+        self.total_field = total_field
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, done, total):
+        with self._lock:
+            now = time.monotonic()
+            if done < total and now - self._last_write < _PROGRESS_INTERVAL:
+                return
+            self._last_write = now
+        _update_job(self.job_id, **{self.done_field: done, self.total_field: total})
+
+
+def _run_job(job_id, file_id, kind):
+    _update_job(job_id, status="running")
+    logger.info(f"🏃 Job {job_id} started: {kind} {file_id}")
+    try:
+        if kind in ("extract", "ingest"):
+            extract_text(file_id, progress=_ProgressReporter(job_id, "pages_done", "pages_total"))
+        if kind in ("embed", "ingest"):
+            embed_file(file_id, progress=_ProgressReporter(job_id, "chunks_done", "chunks_total"))
+    except HTTPException as e:
+        logger.error(f"❌ Job {job_id} failed: {e.detail}")
+        FAILURES.inc(stage="job")
+        _update_job(job_id, status="failed", error=str(e.detail))
+        return
+    except Exception as e:
+        logger.exception(f"❌ Job {job_id} crashed")
+        FAILURES.inc(stage="job")
+        _update_job(job_id, status="failed", error=str(e))
+        return
+    _update_job(job_id, status="done")
+    logger.info(f"✅ Job {job_id} finished")
+
+
+def submit_job(file_id: str, kind: str = "ingest"):
+    """
+    Queues extract/embed work for file_id and returns immediately.
+    An already queued or running job for the same file is returned instead
+    of starting a duplicate.
+    """
+    if kind not in JOB_KINDS:
+        raise HTTPException(400, f"Unknown job kind: {kind}")
+
+    # check and insert under one lock, or two concurrent calls (double
+    # click, two workers) would both see no active job and both queue one
+    with job_lock(file_id), session_scope() as db:
+        active = (
+            db.query(IngestJob)
+            .filter(IngestJob.file_id == file_id, IngestJob.status.in_(ACTIVE_STATUSES))
+            .first()
+        )
+        if active:
+            return job_to_dict(active)
+
+        job = IngestJob(
+            job_id=str(uuid.uuid4()),
+            file_id=file_id,
+            kind=kind,
+            status="queued",
+            created_at=_now(),
+            updated_at=_now(),
+            worker=worker_id(),
+        )
+        db.add(job)
+        db.commit()
+        result = job_to_dict(job)
+
+    _executor.submit(_run_job, result["job_id"], file_id, kind)
+    logger.info(f"📨 Job {result['job_id']} queued: {kind} {file_id}")
+    return result
+
+
+def get_job(job_id: str):
+    with session_scope() as db:
+        job = db.get(IngestJob, job_id)
+        return job_to_dict(job) if job else None
+
+
+def latest_job_for_file(file_id: str):
+    with session_scope() as db:
+        job = (
+            db.query(IngestJob)
+            .filter(IngestJob.file_id == file_id)
+            .order_by(IngestJob.created_at.desc())
+            .first()
+        )
+        return job_to_dict(job) if job else None
+
+
+def fail_interrupted_jobs():
+    """
+    Jobs left queued/running by a process that is gone can never finish.
+    Jobs of workers that are still alive (another uvicorn worker starting
+    later, or restarted) are left alone.
+    """
+    with session_scope() as db:
+        active = db.query(IngestJob.job_id, IngestJob.worker).filter(IngestJob.status.in_(ACTIVE_STATUSES)).all()
+        orphaned = [job_id for job_id, worker in active if not worker_alive(worker)]
+        count = 0
+        for i in range(0, len(orphaned), 500):
+            count += (
+                db.query(IngestJob)
+                .filter(IngestJob.job_id.in_(orphaned[i:i + 500]), IngestJob.status.in_(ACTIVE_STATUSES))
+                .update(
+                    {"status": "failed", "error": "Interrupted by server restart", "updated_at": _now()},
+                    synchronize_session=False,
+                )
+            )
+        db.commit()
+        if count:
+            logger.warning(f"⚠️ Marked {count} interrupted ingest jobs as failed")
@@ -0,0 +1,204 @@
+import glob
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from backend.config import LEXICAL_INDEX_DIR, LEXICAL_MAX_SCOPE_FILES
+from backend.retrieval import Hit
+
+logger = logging.getLogger("LexicalIndex")
+
+os.makedirs(LEXICAL_INDEX_DIR, exist_ok=True)
+
+# Identifiers such as "A-113", "4.2.1" or "INV/2024/07" are kept whole in
+# addition to their parts, so part numbers and clause ids match exactly.
+_COMPOUND_RE = re.compile(r"\w+(?:[-./]\w+)+")
+_WORD_RE = re.compile(r"\w+")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# loaded indexes kept in memory, keyed on file_id; a full scope fits
+_CACHE_SIZE = max(64, LEXICAL_MAX_SCOPE_FILES)
+
+
+def tokenize(text: str):
+    text = text.lower()
+    tokens = _WORD_RE.findall(text)
+    tokens.extend(_COMPOUND_RE.findall(text))
+    return tokens
+
+
+def bm25_idf(n_docs, doc_freq):
+    return math.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over the chunks of one file."""
+
+    def __init__(self, ids, documents, metadatas, doc_lens, postings):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.doc_lens = doc_lens
+        self.postings = postings  # term -> [[doc_no, term_freq], ...]
+        self.total_len = sum(doc_lens)
+        self.avg_len = (self.total_len / len(doc_lens)) if doc_lens else 0.0
+
+    @classmethod
+    def build(cls, ids, documents, metadatas):
+        postings = {}
+        doc_lens = []
+        for doc_no, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append([doc_no, tf])
+        return cls(list(ids), list(documents), list(metadatas), doc_lens, postings)
+
+    def search(self, query, top_k, idf=None, avg_len=None):
+        """
+        Returns [(doc_no, score)] best-first. idf (term -> weight) and
+        avg_len default to this file's own statistics; pass corpus-wide ones
+        to get scores comparable with other files.
+        """
+        n_docs = len(self.ids)
+        if not n_docs:
+            return []
+        avg_len = avg_len or self.avg_len
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            if idf is None:
+                weight = bm25_idf(n_docs, len(posting))
+            else:
+                weight = idf.get(term, 0.0)
+            for doc_no, tf in posting:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens[doc_no] / avg_len)
+                scores[doc_no] = scores.get(doc_no, 0.0) + weight * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def to_dict(self):
+        return {
+            "ids": self.ids,
+            "documents": self.documents,
+            "metadatas": self.metadatas,
+            "doc_lens": self.doc_lens,
+            "postings": self.postings,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["ids"], data["documents"], data["metadatas"], data["doc_lens"], data["postings"])
+
+
+# ---------------- Persistence (one JSON file per file_id) ----------------
+
+_cache = OrderedDict()  # file_id -> (mtime, BM25Index)
+_cache_lock = threading.Lock()
+
+
+def index_path(file_id):
+    return os.path.join(LEXICAL_INDEX_DIR, f"{file_id}.json")
+
+
+def save_index(file_id, index):
+    path = index_path(file_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        json.dump(index.to_dict(), out, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    with _cache_lock:
+        _cache.pop(file_id, None)
+
+
+def build_index(file_id, ids, documents, metadatas):
+    index = BM25Index.build(ids, documents, metadatas)
+    save_index(file_id, index)
+    logger.info(f"🔤 Lexical index built for {file_id}: {len(ids)} chunks, {len(index.postings)} terms")
+    return index
+
+
+def load_index(file_id):
+    """Cached load; returns None when the file has no lexical index."""
+    path = index_path(file_id)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _cache_lock:
+        cached = _cache.get(file_id)
+        if cached and cached[0] == mtime:
+            _cache.move_to_end(file_id)
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        index = BM25Index.from_dict(json.load(f))
+    with _cache_lock:
+        _cache[file_id] = (mtime, index)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
+
+
+def delete_index(file_id):
+    with _cache_lock:
+        _cache.pop(file_id, None)
+    try:
+        os.remove(index_path(file_id))
+    except FileNotFoundError:
+        pass
+
+
+def indexed_file_ids():
+    return [
+        os.path.splitext(os.path.basename(p))[0]
+        for p in glob.glob(os.path.join(LEXICAL_INDEX_DIR, "*.json"))
+    ]
+
+
+def scope_size(file_ids):
+    """Number of files a search over file_ids (None = every indexed file) would load."""
+    return len(indexed_file_ids()) if file_ids is None else len(file_ids)
+
+
+def search(file_ids, question, top_k):
+    """
+    BM25 search over file_ids (None = every indexed file), best-first.
+    Files without an index are skipped. Document frequencies and the
+    average chunk length are summed over every file in scope, so scores
+    rank as if the chunks of all those files were one index.
+    """
+    indexes = []
+    for file_id in (indexed_file_ids() if file_ids is None else file_ids):
+        index = load_index(file_id)
+        if index is not None:
+            indexes.append(index)
+    n_docs = sum(len(index.ids) for index in indexes)
+    if not n_docs:
+        return []
+
+    avg_len = sum(index.total_len for index in indexes) / n_docs
+    idf = {}
+    for term in set(tokenize(question)):
+        doc_freq = sum(len(index.postings.get(term, ())) for index in indexes)
+        if doc_freq:
+            idf[term] = bm25_idf(n_docs, doc_freq)
+
+    hits = []
+    for index in indexes:
+        for doc_no, score in index.search(question, top_k, idf, avg_len):
+            hits.append(Hit(
+                id=index.ids[doc_no],
+                document=index.documents[doc_no],
+                metadata=index.metadatas[doc_no],
+                score=score,
+            ))
+    hits.sort(key=lambda h: h.score, reverse=True)
+    return hits[:top_k]
+
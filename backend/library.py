@@ -0,0 +1,36 @@
+import time
+
+from sqlalchemy import update
+
+from backend.database import session_scope
+from backend.models import LibraryState
+
+_ROW_ID = 1
+
+
+def bump_version(db):
+    """
+    Marks the file library as changed; runs in the caller's transaction so
+    the bump commits together with the change itself.
+    """
+    db.execute(
+        update(LibraryState)
+        .where(LibraryState.id == _ROW_ID)
+        .values(version=LibraryState.version + 1, updated_at=time.time())
+    )
+
+
+def init_library_state():
+    """Creates the version row at startup so bumps never race to insert it."""
+    with session_scope() as db:
+        if db.get(LibraryState, _ROW_ID) is None:
+            db.add(LibraryState(id=_ROW_ID, version=0, updated_at=time.time()))
+            db.commit()
+
+
+def get_version(db):
+    """Returns (version, updated_at unix time); (0, 0.0) before the first change."""
+    state = db.get(LibraryState, _ROW_ID)
+    if state is None:
+        return 0, 0.0
+    return state.version, state.updated_at
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import logging
+
+from backend.config import LLM_BACKEND, LLM_MODEL, LLM_TIMEOUT_SECONDS, FAKE_LLM_LATENCY_MS
+from backend.clients import registry
+from backend.metrics import external_call, track_stage
+from backend.rate_limit import estimate_tokens, get_scheduler, is_rate_limited
+
+logger = logging.getLogger("LLM")
+
+
+class ChatModel:
+    """Common interface for every chat model backend."""
+
+    model_name = ""
+
+    async def agenerate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def astream(self, prompt: str):
+        """Yields the answer in pieces; backends without streaming yield it whole."""
+        yield await self.agenerate(prompt)
+
+
+class GoogleChatModel(ChatModel):
+    """One long-lived ChatGoogleGenerativeAI client shared by every request."""
+
+    def __init__(self, model_name=LLM_MODEL):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        self.model_name = model_name
+        self._client = ChatGoogleGenerativeAI(model=model_name)
+
+    async def agenerate(self, prompt):
+        response = await self._client.ainvoke(prompt)
+        return response.content
+
+    async def astream(self, prompt):
+        async for chunk in self._client.astream(prompt):
+            if chunk.content:
+                yield chunk.content
+
+
+class FakeChatModel(ChatModel):
+    """
+    Offline stand-in for load tests: sleeps latency_ms without blocking the
+    event loop and returns a deterministic answer derived from the prompt.
+    """
+
+    def __init__(self, latency_ms=FAKE_LLM_LATENCY_MS):
+        self.model_name = "fake-llm"
+        self.latency_ms = latency_ms
+
+    def _answer(self, prompt):
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"Fake answer {digest} based on {len(prompt)} prompt characters."
+
+    async def agenerate(self, prompt):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._answer(prompt)
+
+    async def astream(self, prompt):
+        words = self._answer(prompt).split(" ")
+        # first token after ~20% of the latency, the rest spread evenly
+        delay = self.latency_ms / 1000
+        if delay:
+            await asyncio.sleep(delay * 0.2)
+        for i, word in enumerate(words):
+            if i and delay:
+                await asyncio.sleep(delay * 0.8 / len(words))
+            yield word if i == 0 else " " + word
+
+
+def _create_chat_model():
+    if LLM_BACKEND == "fake":
+        model = FakeChatModel()
+    elif LLM_BACKEND == "google":
+        model = GoogleChatModel()
+    else:
+        raise ValueError(f"Unknown LLM_BACKEND: {LLM_BACKEND}")
+    logger.info(f"🤖 Chat model ready: {model.model_name}")
+    return model
+
+
+registry.register("chat_model", _create_chat_model)
+
+
+def get_chat_model():
+    """Return the process-wide chat model selected by LLM_BACKEND."""
+    return registry.get("chat_model")
+
+
+async def generate(prompt, model=None, timeout=LLM_TIMEOUT_SECONDS, priority="interactive"):
+    """Runs one rate-limited LLM call; the timeout includes waiting for a slot."""
+    model = model or get_chat_model()
+    with track_stage("llm_call"), external_call("llm"):
+        return await asyncio.wait_for(
+            get_scheduler("llm").acall(lambda: model.agenerate(prompt), cost=estimate_tokens(prompt),
+                                       priority=priority),
+            timeout,
+        )
+
+
+async def stream(prompt, model=None, timeout=LLM_TIMEOUT_SECONDS, priority="interactive"):
+    """Yields answer pieces; each piece must arrive within timeout seconds."""
+    model = model or get_chat_model()
+    scheduler = get_scheduler("llm")
+    with track_stage("llm_call"), external_call("llm"):
+        await asyncio.wait_for(scheduler.aacquire(estimate_tokens(prompt), priority), timeout)
+        pieces = model.astream(prompt).__aiter__()
+        while True:
+            try:
+                piece = await asyncio.wait_for(pieces.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                # part of the answer may already be sent, so no retry here,
+                # but later callers still wait out the quota
+                if is_rate_limited(e):
+                    scheduler.backoff(e, 1)
+                raise
+            yield piece
@@ -0,0 +1,308 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.config import (
+    LOCAL_INDEX_DIR,
+    LOCAL_INDEX_PRECISION,
+    LOCAL_INDEX_DIM,
+    LOCAL_INDEX_RESCORE_FACTOR,
+)
+from backend.metrics import track_stage
+
+logger = logging.getLogger("LocalIndex")
+
+PRECISIONS = ("float32", "float16", "int8")
+
+# open memory maps kept per file
+_CACHE_SIZE = 128
+
+# rows of the scan matrix upcast to float32 at a time
+_SCAN_BLOCK_ROWS = 4096
+
+
+def _scan_scores(scan, query):
+    """
+    scan @ query in row blocks: float16 / int8 rows are upcast one block at
+    a time instead of materialising a float32 copy of the whole mmap.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    if scan.dtype == np.float32:
+        return scan @ query
+    scores = np.empty(len(scan), dtype=np.float32)
+    for start in range(0, len(scan), _SCAN_BLOCK_ROWS):
+        block = scan[start:start + _SCAN_BLOCK_ROWS]
+        np.matmul(block.astype(np.float32), query, out=scores[start:start + len(block)])
+    return scores
+
+
+class _FileIndex:
+    """One file's vectors: a compact scan matrix plus full float32 rows for re-scoring."""
+
+    def __init__(self, meta, scan, full):
+        self.ids = meta["ids"]
+        self.documents = meta["documents"]
+        self.metadatas = meta["metadatas"]
+        self.scale = meta["scale"]  # int8 dequantisation factor, 1.0 otherwise
+        self.scan_dim = meta["scan_dim"]
+        self.scan_is_full = meta["scan_is_full"]
+        self.scan = scan  # (n, scan_dim) float32 / float16 / int8, memory-mapped
+        self.full = full  # (n, dim) float32 unit vectors, memory-mapped
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def quantize(full, precision, scan_dim):
+    """
+    Builds the scan matrix: the first scan_dim components (Matryoshka-style
+    truncation, re-normalised) stored at the given precision.
+    Returns (matrix, scale).
+    """
+    reduced = full[:, :scan_dim] if scan_dim < full.shape[1] else full
+    reduced = _unit_rows(reduced.astype(np.float32))
+    if precision == "float32":
+        return np.ascontiguousarray(reduced), 1.0
+    if precision == "float16":
+        return reduced.astype(np.float16), 1.0
+    if precision == "int8":
+        peak = float(np.abs(reduced).max()) or 1.0
+        scale = peak / 127.0
+        return np.clip(np.rint(reduced / scale), -127, 127).astype(np.int8), scale
+    raise ValueError(f"Unknown LOCAL_INDEX_PRECISION: {precision}")
+
+
+class LocalVectorIndex:
+    """
+    Per-file brute-force index on disk, a drop-in for VectorStore:
+      {file_id}.json             ids, documents, metadatas, current generation
+      {file_id}.{gen}.full.npy   float32 unit vectors (only top candidates are read)
+      {file_id}.{gen}.scan.npy   reduced-dimension, quantised copy scanned per query
+    Arrays are opened with mmap, so a query scans the compact matrix in
+    place and touches only the candidate rows of the full matrix.
+    """
+
+    def __init__(self, root=LOCAL_INDEX_DIR, precision=LOCAL_INDEX_PRECISION,
+                 scan_dim=LOCAL_INDEX_DIM, rescore_factor=LOCAL_INDEX_RESCORE_FACTOR):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown LOCAL_INDEX_PRECISION: {precision}")
+        self.root = root
+        self.precision = precision
+        self.scan_dim = scan_dim  # 0 = keep every dimension
+        self.rescore_factor = max(1, rescore_factor)
+        self.layout = "local"
+        self._cache = OrderedDict()  # file_id -> (mtime, _FileIndex)
+        self._cache_lock = threading.Lock()
+        self._write_locks = {}
+        os.makedirs(root, exist_ok=True)
+
+    # ---------------- Files ----------------
+
+    def _meta_path(self, file_id):
+        return os.path.join(self.root, f"{file_id}.json")
+
+    def _array_path(self, file_id, generation, part):
+        return os.path.join(self.root, f"{file_id}.{generation}.{part}.npy")
+
+    def _write_lock(self, file_id):
+        with self._cache_lock:
+            return self._write_locks.setdefault(file_id, threading.Lock())
+
+    def _load(self, file_id):
+        meta_path = self._meta_path(file_id)
+        try:
+            mtime = os.path.getmtime(meta_path)
+        except OSError:
+            return None
+        with self._cache_lock:
+            cached = self._cache.get(file_id)
+            if cached and cached[0] == mtime:
+                self._cache.move_to_end(file_id)
+                return cached[1]
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        generation = meta["generation"]
+        full = np.load(self._array_path(file_id, generation, "full"), mmap_mode="r")
+        if meta["scan_is_full"]:
+            scan = full
+        else:
+            scan = np.load(self._array_path(file_id, generation, "scan"), mmap_mode="r")
+        index = _FileIndex(meta, scan, full)
+        with self._cache_lock:
+            self._cache[file_id] = (mtime, index)
+            while len(self._cache) > _CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return index
+
+    def _save(self, file_id, ids, full, documents, metadatas):
+        """
+        Arrays go to new generation-named files and the JSON, which names the
+        generation, is replaced last: readers holding the old maps keep a
+        consistent view and no mapped file is ever overwritten.
+        """
+        if not ids:
+            self.delete_file(file_id)
+            return
+        full = _unit_rows(np.asarray(full, dtype=np.float32))
+        scan_dim = self.scan_dim if 0 < self.scan_dim < full.shape[1] else full.shape[1]
+        # float32 at full dimension would just duplicate the full matrix
+        scan_is_full = self.precision == "float32" and scan_dim == full.shape[1]
+
+        generation = f"{time.time_ns():x}"
+        np.save(self._array_path(file_id, generation, "full"), full)
+        scale = 1.0
+        if not scan_is_full:
+            scan, scale = quantize(full, self.precision, scan_dim)
+            np.save(self._array_path(file_id, generation, "scan"), scan)
+
+        meta = {
+            "generation": generation,
+            "ids": list(ids),
+            "documents": list(documents),
+            "metadatas": list(metadatas),
+            "scale": scale,
+            "scan_dim": scan_dim,
+            "scan_is_full": scan_is_full,
+            "precision": self.precision,
+        }
+        tmp = f"{self._meta_path(file_id)}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, self._meta_path(file_id))
+
+        with self._cache_lock:
+            self._cache.pop(file_id, None)
+        self._remove_arrays(file_id, keep=generation)
+        logger.info(f"🧮 Local index for {file_id}: {len(ids)} rows, {self.precision}, dim {scan_dim}")
+
+    def _remove_arrays(self, file_id, keep=None):
+        for path in glob.glob(os.path.join(glob.escape(self.root), f"{glob.escape(file_id)}.*.npy")):
+            if keep and os.path.basename(path).startswith(f"{file_id}.{keep}."):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # still mapped (Windows); removed by the next save
+
+    def _current(self, file_id):
+        index = self._load(file_id)
+        if index is None:
+            return [], np.zeros((0, 0), dtype=np.float32), [], []
+        return list(index.ids), np.array(index.full), list(index.documents), list(index.metadatas)
+
+    # ---------------- Writes (VectorStore interface) ----------------
+
+    def add(self, file_id, ids, embeddings, documents, metadatas):
+        with track_stage("vector_add"), self._write_lock(file_id):
+            old_ids, old_full, old_docs, old_metas = self._current(file_id)
+            new_full = np.asarray(embeddings, dtype=np.float32)
+            full = np.vstack([old_full, new_full]) if len(old_ids) else new_full
+            self._save(file_id, old_ids + list(ids), full, old_docs + list(documents), old_metas + list(metadatas))
+
+    def update_metadatas(self, file_id, ids, metadatas):
+        with self._write_lock(file_id):
+            cur_ids, full, docs, metas = self._current(file_id)
+            position = {cid: i for i, cid in enumerate(cur_ids)}
+            for cid, meta in zip(ids, metadatas):
+                if cid in position:
+                    metas[position[cid]] = meta
+            self._save(file_id, cur_ids, full, docs, metas)
+
+    def delete(self, file_id, ids):
+        with self._write_lock(file_id):
+            cur_ids, full, docs, metas = self._current(file_id)
+            drop = set(ids)
+            keep = [i for i, cid in enumerate(cur_ids) if cid not in drop]
+            self._save(file_id, [cur_ids[i] for i in keep], full[keep] if keep else full[:0],
+                       [docs[i] for i in keep], [metas[i] for i in keep])
+
+    def delete_file(self, file_id):
+        with self._cache_lock:
+            self._cache.pop(file_id, None)
+        try:
+            os.remove(self._meta_path(file_id))
+        except FileNotFoundError:
+            pass
+        self._remove_arrays(file_id)
+
+    # ---------------- Reads ----------------
+
+    def get_ids(self, file_id):
+        index = self._load(file_id)
+        return list(index.ids) if index else []
+
+    def _all_file_ids(self):
+        return [name[:-len(".json")] for name in os.listdir(self.root) if name.endswith(".json")]
+
+    def _search_file(self, index, query_full, query_scan, n_results):
+        """Top n_results (row, cosine) of one file: quantised scan, exact float32 re-score."""
+        n = len(index.ids)
+        if n == 0:
+            return []
+        coarse = _scan_scores(index.scan, query_scan)
+        if index.scan_is_full:
+            rows, exact = np.arange(n), coarse  # already exact
+        else:
+            n_candidates = min(n, n_results * self.rescore_factor)
+            if n_candidates < n:
+                rows = np.argpartition(-coarse, n_candidates - 1)[:n_candidates]
+            else:
+                rows = np.arange(n)
+            rows.sort()  # sequential reads from the full matrix
+            exact = index.full[rows] @ query_full
+        order = np.argsort(-exact)[:n_results]
+        return [(int(rows[i]), float(exact[i])) for i in order]
+
+    def query(self, query_embeddings, file_ids=None, n_results=3, include=("documents", "metadatas", "distances")):
+        """Same result shape as Chroma's collection.query, distances in cosine space."""
+        include = list(include)
+        if "distances" not in include:
+            include.append("distances")
+        keys = ["ids"] + include
+        merged = {key: [] for key in keys}
+
+        with track_stage("vector_query"):
+            indexes = [idx for idx in (self._load(fid) for fid in (file_ids or self._all_file_ids())) if idx]
+            for query in query_embeddings:
+                query_full = np.asarray(query, dtype=np.float32)
+                query_full /= (np.linalg.norm(query_full) or 1.0)
+                rows = []
+                for index in indexes:
+                    query_scan = query_full[:index.scan_dim]
+                    query_scan = query_scan / (np.linalg.norm(query_scan) or 1.0)
+                    if index.scale != 1.0:
+                        query_scan = query_scan * index.scale
+                    for row, score in self._search_file(index, query_full, query_scan, n_results):
+                        rows.append((1.0 - score, index, row))
+                rows.sort(key=lambda r: r[0])
+                rows = rows[:n_results]
+
+                merged["ids"].append([index.ids[row] for _, index, row in rows])
+                merged["distances"].append([dist for dist, _, _ in rows])
+                if "documents" in include:
+                    merged["documents"].append([index.documents[row] for _, index, row in rows])
+                if "metadatas" in include:
+                    merged["metadatas"].append([index.metadatas[row] for _, index, row in rows])
+                if "embeddings" in include:
+                    merged["embeddings"].append([np.array(index.full[row]) for _, index, row in rows])
+        return merged
+
+    def memory_stats(self, file_id):
+        """Bytes of the scanned matrix vs. a float32 full-dimension matrix."""
+        index = self._load(file_id)
+        if index is None:
+            return None
+        return {
+            "rows": len(index.ids),
+            "scan_bytes": int(index.scan.nbytes),
+            "float32_bytes": int(index.full.nbytes),
+            "saved_ratio": round(1 - index.scan.nbytes / index.full.nbytes, 3) if index.full.nbytes else 0.0,
+        }
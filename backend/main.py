@@ -1,29 +1,147 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from backend.routers import upload, extract ,embed ,query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from backend.routers import upload, extract ,embed ,query, jobs, documents
 from fastapi.middleware.cors import CORSMiddleware
-from backend.config import setup_logging
+from backend.config import setup_logging, WARMUP_CLIENTS, WORKERS, VECTOR_BACKEND, CHROMA_HOST
+import asyncio
 import logging
-from backend.database import engine, Base
+from sqlalchemy import text
+from backend.clients import registry
+from backend.database import engine, Base, IS_SQLITE, ensure_schema, session_scope
+from backend.answer_cache import InvalidationListener
+from backend.coordination import api_workers, detected_workers, hold_worker_lock, startup_lock
+from backend.jobs import fail_interrupted_jobs
+from backend.library import init_library_state
+from backend import metrics, rate_limit
+import time
 
 setup_logging()
 logger = logging.getLogger("MainApp")
 
 
-Base.metadata.create_all(bind=engine)
+def _init_database():
+    hold_worker_lock()
+    # every worker runs this at once; DDL and the state row go one at a time
+    with startup_lock():
+        Base.metadata.create_all(bind=engine)
+        ensure_schema()
+        init_library_state()
+        fail_interrupted_jobs()
 
-app = FastAPI(title="ChatZ")
+
+def _check_deployment():
+    workers = detected_workers()
+    if workers > WORKERS:
+        logger.error(
+            f"❌ uvicorn runs {workers} workers but WORKERS={WORKERS}; rate limits are split {workers} ways "
+            f"here, set WORKERS={workers}"
+        )
+    workers = api_workers()
+    if workers <= 1:
+        return
+    if VECTOR_BACKEND == "chroma" and not CHROMA_HOST:
+        # concurrent writers would corrupt the embedded store
+        raise RuntimeError(f"{workers} workers can't share the embedded Chroma store; run a Chroma server "
+                           f"and set CHROMA_HOST, use VECTOR_BACKEND=local, or run one worker")
+    if IS_SQLITE:
+        logger.warning(f"⚠️ {workers} workers share a SQLite file; use a PostgreSQL DATABASE_URL")
+
+
+def _warmup_names():
+    if WARMUP_CLIENTS.strip().lower() == "all":
+        return registry.names
+    return [name.strip() for name in WARMUP_CLIENTS.split(",") if name.strip()]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start = time.perf_counter()
+    _check_deployment()
+    await run_in_threadpool(_init_database)
+
+    # answers invalidated by other workers or the bulk-ingest CLI
+    app.state.invalidations = InvalidationListener()
+    await run_in_threadpool(app.state.invalidations.start)
+
+    # Heavy clients are built on first use; WARMUP_CLIENTS builds them in
+    # the background instead, while the server already accepts requests
+    # (/ready reports 503 until they are done)
+    warmup_names = _warmup_names()
+    app.state.warmup_names = warmup_names
+    app.state.warmup = (
+        asyncio.create_task(asyncio.to_thread(registry.warm_up, warmup_names)) if warmup_names else None
+    )
+    logger.info(f"🚀 Startup finished in {time.perf_counter() - start:.2f}s (warm-up: {warmup_names or 'none'})")
+
+    yield
+
+    app.state.invalidations.stop()
+    if app.state.warmup is not None and not app.state.warmup.done():
+        app.state.warmup.cancel()
+
+
+app = FastAPI(title="ChatZ", lifespan=lifespan)
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     logger.info(f"➡️ Incoming Request: {request.method} {request.url}")
 
+    start = time.perf_counter()
     response = await call_next(request)
+    elapsed = time.perf_counter() - start
 
-    logger.info(f"⬅️ Response Status: {response.status_code}")
+    # label by route template (/query/{...}), never the raw path, so the
+    # number of series stays bounded
+    route = request.scope.get("route")
+    metrics.HTTP_SECONDS.observe(
+        elapsed,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=f"{response.status_code // 100}xx",
+    )
+
+    logger.info(f"⬅️ Response Status: {response.status_code} ({elapsed * 1000:.1f} ms)")
 
     return response
 
 
+def _database_ok():
+    with session_scope() as db:
+        db.execute(text("SELECT 1"))
+
+
+@app.get("/ready", include_in_schema=False)
+async def readiness():
+    """200 once the database answers and every warm-up client is built, else 503."""
+    clients = registry.status()
+    problems = []
+    try:
+        await run_in_threadpool(_database_ok)
+    except Exception as e:
+        problems.append(f"database: {e}")
+    for name in app.state.warmup_names:
+        if not clients.get(name, {}).get("ready"):
+            problems.append(f"{name}: {clients.get(name, {}).get('error') or 'warming up'}")
+
+    return JSONResponse(
+        {"ready": not problems, "problems": problems, "clients": clients},
+        status_code=200 if not problems else 503,
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ratelimit/stats")
+def rate_limit_stats():
+    """Queue depth, waits and quota errors of the embedding and LLM schedulers."""
+    return rate_limit.stats()
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -36,4 +154,6 @@ app.include_router(upload.router)
 app.include_router(extract.router)
 app.include_router(embed.router)
 app.include_router(query.router)
+app.include_router(jobs.router)
+app.include_router(documents.router)
 
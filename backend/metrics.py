@@ -0,0 +1,192 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Only a handful of fixed label values are ever used (stage names, route
+templates, status classes), so series counts stay bounded. Recording is a
+dict lookup plus a short lock per observation.
+Values are per process; with several workers each one reports its own.
+"""
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[n] for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {_fmt(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {_fmt(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[slot] += 1  # slot == len(buckets) is the +Inf-only bucket
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_label_str(self.labelnames, key, [('le', _fmt(bound))])} {cumulative}"
+                )
+            labels = _label_str(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_fmt(float(series[-2]))}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+def render():
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# ---------------- ChatZ metrics ----------------
+
+# upload_write, page_count, extract, chunk, embed_batch, vector_add,
+# vector_query, llm_call
+STAGE_SECONDS = Histogram(
+    "chatz_stage_duration_seconds", "Time spent in each pipeline stage.", ["stage"]
+)
+CHUNKS = Counter("chatz_chunks_total", "Chunks produced by the chunker.")
+PAGES = Counter("chatz_pages_total", "PDF pages extracted.")
+BYTES = Counter("chatz_bytes_total", "Bytes processed.", ["kind"])  # upload
+EXTERNAL_CALLS = Counter(
+    "chatz_external_calls_total", "Calls to external model APIs.", ["service", "outcome"]
+)  # service: embedding | llm, outcome: ok | error | timeout
+FAILURES = Counter("chatz_failures_total", "Failed pipeline operations.", ["stage"])
+HTTP_SECONDS = Histogram(
+    "chatz_http_request_duration_seconds", "HTTP request latency.", ["method", "route", "status"]
+)
+# service: embedding | llm, priority: interactive | background
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "chatz_ratelimit_wait_seconds", "Time model calls waited for a rate-limit slot.", ["service", "priority"]
+)
+RATE_LIMIT_QUEUE = Gauge(
+    "chatz_ratelimit_queue_depth", "Model calls waiting for a rate-limit slot.", ["service", "priority"]
+)
+RATE_LIMITED = Counter("chatz_ratelimit_hits_total", "Quota errors (429) from model APIs.", ["service"])
+
+
+@contextmanager
+def track_stage(stage):
+    """Times a stage and counts it as failed if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        FAILURES.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+@contextmanager
+def external_call(service):
+    """Counts one external API call by outcome (ok / timeout / error)."""
+    try:
+        yield
+    except (asyncio.TimeoutError, TimeoutError):
+        EXTERNAL_CALLS.inc(service=service, outcome="timeout")
+        raise
+    except Exception:
+        EXTERNAL_CALLS.inc(service=service, outcome="error")
+        raise
+    EXTERNAL_CALLS.inc(service=service, outcome="ok")
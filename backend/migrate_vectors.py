@@ -0,0 +1,93 @@
+"""
+Moves vectors out of the legacy shared `pdf_collection` into the collections
+of the configured VECTOR_LAYOUT.
+
+    python -m backend.migrate_vectors                 # copy, keep the source
+    python -m backend.migrate_vectors --delete-source # drop pdf_collection afterwards
+    python -m backend.migrate_vectors --dry-run       # only count what would move
+
+Copies use upsert, so an interrupted run can simply be started again.
+"""
+import argparse
+import logging
+from collections import defaultdict
+
+from backend.config import setup_logging
+from backend.vector_store import LEGACY_COLLECTION, get_vector_store
+
+logger = logging.getLogger("MigrateVectors")
+
+
+def migrate(store, batch_size=1000, delete_source=False, dry_run=False):
+    if store.layout == "single":
+        logger.info("VECTOR_LAYOUT=single already reads pdf_collection, nothing to migrate")
+        return {}
+    if store.layout == "local":
+        logger.info("VECTOR_BACKEND=local is filled by re-embedding (embeddings come from the cache), nothing to migrate")
+        return {}
+
+    try:
+        source = store.client.get_collection(name=LEGACY_COLLECTION)
+    except Exception:
+        logger.info(f"No {LEGACY_COLLECTION} collection found, nothing to migrate")
+        return {}
+
+    total = source.count()
+    logger.info(f"🚚 Migrating {total} vectors from {LEGACY_COLLECTION} (layout={store.layout})")
+
+    moved = defaultdict(int)
+    offset = 0
+    while offset < total:
+        page = source.get(
+            limit=batch_size,
+            offset=offset,
+            include=["embeddings", "documents", "metadatas"],
+        )
+        ids = page["ids"]
+        if not len(ids):
+            break
+
+        by_file = defaultdict(lambda: ([], [], [], []))
+        for i, vid in enumerate(ids):
+            meta = page["metadatas"][i] or {}
+            file_id = meta.get("file_id")
+            if not file_id:
+                logger.warning(f"⚠️ Skipping {vid}: no file_id in metadata")
+                continue
+            group = by_file[file_id]
+            group[0].append(vid)
+            group[1].append(page["embeddings"][i])
+            group[2].append(page["documents"][i])
+            group[3].append(meta)
+
+        for file_id, (g_ids, g_embeddings, g_documents, g_metadatas) in by_file.items():
+            if not dry_run:
+                store.collection_for(file_id).upsert(
+                    ids=g_ids, embeddings=g_embeddings, documents=g_documents, metadatas=g_metadatas
+                )
+            moved[file_id] += len(g_ids)
+
+        offset += len(ids)
+        logger.info(f"  {offset}/{total} vectors processed, {len(moved)} files")
+
+    if delete_source and not dry_run:
+        store.client.delete_collection(name=LEGACY_COLLECTION)
+        logger.info(f"🗑️ Deleted {LEGACY_COLLECTION}")
+
+    logger.info(f"✅ {'Would move' if dry_run else 'Moved'} {sum(moved.values())} vectors for {len(moved)} files")
+    return dict(moved)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate pdf_collection into the configured VECTOR_LAYOUT")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--delete-source", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    setup_logging()
+    migrate(get_vector_store(), args.batch_size, args.delete_source, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 # backend/models.py
-from sqlalchemy import Column, String, Boolean, Integer
+from sqlalchemy import Column, String, Boolean, Integer, Float, LargeBinary, Index
 from sqlalchemy.orm import declarative_base
 from backend.database import Base
 
@@ -7,9 +7,63 @@ class FileInfo(Base):
     __tablename__ = "file_info"
 
     file_id = Column(String, primary_key=True)
-    file_name = Column(String, unique=True, nullable=True)
+    file_name = Column(String, index=True, nullable=True)
     num_pages = Column(Integer, nullable=True)
-    uploaded_at = Column(String, nullable=True)
-    embedding_status = Column(Boolean, default=False)
-    
-    
+    uploaded_at = Column(String, nullable=True, index=True)
+    embedding_status = Column(Boolean, default=False, index=True)
+    content_hash = Column(String, unique=True, index=True, nullable=True)  # sha256 of the file bytes
+    file_size = Column(Integer, nullable=True)
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    # "<model>:<sha256 of chunk text>"
+    cache_key = Column(String, primary_key=True)
+    model = Column(String, nullable=False)
+    dim = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # packed float32
+    last_used_at = Column(Float, nullable=False, index=True)
+
+
+class IngestJob(Base):
+    __tablename__ = "ingest_job"
+
+    job_id = Column(String, primary_key=True)
+    file_id = Column(String, nullable=False, index=True)
+    kind = Column(String, nullable=False)  # extract | embed | ingest
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed
+    pages_total = Column(Integer, default=0)
+    pages_done = Column(Integer, default=0)
+    chunks_total = Column(Integer, default=0)
+    chunks_done = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(String, nullable=True)
+    updated_at = Column(String, nullable=True)
+    worker = Column(String, nullable=True)  # host:pid:token of the process running it
+
+    __table_args__ = (
+        # active-job and latest-job lookups per file, interrupted-job sweep
+        Index("ix_ingest_job_file_status", "file_id", "status"),
+        Index("ix_ingest_job_file_created", "file_id", "created_at"),
+        Index("ix_ingest_job_status", "status"),
+    )
+
+
+class LibraryState(Base):
+    __tablename__ = "library_state"
+
+    # single row; version is bumped whenever a listing could change
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(Float, nullable=False)  # unix time of the last bump
+
+
+class AnswerCacheInvalidation(Base):
+    __tablename__ = "answer_cache_invalidation"
+
+    # append-only log every worker polls to drop answers another process invalidated
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_id = Column(String, nullable=False)
+    worker = Column(String, nullable=True)
+    created_at = Column(Float, nullable=False, index=True)
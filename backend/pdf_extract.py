@@ -0,0 +1,201 @@
+import json
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from backend.config import EXTRACT_ENGINE, EXTRACT_WORKERS, EXTRACT_PARALLEL_MIN_PAGES
+
+logger = logging.getLogger("PdfExtract")
+
+ENGINES = ("pymupdf", "pypdf2", "auto")
+
+
+class PdfUnreadableError(Exception):
+    """The PDF is encrypted or corrupt."""
+
+
+# ---------------- Engines (module-level so they pickle for the pool) ----------------
+
+def _page_count(engine, pdf_path):
+    if engine == "pymupdf":
+        import fitz
+
+        with fitz.open(pdf_path) as doc:
+            if doc.needs_pass:
+                raise PdfUnreadableError("PDF is encrypted")
+            return doc.page_count
+
+    import PyPDF2
+
+    try:
+        reader = PyPDF2.PdfReader(pdf_path)
+        return len(reader.pages)
+    except PyPDF2.errors.PdfReadError as e:
+        raise PdfUnreadableError(str(e))
+
+
+def _extract_range(engine, pdf_path, start, end, on_page=None):
+    """Returns the text of pages [start, end) as a list."""
+    texts = []
+    if engine == "pymupdf":
+        import fitz
+
+        with fitz.open(pdf_path) as doc:
+            for i in range(start, end):
+                texts.append(doc[i].get_text("text"))
+                if on_page:
+                    on_page(len(texts))
+        return texts
+
+    import PyPDF2
+
+    try:
+        reader = PyPDF2.PdfReader(pdf_path)
+        for i in range(start, end):
+            texts.append(reader.pages[i].extract_text() or "")
+            if on_page:
+                on_page(len(texts))
+    except PyPDF2.errors.PdfReadError as e:
+        raise PdfUnreadableError(str(e))
+    return texts
+
+
+# ---------------- Process pool ----------------
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _discard_broken(pool):
+    # a broken pool can leave surviving workers blocked on its queues, and
+    # the interpreter would wait for them forever at exit
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def _submit_ranges(engine, pdf_path, ranges, workers):
+    """
+    Submits every range to the long-lived pool of this process, growing it
+    first if a caller asks for more workers and rebuilding it if a worker
+    died (a broken pool rejects every later submit). The lock covers both,
+    so a pool is never replaced between another thread's lookup and its
+    submits; a replaced pool still finishes the ranges already queued.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        broken = _pool is not None and getattr(_pool, "_broken", False)
+        if broken:
+            logger.warning("♻️ Extraction pool is broken (a worker died), starting a new one")
+        if _pool is None or broken or _pool_workers < workers:
+            if broken:
+                _discard_broken(_pool)
+            elif _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: forking a threaded server process is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_workers = workers
+        return {
+            _pool.submit(_extract_range, engine, pdf_path, start, end): (start, end)
+            for start, end in ranges
+        }
+
+
+def _page_ranges(total, workers):
+    # two ranges per worker keeps the pool busy when pages are uneven
+    parts = min(total, workers * 2)
+    size, extra = divmod(total, parts)
+    ranges, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _extract_with(engine, pdf_path, workers, min_parallel_pages, progress):
+    total = _page_count(engine, pdf_path)
+    if total == 0:
+        return []
+
+    if workers <= 1 or total < min_parallel_pages:
+        on_page = (lambda done: progress(done, total)) if progress else None
+        return _extract_range(engine, pdf_path, 0, total, on_page)
+
+    ranges = _page_ranges(total, workers)
+    try:
+        results = _run_ranges(engine, pdf_path, ranges, workers, total, progress)
+    except BrokenProcessPool as e:
+        # a worker crashed (OOM, a segfault in the PDF library); the next
+        # submit gets a fresh pool, so retry once before giving up
+        logger.error(f"💥 Extraction worker died on {pdf_path} ({e}), retrying on a new pool")
+        results = _run_ranges(engine, pdf_path, ranges, workers, total, progress)
+    return [text for start, _ in ranges for text in results[start]]
+
+
+def _run_ranges(engine, pdf_path, ranges, workers, total, progress):
+    futures = _submit_ranges(engine, pdf_path, ranges, workers)
+    results = {}
+    done_pages = 0
+    for future in as_completed(futures):
+        start, end = futures[future]
+        results[start] = future.result()
+        done_pages += end - start
+        if progress:
+            progress(done_pages, total)
+    return results
+
+
+def extract_pages(
+    pdf_path,
+    engine=EXTRACT_ENGINE,
+    workers=EXTRACT_WORKERS,
+    min_parallel_pages=EXTRACT_PARALLEL_MIN_PAGES,
+    progress=None,
+):
+    """
+    Extracts text per page and returns a list with one string per page.
+    Large documents are split into page ranges and extracted on a process
+    pool. engine="auto" uses PyMuPDF and falls back to PyPDF2 if PyMuPDF is
+    missing or fails on the file.
+    progress(pages_done, pages_total) is called as ranges finish.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown extraction engine: {engine}")
+
+    if engine != "auto":
+        return _extract_with(engine, pdf_path, workers, min_parallel_pages, progress)
+
+    try:
+        return _extract_with("pymupdf", pdf_path, workers, min_parallel_pages, progress)
+    except PdfUnreadableError:
+        raise
+    except Exception as e:
+        logger.warning(f"⚠️ PyMuPDF extraction failed ({e}), falling back to PyPDF2")
+        return _extract_with("pypdf2", pdf_path, workers, min_parallel_pages, progress)
+
+
+# ---------------- Per-page storage ----------------
+
+def write_pages(path, pages):
+    """Stores pages as JSON lines: {"page": <1-based number>, "text": ...}."""
+    with open(path, "w", encoding="utf-8") as out:
+        for page_no, text in enumerate(pages, start=1):
+            out.write(json.dumps({"page": page_no, "text": text}, ensure_ascii=False))
+            out.write("\n")
+
+
+def read_pages(path):
+    """Yields (page_number, text) one page at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["page"], record["text"]
@@ -0,0 +1,366 @@
+"""
+Process-wide scheduler for calls to the external model APIs.
+
+Every embedding and LLM call takes a slot from its service's scheduler
+first. A slot costs one request plus an estimate of the call's tokens,
+drawn from requests-per-minute and tokens-per-minute token buckets.
+Waiting calls are served strictly by priority class (interactive before
+background), and round-robin between keys (file ids) inside a class, so
+one large ingest cannot starve other files. A quota error (429) pauses the
+whole service for the server's retry-after, or an exponential backoff,
+instead of letting every caller hammer the API at once.
+"""
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from backend.config import (
+    EMBED_RPM,
+    EMBED_TPM,
+    LLM_RPM,
+    LLM_TPM,
+    RATE_LIMIT_MAX_RETRIES,
+    RATE_LIMIT_BACKOFF_SECONDS,
+    RATE_LIMIT_BURST_SECONDS,
+    BULK_INGEST_RATE_SHARE,
+)
+from backend.coordination import api_workers, live_workers
+from backend.metrics import RATE_LIMIT_WAIT_SECONDS, RATE_LIMIT_QUEUE, RATE_LIMITED
+
+logger = logging.getLogger("RateLimit")
+
+PRIORITIES = ("interactive", "background")
+
+_RETRY_AFTER_PATTERN = re.compile(r"retry[ _-]?(?:after|delay|in)\D{0,20}?(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+def estimate_tokens(texts):
+    """~4 characters per token, the usual rule of thumb for Gemini."""
+    if isinstance(texts, str):
+        texts = [texts]
+    return sum(len(t) for t in texts) // 4 + 1
+
+
+def is_rate_limited(exc):
+    """True for quota errors: HTTP 429 / RESOURCE_EXHAUSTED from any client library."""
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if value == 429 or str(value).endswith("RESOURCE_EXHAUSTED"):
+            return True
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    text = str(exc)
+    return bool(re.search(r"\b429\b", text)) or "RESOURCE_EXHAUSTED" in text or "rate limit" in text.lower()
+
+
+def retry_after_seconds(exc):
+    """Server-requested delay from a Retry-After header or the error text, else None."""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        match = _RETRY_AFTER_PATTERN.search(str(exc))
+        value = match.group(1) if match else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    per_minute units refilled continuously, at most burst_seconds worth
+    banked; per_minute <= 0 means unlimited.
+    """
+
+    def __init__(self, per_minute, burst_seconds=60.0):
+        self.per_minute = float(per_minute)
+        self.rate = self.per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds) if self.per_minute > 0 else 0.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return self.per_minute <= 0
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)  # a call larger than the bucket still runs, alone
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("priority", "key", "cost", "enqueued", "event", "loop", "future")
+
+    def __init__(self, priority, key, cost, loop=None):
+        self.priority = priority
+        self.key = key
+        self.cost = cost
+        self.enqueued = time.monotonic()
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def grant(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self._resolve)
+            except RuntimeError:
+                pass  # loop already closed, nobody is waiting
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class RateLimitScheduler:
+    """
+    Admission control for one service ("embedding" or "llm").
+    Sync callers block on acquire(), async callers await aacquire();
+    both are granted by one dispatcher thread, started on first contention.
+    """
+
+    def __init__(self, service, rpm=0, tpm=0, max_retries=RATE_LIMIT_MAX_RETRIES,
+                 backoff_seconds=RATE_LIMIT_BACKOFF_SECONDS, burst_seconds=RATE_LIMIT_BURST_SECONDS):
+        self.service = service
+        self.requests = TokenBucket(rpm, burst_seconds)
+        self.tokens = TokenBucket(tpm, burst_seconds)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._cond = threading.Condition()
+        self._queues = {p: OrderedDict() for p in PRIORITIES}  # key -> deque of waiters
+        self._paused_until = 0.0
+        self._dispatcher = None
+        self._granted = {p: 0 for p in PRIORITIES}
+        self._wait_total = {p: 0.0 for p in PRIORITIES}
+        self._wait_max = {p: 0.0 for p in PRIORITIES}
+        self._rate_limited = 0
+
+    # ---------------- Queue ----------------
+
+    def _depth(self, priority):
+        return sum(len(q) for q in self._queues[priority].values())
+
+    def _head(self):
+        """Next waiter by priority, then round-robin over keys; None if nobody waits."""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            if queue:
+                return next(iter(queue.values()))[0]
+        return None
+
+    def _pop(self, waiter):
+        queue = self._queues[waiter.priority]
+        waiters = queue[waiter.key]
+        waiters.popleft()
+        if waiters:
+            queue.move_to_end(waiter.key)  # this key waits for its next turn
+        else:
+            del queue[waiter.key]
+        RATE_LIMIT_QUEUE.set(self._depth(waiter.priority), service=self.service, priority=waiter.priority)
+
+    def _remove(self, waiter):
+        waiters = self._queues[waiter.priority].get(waiter.key)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[waiter.priority][waiter.key]
+            RATE_LIMIT_QUEUE.set(self._depth(waiter.priority), service=self.service, priority=waiter.priority)
+
+    def _delay(self, cost, now):
+        return max(
+            self._paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(cost, now),
+        )
+
+    def _admit(self, priority, cost, enqueued, now):
+        self.requests.take(1, now)
+        self.tokens.take(cost, now)
+        waited = now - enqueued
+        self._granted[priority] += 1
+        self._wait_total[priority] += waited
+        self._wait_max[priority] = max(self._wait_max[priority], waited)
+        RATE_LIMIT_WAIT_SECONDS.observe(waited, service=self.service, priority=priority)
+
+    def _try_fast_path(self, priority, cost):
+        """Admits immediately when nobody is queued and the buckets allow it."""
+        now = time.monotonic()
+        if self._head() is None and self._delay(cost, now) <= 0:
+            self._admit(priority, cost, now, now)
+            return True
+        return False
+
+    def _enqueue(self, waiter):
+        if waiter.priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {waiter.priority}")
+        self._queues[waiter.priority].setdefault(waiter.key, deque()).append(waiter)
+        RATE_LIMIT_QUEUE.set(self._depth(waiter.priority), service=self.service, priority=waiter.priority)
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(
+                target=self._dispatch, name=f"ratelimit-{self.service}", daemon=True
+            )
+            self._dispatcher.start()
+        self._cond.notify()
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                waiter = self._head()
+                if waiter is None:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                delay = self._delay(waiter.cost, now)
+                if delay > 0:
+                    self._cond.wait(delay)  # new arrivals or a pause re-evaluate sooner
+                    continue
+                self._pop(waiter)
+                self._admit(waiter.priority, waiter.cost, waiter.enqueued, now)
+            waiter.grant()
+
+    # ---------------- Admission ----------------
+
+    def acquire(self, cost=1, priority="background", key=None):
+        """Blocks until one request costing `cost` tokens may be sent."""
+        with self._cond:
+            if self._try_fast_path(priority, cost):
+                return
+            waiter = _Waiter(priority, key, cost)
+            self._enqueue(waiter)
+        waiter.event.wait()
+
+    async def aacquire(self, cost=1, priority="interactive", key=None):
+        """acquire() for the event loop; cancelling the caller leaves the queue."""
+        with self._cond:
+            if self._try_fast_path(priority, cost):
+                return
+            waiter = _Waiter(priority, key, cost, loop=asyncio.get_running_loop())
+            self._enqueue(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._cond:
+                self._remove(waiter)
+            raise
+
+    def backoff(self, exc, attempt):
+        """Pauses the whole service after a quota error; returns the pause in seconds."""
+        delay = retry_after_seconds(exc)
+        if delay is None:
+            delay = self.backoff_seconds * 2 ** (attempt - 1) * (0.5 + random.random())
+        with self._cond:
+            self._rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._cond.notify()
+        RATE_LIMITED.inc(service=self.service)
+        logger.warning(f"⏳ {self.service} quota exceeded, pausing {delay:.2f}s (attempt {attempt})")
+        return delay
+
+    def call(self, fn, cost=1, priority="background", key=None):
+        """Runs fn() under the limits, retrying quota errors up to max_retries times."""
+        attempt = 0
+        while True:
+            self.acquire(cost, priority, key)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.backoff(e, attempt)
+
+    async def acall(self, make_call, cost=1, priority="interactive", key=None):
+        """call() for coroutines; make_call() must return a fresh awaitable per attempt."""
+        attempt = 0
+        while True:
+            await self.aacquire(cost, priority, key)
+            try:
+                return await make_call()
+            except Exception as e:
+                if not is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.backoff(e, attempt)
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "rpm": self.requests.per_minute or None,
+                "tpm": self.tokens.per_minute or None,
+                "paused_seconds": round(max(0.0, self._paused_until - now), 3),
+                "rate_limited": self._rate_limited,
+                "queues": {
+                    p: {
+                        "depth": self._depth(p),
+                        "keys": len(self._queues[p]),
+                        "granted": self._granted[p],
+                        "mean_wait_ms": round(self._wait_total[p] / self._granted[p] * 1000, 2)
+                        if self._granted[p] else 0.0,
+                        "max_wait_ms": round(self._wait_max[p] * 1000, 2),
+                    }
+                    for p in PRIORITIES
+                },
+            }
+
+
+def _share(limit, fraction):
+    """fraction of a deployment-wide limit (0 stays unlimited)."""
+    return max(1, int(limit * fraction)) if limit else 0
+
+
+def _build_schedulers(fraction):
+    return {
+        "embedding": RateLimitScheduler("embedding", _share(EMBED_RPM, fraction), _share(EMBED_TPM, fraction)),
+        "llm": RateLimitScheduler("llm", _share(LLM_RPM, fraction), _share(LLM_TPM, fraction)),
+    }
+
+
+# every API worker gets an equal part of what the bulk-ingest CLI leaves
+_schedulers = _build_schedulers((1 - BULK_INGEST_RATE_SHARE) / api_workers())
+
+
+def use_bulk_ingest_share(share=BULK_INGEST_RATE_SHARE):
+    """
+    Switches this process (the bulk-ingest CLI) to `share` of each limit;
+    0 = the whole quota, for runs while the API is stopped.
+    """
+    if not share and live_workers():
+        logger.warning("⚠️ API workers are running and BULK_INGEST_RATE_SHARE is 0: "
+                       "the CLI and the API each assume the whole quota and will hit 429s")
+    _schedulers.update(_build_schedulers(share or 1.0))
+
+
+def get_scheduler(service):
+    return _schedulers[service]
+
+
+def configure(service, **kwargs):
+    """Replaces a service's scheduler (new limits take effect for later calls)."""
+    _schedulers[service] = RateLimitScheduler(service, **kwargs)
+    return _schedulers[service]
+
+
+def stats():
+    return {service: scheduler.stats() for service, scheduler in _schedulers.items()}
@@ -0,0 +1,94 @@
+import logging
+from dataclasses import dataclass, field, replace
+
+from backend.config import CROSS_DOC_OVERFETCH, CROSS_DOC_MAX_CANDIDATES, RRF_K
+
+logger = logging.getLogger("Retrieval")
+
+
+@dataclass
+class Hit:
+    id: str
+    document: str
+    metadata: dict = field(default_factory=dict)
+    score: float = 0.0  # cosine similarity / BM25 / RRF score, higher is better
+    embedding: object = None  # only when requested from the vector store
+
+    @property
+    def file_id(self):
+        return self.metadata.get("file_id")
+
+
+def merge_hits(hits, top_k, per_file_cap=None, score_threshold=None):
+    """
+    Global top-k over hits already sorted best-first, keeping at most
+    per_file_cap hits per file and dropping anything below score_threshold.
+    """
+    per_file = {}
+    merged = []
+    for hit in hits:
+        if score_threshold is not None and hit.score < score_threshold:
+            break  # sorted, so nothing further can pass
+        if per_file_cap is not None:
+            if per_file.get(hit.file_id, 0) >= per_file_cap:
+                continue
+            per_file[hit.file_id] = per_file.get(hit.file_id, 0) + 1
+        merged.append(hit)
+        if len(merged) == top_k:
+            break
+    return merged
+
+
+def search(store, query_embeddings, file_ids=None, top_k=3, per_file_cap=None, score_threshold=None,
+           include_embeddings=False):
+    """
+    One vector search for every query embedding, restricted to file_ids
+    (routed through the VectorStore layout).
+    When a per-file cap or threshold can discard results, more candidates
+    are fetched so the final list can still reach top_k.
+    Returns one list of Hit per query embedding.
+    """
+    n_results = top_k
+    if per_file_cap is not None or score_threshold is not None:
+        n_results = min(max(top_k * CROSS_DOC_OVERFETCH, top_k), CROSS_DOC_MAX_CANDIDATES)
+
+    include = ["documents", "metadatas", "distances"]
+    if include_embeddings:
+        include.append("embeddings")
+    results = store.query(query_embeddings, file_ids=file_ids, n_results=n_results, include=include)
+
+    ids_list = results.get("ids") or []
+    documents_list = results.get("documents") or []
+    metadatas_list = results.get("metadatas") or []
+    distances_list = results.get("distances") or []
+    embeddings_list = results.get("embeddings") or [[None] * len(ids) for ids in ids_list]
+
+    all_hits = []
+    for q in range(len(ids_list)):
+        hits = [
+            # cosine space: distance = 1 - similarity
+            Hit(id=i, document=d, metadata=m or {}, score=1.0 - dist, embedding=e)
+            for i, d, m, dist, e in zip(
+                ids_list[q], documents_list[q], metadatas_list[q], distances_list[q], embeddings_list[q]
+            )
+        ]
+        all_hits.append(merge_hits(hits, top_k, per_file_cap, score_threshold))
+    return all_hits
+
+
+def rrf_fuse(ranked_lists, k=RRF_K):
+    """
+    Reciprocal rank fusion: each hit scores sum(1 / (k + rank)) over the
+    lists it appears in, so retrievers with incomparable scores (cosine,
+    BM25) can be combined. Returns one list, best-first.
+    """
+    fused = {}
+    for hits in ranked_lists:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.get(hit.id)
+            if entry is None:
+                entry = fused[hit.id] = replace(hit, score=0.0)
+            elif entry.embedding is None:
+                entry.embedding = hit.embedding
+            entry.score += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda h: h.score, reverse=True)
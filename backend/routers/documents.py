@@ -0,0 +1,163 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+import os
+import logging
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from backend.database import get_db, run_db, session_scope
+from backend.models import FileInfo, IngestJob
+from backend.library import bump_version
+from backend.answer_cache import get_answer_cache, publish_invalidation
+from backend.coordination import file_lock
+from backend.vector_store import get_vector_store
+from backend import lexical_index
+from backend.jobs import ACTIVE_STATUSES, latest_job_for_file, submit_job
+from backend.routers.upload import UPLOAD_DIR, UPLOAD_REQUEST_BODY, count_pages, remove_quietly, save_upload
+
+load_dotenv()
+
+router = APIRouter(prefix="/documents", tags=["Documents"])
+logger = logging.getLogger("DocumentsRouter")
+
+EXTRACT_DIR = os.getenv("EXTRACT_DIR")
+
+
+def _get_file_or_404(db: Session, file_id: str):
+    record = db.query(FileInfo).filter(FileInfo.file_id == file_id).first()
+    if not record:
+        raise HTTPException(404, "File not found")
+    return record
+
+
+def _ensure_idle(file_id: str):
+    job = latest_job_for_file(file_id)
+    if job and job["status"] in ACTIVE_STATUSES:
+        raise HTTPException(409, f"Job {job['job_id']} is still {job['status']} for this file")
+
+
+def _current_hash(db: Session, file_id: str):
+    return _get_file_or_404(db, file_id).content_hash
+
+
+def _hash_owner(db: Session, content_hash: str):
+    other = db.query(FileInfo.file_id).filter(FileInfo.content_hash == content_hash).first()
+    return other.file_id if other else None
+
+
+def _record_replacement(db: Session, file_id: str, fields: dict):
+    record = _get_file_or_404(db, file_id)
+    for key, value in fields.items():
+        setattr(record, key, value)
+    bump_version(db)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        # a concurrent replace or upload stored the same bytes after the
+        # _hash_owner check
+        db.rollback()
+        owner = _hash_owner(db, fields.get("content_hash"))
+        logger.warning(f"⚠️ Replacing {file_id} lost a race: {e.orig}")
+        raise HTTPException(409, f"This content is already stored as {owner}" if owner
+                            else "The new version conflicts with an existing record")
+
+
+def _swap_file(file_id: str, tmp_path: str, fields: dict):
+    # under the file's lock, so no worker is extracting the old PDF meanwhile;
+    # the old PDF is kept aside until the new row is committed, and put back
+    # if the commit fails, so the file on disk always matches content_hash
+    path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
+    backup = f"{path}.old"
+    with file_lock(file_id), session_scope() as db:
+        had_old = os.path.exists(path)
+        if had_old:
+            os.replace(path, backup)
+        try:
+            os.replace(tmp_path, path)
+            _record_replacement(db, file_id, fields)
+        except BaseException:
+            if had_old:
+                os.replace(backup, path)
+            else:
+                remove_quietly(path)
+            remove_quietly(tmp_path)
+            raise
+        remove_quietly(backup)
+
+
+@router.put("/{file_id}", openapi_extra=UPLOAD_REQUEST_BODY)
+async def replace_document(file_id: str, request: Request, reingest: bool = True):
+    """
+    Replaces the PDF behind file_id with a new version. Re-ingest diffs the
+    chunks by content hash, so only new or changed chunks are embedded and
+    chunks that disappeared are removed from the vector store.
+    """
+    current_hash = await run_db(_current_hash, file_id)
+    await run_in_threadpool(_ensure_idle, file_id)
+
+    tmp_path, content_hash, size, file_name = await save_upload(request)
+
+    # 1️⃣ Same bytes as the current version → nothing to do
+    if content_hash == current_hash:
+        remove_quietly(tmp_path)
+        return {"message": "Document unchanged", "file_id": file_id, "job": None}
+
+    # 2️⃣ Same bytes as another document → refuse, content must stay unique
+    owner = await run_db(_hash_owner, content_hash)
+    if owner:
+        remove_quietly(tmp_path)
+        raise HTTPException(409, f"This content is already stored as {owner}")
+
+    try:
+        num_pages = await run_in_threadpool(count_pages, tmp_path)
+    except Exception:
+        remove_quietly(tmp_path)
+        raise HTTPException(400, "Uploaded file is not a readable PDF")
+
+    # 3️⃣ Swap the file in place and record the new version
+    await run_in_threadpool(_swap_file, file_id, tmp_path, {
+        "file_name": file_name,
+        "content_hash": content_hash,
+        "file_size": size,
+        "num_pages": num_pages,
+        "embedding_status": False,
+    })
+    logger.info(f"📝 Replaced {file_id} with {file_name} ({size} bytes)")
+
+    # 4️⃣ Extract + incremental embed in the background
+    job = await run_in_threadpool(submit_job, file_id, "ingest") if reingest else None
+
+    return {
+        "message": "Document replaced",
+        "file_id": file_id,
+        "file_name": file_name,
+        "num_pages": num_pages,
+        "job": job,
+    }
+
+
+@router.delete("/{file_id}")
+def delete_document(file_id: str, db: Session = Depends(get_db)):
+    """Removes a document everywhere: vectors, lexical index, cached answers, files and DB rows."""
+    record = _get_file_or_404(db, file_id)
+    _ensure_idle(file_id)
+
+    with file_lock(file_id):
+        vectors_removed = len(get_vector_store().get_ids(file_id))
+
+        # rows first: if the commit fails the document is still whole,
+        # instead of a row marked embedded whose vectors are gone
+        db.query(IngestJob).filter(IngestJob.file_id == file_id).delete(synchronize_session=False)
+        db.delete(record)
+        bump_version(db)
+        publish_invalidation(db, file_id)
+        db.commit()
+
+        get_answer_cache().invalidate(file_id)
+        get_vector_store().delete_file(file_id)
+        lexical_index.delete_index(file_id)
+        remove_quietly(os.path.join(UPLOAD_DIR, f"{file_id}.pdf"))
+        remove_quietly(os.path.join(EXTRACT_DIR, f"{file_id}.jsonl"))
+    logger.info(f"🗑️ Deleted {file_id}: {vectors_removed} vectors")
+
+    return {"message": "Document deleted", "file_id": file_id, "vectors_removed": vectors_removed}
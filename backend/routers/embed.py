@@ -1,11 +1,20 @@
 from fastapi import APIRouter, HTTPException
+import hashlib
 import os
 import logging
-from chromadb import PersistentClient
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from dotenv import load_dotenv
-from backend.database import SessionLocal
+from backend.database import session_scope
 from backend.models import FileInfo
+from backend.library import bump_version
+from backend.embedder import embed_texts
+from backend.embed_cache import get_embedding_cache
+from backend.answer_cache import get_answer_cache, publish_invalidation
+from backend.coordination import file_lock
+from backend.pdf_extract import read_pages
+from backend.vector_store import get_vector_store
+from backend.chunking import FixedWindowChunker, get_chunker, chunk_pages
+from backend import lexical_index
+from backend.metrics import CHUNKS, track_stage
 
 load_dotenv()
 
@@ -15,84 +24,147 @@ logger = logging.getLogger("EmbedRouter")
 UPLOAD_DIR = os.getenv("UPLOAD_DIR")
 EXTRACT_DIR = os.getenv("EXTRACT_DIR")
 
-client = PersistentClient(path="chroma_db")
-
 def chunk_text(text, chunk_size=700, overlap=100):
-    logger.info(f"✂️ Chunking text: chunk_size={chunk_size}, overlap={overlap}")
     """
     Splits the text into chunks with overlap.
     chunk_size = number of characters per chunk
     overlap = number of characters that overlap between chunks
     """
-    chunks = []
-    start = 0
+    chunker = FixedWindowChunker(chunk_size, overlap)
+    return [c.text for c in chunker.chunk_page(1, text)]
 
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
 
-        # Move pointer with overlap
-        start = end - overlap  
-    logger.info(f"📦 Total chunks created: {len(chunks)}")
-    return chunks
+def get_collection(file_id: str):
+    """Collection holding file_id's vectors under the configured VECTOR_LAYOUT."""
+    return get_vector_store().collection_for(file_id)
 
+def chunk_ids(file_id: str, texts):
+    """
+    Stable ids derived from chunk content, so re-ingesting an edited PDF
+    keeps the ids of unchanged chunks. Repeats of the same text within a
+    file get a #n suffix.
+    """
+    seen = {}
+    ids = []
+    for text in texts:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        ids.append(f"{file_id}_{digest}" if n == 0 else f"{file_id}_{digest}_{n}")
+    return ids
 
-def get_collection():
-    return client.get_or_create_collection(
-        name="pdf_collection",
-        metadata={"hnsw:space": "cosine"}
-    )
 
 def generate_embedding(text: str):
-    embedder = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001")
-    return embedder.embed_documents([text])[0]
+    return embed_texts([text])[0]
 
 
-@router.post("/{file_id}")
-async def embed_and_store(file_id: str):
-    logger.info(f"Embedding request: {file_id}")
-    text_path = os.path.join(EXTRACT_DIR, f"{file_id}.txt")
+@router.get("/cache/stats")
+def embedding_cache_stats():
+    return get_embedding_cache().stats()
 
-    if not os.path.exists(text_path):
-        raise HTTPException(status_code=404, detail="Extracted text not found")
 
-    # Read extracted text
-    with open(text_path, "r", encoding="utf-8") as f:
-        text = f.read()
+def embed_file(file_id: str, progress=None):
+    """
+    Blocking chunk → embed → store pipeline shared by the endpoint and
+    background jobs. progress(chunks_done, chunks_total) is called as
+    embedding batches finish. Runs under the file's lock, so two workers
+    never diff and write the same document at once.
+    """
+    with file_lock(file_id):
+        return _embed_file(file_id, progress)
 
-    # Chunk text
-    chunks = chunk_text(text)
 
-    collection = get_collection()
+def _embed_file(file_id: str, progress):
+    text_path = os.path.join(EXTRACT_DIR, f"{file_id}.jsonl")
 
-    ids, embeddings, documents, metadatas = [], [], [], []
+    if not os.path.exists(text_path):
+        raise HTTPException(status_code=404, detail="Extracted text not found")
 
-    for i, chunk in enumerate(chunks):
-        vector = generate_embedding(chunk)
-        ids.append(f"{file_id}_chunk_{i}")
-        embeddings.append(vector)
-        documents.append(chunk)
-        metadatas.append({
+    # Stream pages through the configured chunker; each chunk keeps its
+    # page number and character offsets within that page
+    chunker = get_chunker()
+    with track_stage("chunk"):
+        chunk_list = list(chunk_pages(read_pages(text_path), chunker))
+    CHUNKS.inc(len(chunk_list))
+    chunks = [c.text for c in chunk_list]
+    logger.info(f"📦 Total chunks created: {len(chunks)} (strategy={chunker.name})")
+
+    if not chunks:
+        raise HTTPException(status_code=400, detail="No text to embed (scanned or empty PDF?)")
+
+    ids = chunk_ids(file_id, chunks)
+    documents = chunks
+    metadatas = [
+        {
             "file_id": file_id,
-            "chunk_id": i
-        })
-
-    # Store in Chroma
-    collection.add(
-        ids=ids,
-        embeddings=embeddings,
-        documents=documents,
-        metadatas=metadatas
-    )
+            "chunk_id": i,
+            "page": c.page,
+            "start": c.start,
+            "end": c.end
+        }
+        for i, c in enumerate(chunk_list)
+    ]
+
+    # Diff against what is already stored: only new chunks are embedded,
+    # chunks that disappeared are deleted, unchanged ones keep their vectors
+    store = get_vector_store()
+    existing = set(store.get_ids(file_id))
+    new_positions = [i for i, cid in enumerate(ids) if cid not in existing]
+    kept_positions = [i for i, cid in enumerate(ids) if cid in existing]
+    stale_ids = sorted(existing - set(ids))
+    logger.info(f"🔁 Chunk diff for {file_id}: {len(new_positions)} new, "
+                f"{len(kept_positions)} unchanged, {len(stale_ids)} stale")
+
+    done = 0
+
+    def on_progress(n):
+        nonlocal done
+        done += n
+        if progress:
+            progress(done, len(new_positions))
+
+    if new_positions:
+        # Batched + concurrent embedding through one shared client
+        embeddings = embed_texts([chunks[i] for i in new_positions], on_progress=on_progress, key=file_id)
+
+        # Store in Chroma
+        store.add(
+            file_id,
+            ids=[ids[i] for i in new_positions],
+            embeddings=embeddings,
+            documents=[documents[i] for i in new_positions],
+            metadatas=[metadatas[i] for i in new_positions]
+        )
+    elif progress:
+        progress(0, 0)
+
+    if kept_positions:
+        # positions and offsets of unchanged text may have moved
+        store.update_metadatas(
+            file_id,
+            ids=[ids[i] for i in kept_positions],
+            metadatas=[metadatas[i] for i in kept_positions]
+        )
+
+    if stale_ids:
+        store.delete(file_id, stale_ids)
+
+    # BM25 index over the same chunks, for hybrid / lexical retrieval
+    lexical_index.build_index(file_id, ids, documents, metadatas)
+
+    # Answers cached against the previous vectors are stale now
+    get_answer_cache().invalidate(file_id)
 
     # ---------------- UPDATE DB embedding_status = True -----------------
-    db = SessionLocal()
-    record = db.query(FileInfo).filter(FileInfo.file_id == file_id).first()
+    with session_scope() as db:
+        record = db.query(FileInfo).filter(FileInfo.file_id == file_id).first()
 
-    if record:
-        record.embedding_status = True
-        db.commit()
+        if record:
+            record.embedding_status = True
+            bump_version(db)
+            # ...in the other workers' caches too
+            publish_invalidation(db, file_id)
+            db.commit()
 
     # ---------------- DELETE extracted text file silently ---------------
     try:
@@ -105,5 +177,15 @@ async def embed_and_store(file_id: str):
     return {
         "message": "Embedding completed",
         "file_id": file_id,
-        "total_chunks": len(chunks)
+        "total_chunks": len(chunks),
+        "added_chunks": len(new_positions),
+        "removed_chunks": len(stale_ids),
+        "unchanged_chunks": len(kept_positions)
     }
+
+
+# Plain `def` so FastAPI runs the blocking embed/store work in its threadpool
+@router.post("/{file_id}")
+def embed_and_store(file_id: str):
+    logger.info(f"Embedding request: {file_id}")
+    return embed_file(file_id)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException 
+from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
 import logging
 import os
-import PyPDF2
 from dotenv import load_dotenv
+from backend.pdf_extract import extract_pages, write_pages, PdfUnreadableError
+from backend.metrics import PAGES, track_stage
+from backend.coordination import file_lock
 load_dotenv()
 
 router = APIRouter(prefix="/extract", tags=["Extract"])
@@ -13,9 +15,18 @@ UPLOAD_DIR = os.getenv("UPLOAD_DIR")
 EXTRACT_DIR = os.getenv("EXTRACT_DIR")
 os.makedirs(EXTRACT_DIR, exist_ok=True)
 
-@router.get("/{file_id}")
-async def extract_pdf_text(file_id: str):
-    logger.info(f"📥 Extract request for file_id={file_id}")
+
+def extract_text(file_id: str, progress=None):
+    """
+    Blocking extraction shared by the endpoint and background jobs.
+    progress(pages_done, pages_total) is called as pages are extracted.
+    Holds the file's lock while it reads the PDF and writes the text.
+    """
+    with file_lock(file_id):
+        return _extract_text(file_id, progress)
+
+
+def _extract_text(file_id: str, progress):
     pdf_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
 
     # 1️⃣ Validate file exists
@@ -23,47 +34,54 @@ async def extract_pdf_text(file_id: str):
         logger.error("❌ File not found for extraction")
         raise HTTPException(status_code=404, detail="File not found")
 
-    extracted_path = os.path.join(EXTRACT_DIR, f"{file_id}.txt")
+    extracted_path = os.path.join(EXTRACT_DIR, f"{file_id}.jsonl")
 
-    # 2️⃣ Extract text using PyPDF2 
+    # 2️⃣ Extract text page by page (PyMuPDF fast path, PyPDF2 fallback)
     try:
-        with open(pdf_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
+        with track_stage("extract"):
+            pages = extract_pages(pdf_path, progress=progress)
+        PAGES.inc(len(pages))
 
-            if len(reader.pages) == 0:
-                logger.warning("⚠️ PDF has zero pages")
-                raise HTTPException(status_code=400, detail="PDF has no pages")
+        if len(pages) == 0:
+            logger.warning("⚠️ PDF has zero pages")
+            raise HTTPException(status_code=400, detail="PDF has no pages")
 
-            extracted_text = ""
-            for page in reader.pages:
-                extracted_text += page.extract_text() or ""
-        logger.info(f"📝 Text extracted: {len(extracted_text)} characters")
+        text_length = sum(len(p) for p in pages)
+        logger.info(f"📝 Text extracted: {len(pages)} pages, {text_length} characters")
 
-    except PyPDF2.errors.PdfReadError:
+    except HTTPException:
+        raise
+    except PdfUnreadableError:
         raise HTTPException(status_code=400, detail="PDF is encrypted or unreadable")
     except Exception as e:
         logger.exception("❌ Text extraction failed")
         raise HTTPException(status_code=500, detail=f"Error extracting text: {e}")
 
-    # 3️⃣ Save extracted text
-    with open(extracted_path, "w", encoding="utf-8") as out:
-        out.write(extracted_text)
+    # 3️⃣ Save extracted text, one JSON line per page
+    write_pages(extracted_path, pages)
     logger.info(f"💾 Extracted text saved: {extracted_path}")
 
     # 4️⃣ Create preview (first lines or first 300 chars)
+    extracted_text = "".join(pages[:20])[:20000]  # preview only needs the leading pages
     preview_lines = "\n".join(extracted_text.split("\n")[:20])  # first 5 lines
     preview_chars = extracted_text[:1000]                        # first 300 chars
 
     preview_text = preview_lines if len(preview_lines) > 0 else preview_chars
 
-    # 5️⃣ Return success response
-    return JSONResponse(
-        content={
-            "message": "Text extracted successfully",
-            "file_id": file_id,
-            "text_file": f"{file_id}.txt",
-            "text_length": len(extracted_text),
-            "preview_text": preview_text.strip()  # 🆕 added preview
-        }
-    )
+    return {
+        "message": "Text extracted successfully",
+        "file_id": file_id,
+        "text_file": f"{file_id}.jsonl",
+        "num_pages": len(pages),
+        "text_length": text_length,
+        "preview_text": preview_text.strip()  # 🆕 added preview
+    }
 
+
+# Plain `def` so FastAPI runs the blocking PDF work in its threadpool
+@router.get("/{file_id}")
+def extract_pdf_text(file_id: str):
+    logger.info(f"📥 Extract request for file_id={file_id}")
+
+    # 5️⃣ Return success response
+    return JSONResponse(content=extract_text(file_id))
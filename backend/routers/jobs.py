@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException
+import logging
+from backend.jobs import submit_job, get_job, latest_job_for_file
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+logger = logging.getLogger("JobsRouter")
+
+
+@router.post("/{file_id}")
+def create_job(file_id: str, kind: str = "ingest"):
+    """Queue extract, embed or both ("ingest") and return the job id at once."""
+    logger.info(f"📨 Job request: kind={kind}, file_id={file_id}")
+    return submit_job(file_id, kind)
+
+
+@router.get("/file/{file_id}")
+def file_job_status(file_id: str):
+    job = latest_job_for_file(file_id)
+    if job is None:
+        raise HTTPException(404, "No jobs for this file")
+    return job
+
+
+@router.get("/{job_id}")
+def job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
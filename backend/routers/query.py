@@ -1,52 +1,52 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-import chromadb
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+import asyncio
+import json
 import logging
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+from backend.answer_cache import get_answer_cache, scope_key
+from backend.database import session_scope
+from backend.models import FileInfo
+from backend.retrieval import merge_hits, rrf_fuse, search
+from backend.context_packing import select_and_pack
+from backend.vector_store import get_vector_store
+from backend import lexical_index
+from backend.config import (
+    ANSWER_CACHE_ENABLED, BATCH_QUERY_MAX_QUESTIONS, BATCH_QUERY_CONCURRENCY,
+    RETRIEVAL_MODE, HYBRID_CANDIDATE_FACTOR, CROSS_DOC_MAX_CANDIDATES, CONTEXT_CANDIDATE_FACTOR,
+    LEXICAL_MAX_SCOPE_FILES,
+)
+from backend.embedder import embed_query, embed_queries, query_embedding_cache
+from backend.llm import generate, stream
 
 router = APIRouter(prefix="/query", tags=["Query"])
 logger = logging.getLogger("QueryRouter")
 
-# Persistent client and collection
-chroma_client = chromadb.PersistentClient(path="chroma_db")
-collection = chroma_client.get_or_create_collection(name="pdf_collection")
-
-# Embedder
-embedder = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001")
+answer_cache = get_answer_cache()
 
 # Request body
 class QueryRequest(BaseModel):
     question: str
-    file_id: str
-
-@router.post("/")
-async def query_pdf(data: QueryRequest):
-    logger.info(f"🔎 Query received: file_id={data.file_id}, question={data.question}")
-    question = data.question
-    file_id = data.file_id
-
-    # 1️⃣ Embed the question
-    query_embedding = embedder.embed_query(question)
-
-    # 2️⃣ Run similarity search WITHOUT relying on chunk-specific IDs
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=3,
-        where={"file_id": file_id}  # Only main file_id
-    )
+    # scope: one file, a list of files, or every embedded file
+    file_id: Optional[str] = None
+    file_ids: Optional[List[str]] = None
+    all_files: bool = False
+    top_k: int = Field(3, ge=1, le=50)
+    per_file_cap: Optional[int] = Field(None, ge=1)
+    # cosine similarity floor, applied to vector candidates only
+    score_threshold: Optional[float] = Field(None, ge=-1.0, le=1.0)
+    # defaults to RETRIEVAL_MODE
+    retrieval_mode: Optional[Literal["vector", "hybrid", "lexical"]] = None
 
-    documents_list = results.get("documents", [])
-    # metadatas_list = results.get("metadatas", [])
 
-    if not documents_list or not documents_list[0]:
-        raise HTTPException(404, "No embeddings found for this file.")
+class BatchQueryRequest(BaseModel):
+    file_id: str
+    questions: List[str]
 
-    # 3️⃣ Build context from retrieved chunks
-    context = "\n\n".join(documents_list[0])
 
-    # 4️⃣ Call LLM with context
-    model = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
-    prompt = f"""
+PROMPT_TEMPLATE = """
     You are an expert AI assistant designed to answer user questions strictly using the provided context.
 
     Follow these rules:
@@ -67,13 +67,324 @@ async def query_pdf(data: QueryRequest):
 
     Now provide the best possible answer based only on the context.
     """
-    
-    llm_response = model.invoke(prompt)
-    answer = llm_response.content
+
+
+def build_prompt(context: str, question: str) -> str:
+    return PROMPT_TEMPLATE.format(context=context, question=question)
+
+
+@router.get("/cache/stats")
+def answer_cache_stats():
+    return {
+        **answer_cache.stats(),
+        "query_embeddings": {
+            "hits": query_embedding_cache.hits,
+            "misses": query_embedding_cache.misses,
+        },
+    }
+
+
+def _resolve_scope(data: QueryRequest):
+    """Returns (file_ids or None for every file, answer-cache scope)."""
+    if data.all_files:
+        file_ids = None
+    else:
+        file_ids = list(dict.fromkeys((data.file_ids or []) + ([data.file_id] if data.file_id else [])))
+        if not file_ids:
+            raise HTTPException(400, "Give file_id, file_ids, or all_files=true.")
+
+    params = ""
+    if (data.top_k, data.per_file_cap, data.score_threshold) != (3, None, None):
+        params = f"k={data.top_k},cap={data.per_file_cap},min={data.score_threshold}"
+    mode = data.retrieval_mode or RETRIEVAL_MODE
+    if mode != RETRIEVAL_MODE:
+        params += f",mode={mode}"
+    return file_ids, scope_key(file_ids, params)
+
+
+def _retrieve(mode, question, query_embedding, file_ids, data: QueryRequest):
+    """
+    Over-fetched candidates for one question, best-first (with embeddings,
+    for MMR in the packing stage).
+      vector   cosine search only
+      lexical  BM25 over the per-file inverted indexes, no embedding needed
+      hybrid   both candidate lists fused with reciprocal rank fusion, or
+               vector only over more than LEXICAL_MAX_SCOPE_FILES files
+    """
+    n_candidates = min(data.top_k * CONTEXT_CANDIDATE_FACTOR, CROSS_DOC_MAX_CANDIDATES)
+    # BM25 loads every file's index in scope; wide hybrid queries stay on vectors
+    if mode == "vector" or (mode == "hybrid" and lexical_index.scope_size(file_ids) > LEXICAL_MAX_SCOPE_FILES):
+        return search(get_vector_store(), [query_embedding], file_ids, n_candidates, data.per_file_cap,
+                      data.score_threshold, include_embeddings=True)[0]
+
+    n_fused = min(n_candidates * HYBRID_CANDIDATE_FACTOR, CROSS_DOC_MAX_CANDIDATES)
+    lexical_hits = lexical_index.search(file_ids, question, n_fused)
+    if mode == "lexical":
+        return merge_hits(lexical_hits, n_candidates, data.per_file_cap)
+
+    vector_hits = search(get_vector_store(), [query_embedding], file_ids, n_fused, None, data.score_threshold,
+                         include_embeddings=True)[0]
+    return merge_hits(rrf_fuse([vector_hits, lexical_hits]), n_candidates, data.per_file_cap)
+
+
+def _file_names(file_ids):
+    with session_scope() as db:
+        rows = db.query(FileInfo.file_id, FileInfo.file_name).filter(FileInfo.file_id.in_(file_ids)).all()
+        return {fid: name for fid, name in rows}
+
+
+def _build_context(hits):
+    """Joins retrieved chunks; labels each with its file when several files are involved."""
+    file_ids = list(dict.fromkeys(h.file_id for h in hits))
+    if len(file_ids) <= 1:
+        return "\n\n".join(h.document for h in hits)
+
+    names = _file_names(file_ids)
+    parts = []
+    for h in hits:
+        label = names.get(h.file_id) or h.file_id
+        page = h.metadata.get("page")
+        header = f"[{label}, page {page}]" if page else f"[{label}]"
+        parts.append(f"{header}\n{h.document}")
+    return "\n\n".join(parts)
+
+
+def _sources(hits):
+    return [
+        {
+            "file_id": h.file_id,
+            "chunk_id": h.metadata.get("chunk_id"),
+            "page": h.metadata.get("page"),
+            "score": round(h.score, 4),
+        }
+        for h in hits
+    ]
+
+
+async def _prepare(data: QueryRequest):
+    """
+    Steps shared by the plain and streaming endpoints, up to the LLM call.
+    Returns (cached_answer, cache_kind, query_embedding, prompt, sources, context_stats,
+    cache_scope); on a cache hit the embedding, prompt, sources and stats are empty.
+    """
+    question = data.question
+    file_ids, cache_scope = _resolve_scope(data)
+    mode = data.retrieval_mode or RETRIEVAL_MODE
+
+    # 0️⃣ Exact repeat of a cached question → no embedding, no LLM
+    if ANSWER_CACHE_ENABLED:
+        cached = answer_cache.get_exact(cache_scope, question)
+        if cached is not None:
+            logger.info("⚡ Answer cache hit (exact)")
+            return cached, "exact", None, None, [], None, cache_scope
+
+    # 1️⃣ Embed the question (async, shared client, per-call timeout);
+    # lexical-only retrieval needs no embedding at all
+    query_embedding = None
+    if mode != "lexical":
+        try:
+            query_embedding = await embed_query(question)
+        except asyncio.TimeoutError:
+            raise HTTPException(504, "Embedding the question timed out.")
+
+        # Near-duplicate of a cached question → skip retrieval and LLM
+        if ANSWER_CACHE_ENABLED:
+            cached = answer_cache.get_similar(cache_scope, query_embedding)
+            if cached is not None:
+                logger.info("⚡ Answer cache hit (semantic)")
+                return cached, "semantic", None, None, [], None, cache_scope
+
+    if ANSWER_CACHE_ENABLED:
+        answer_cache.record_miss()
+
+    # 2️⃣ One search over every file in scope, merged into a global top-k
+    # (Chroma and the BM25 scan are synchronous, so run in the threadpool)
+    candidates = await run_in_threadpool(_retrieve, mode, question, query_embedding, file_ids, data)
+
+    if not candidates:
+        raise HTTPException(404, "No embeddings found for this file.")
+
+    # 3️⃣ MMR selection, overlap merging and token-budget packing, then
+    # build context from the packed blocks
+    hits, blocks, stats = select_and_pack(candidates, data.top_k)
+    context = await run_in_threadpool(_build_context, blocks)
+
+    return (None, None, query_embedding, build_prompt(context, question), _sources(hits),
+            stats.to_dict(), cache_scope)
+
+
+@router.post("/")
+async def query_pdf(data: QueryRequest):
+    logger.info(f"🔎 Query received: file_id={data.file_id}, file_ids={data.file_ids}, "
+                f"all_files={data.all_files}, question={data.question}")
+    question = data.question
+
+    cached, cache_kind, query_embedding, prompt, sources, context_stats, cache_scope = await _prepare(data)
+    if cached is not None:
+        return {"answer": cached, "cached": cache_kind}
+
+    # 4️⃣ Call LLM with context
+    try:
+        answer = await generate(prompt)
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "The language model timed out.")
+
+    if ANSWER_CACHE_ENABLED:
+        answer_cache.put(cache_scope, question, query_embedding, answer)
 
     # 5️⃣ Return answer
-    
+
     return {
-        "answer": answer
+        "answer": answer,
+        "sources": sources,
+        "context": context_stats
     }
-    
+
+
+def _sse(event: str, payload) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream")
+async def query_pdf_stream(data: QueryRequest):
+    """
+    Server-sent events: one `sources` event, then `token` events as the LLM
+    produces text, then `done` (or `error`). Failures before the LLM starts
+    (no embeddings, timeouts) are returned as normal HTTP errors.
+    """
+    logger.info(f"🔎 Streaming query: file_id={data.file_id}, file_ids={data.file_ids}, "
+                f"all_files={data.all_files}, question={data.question}")
+    question = data.question
+
+    cached, cache_kind, query_embedding, prompt, sources, context_stats, cache_scope = await _prepare(data)
+
+    async def events():
+        yield _sse("sources", {"sources": sources, "cached": cache_kind, "context": context_stats})
+
+        if cached is not None:
+            yield _sse("token", {"text": cached})
+            yield _sse("done", {"cached": cache_kind})
+            return
+
+        pieces = []
+        try:
+            async for piece in stream(prompt):
+                pieces.append(piece)
+                yield _sse("token", {"text": piece})
+        except asyncio.TimeoutError:
+            yield _sse("error", {"detail": "The language model timed out."})
+            return
+        except Exception as e:
+            logger.exception("❌ Streaming answer failed")
+            yield _sse("error", {"detail": str(e)})
+            return
+
+        answer = "".join(pieces)
+        if ANSWER_CACHE_ENABLED:
+            answer_cache.put(cache_scope, question, query_embedding, answer)
+        yield _sse("done", {"answer_length": len(answer)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/batch")
+async def query_pdf_batch(data: BatchQueryRequest):
+    """
+    Answers many questions about one file in a single call: one batched
+    embedding request, one Chroma query for all questions, then LLM calls
+    with bounded concurrency. Results keep the input order and each carries
+    its own error slot.
+    """
+    file_id = data.file_id
+    questions = data.questions
+    logger.info(f"🔎 Batch query received: file_id={file_id}, questions={len(questions)}")
+
+    if not questions:
+        raise HTTPException(400, "No questions given.")
+    if len(questions) > BATCH_QUERY_MAX_QUESTIONS:
+        raise HTTPException(400, f"At most {BATCH_QUERY_MAX_QUESTIONS} questions per batch.")
+
+    results = [
+        {"question": q, "answer": None, "error": None, "cached": None}
+        for q in questions
+    ]
+    # batch retrieval is vector-only: keep its answers apart from /query's
+    # default (e.g. hybrid) scope, shared with retrieval_mode="vector" queries
+    cache_scope = scope_key([file_id], "" if RETRIEVAL_MODE == "vector" else ",mode=vector")
+
+    # 0️⃣ Exact cache hits
+    pending = []
+    for i, q in enumerate(questions):
+        cached = answer_cache.get_exact(cache_scope, q) if ANSWER_CACHE_ENABLED else None
+        if cached is not None:
+            results[i].update(answer=cached, cached="exact")
+        else:
+            pending.append(i)
+
+    if not pending:
+        return {"file_id": file_id, "results": results}
+
+    # 1️⃣ One embedding request for every remaining question
+    try:
+        vectors = await embed_queries([questions[i] for i in pending], priority="background")
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "Embedding the questions timed out.")
+    embeddings = dict(zip(pending, vectors))
+
+    # Near-duplicate cache hits
+    if ANSWER_CACHE_ENABLED:
+        still_pending = []
+        for i in pending:
+            cached = answer_cache.get_similar(cache_scope, embeddings[i])
+            if cached is not None:
+                results[i].update(answer=cached, cached="semantic")
+            else:
+                answer_cache.record_miss()
+                still_pending.append(i)
+        pending = still_pending
+
+    if not pending:
+        return {"file_id": file_id, "results": results}
+
+    # 2️⃣ One similarity search carrying all query embeddings
+    n_candidates = min(3 * CONTEXT_CANDIDATE_FACTOR, CROSS_DOC_MAX_CANDIDATES)
+    hits_list = await run_in_threadpool(
+        search, get_vector_store(), [embeddings[i] for i in pending], [file_id], n_candidates, None, None, True
+    )
+
+    if not any(hits_list):
+        raise HTTPException(404, "No embeddings found for this file.")
+
+    # 3️⃣ LLM calls, at most BATCH_QUERY_CONCURRENCY in flight
+    semaphore = asyncio.Semaphore(BATCH_QUERY_CONCURRENCY)
+
+    async def answer_one(i, hits):
+        if not hits:
+            results[i]["error"] = "No relevant chunks found."
+            return
+        _, blocks, _ = select_and_pack(hits, 3)
+        prompt = build_prompt(_build_context(blocks), questions[i])
+        async with semaphore:
+            try:
+                # bulk work: yields rate-limit slots to interactive queries
+                answer = await generate(prompt, priority="background")
+            except asyncio.TimeoutError:
+                results[i]["error"] = "The language model timed out."
+                return
+            except Exception as e:
+                logger.exception(f"❌ Batch question {i} failed")
+                results[i]["error"] = str(e)
+                return
+        results[i]["answer"] = answer
+        if ANSWER_CACHE_ENABLED:
+            answer_cache.put(cache_scope, questions[i], embeddings[i], answer)
+
+    await asyncio.gather(*(
+        answer_one(i, hits) for i, hits in zip(pending, hits_list)
+    ))
+
+    return {"file_id": file_id, "results": results}
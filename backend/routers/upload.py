@@ -1,11 +1,21 @@
-from fastapi import UploadFile, File, HTTPException, APIRouter, Depends
-from fastapi.responses import JSONResponse
-import uuid, os, logging, fitz
+from fastapi import HTTPException, APIRouter, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+import uuid, os, logging, fitz, hashlib, base64, time
+import orjson
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from python_multipart.multipart import MultipartParser, parse_options_header
+from python_multipart.exceptions import MultipartParseError
+from typing import Literal, Optional
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from backend.database import SessionLocal, get_db
+from backend.database import get_db, run_db
 from backend.models import FileInfo
-import os
+from backend.library import bump_version, get_version
+from backend.metrics import BYTES, track_stage
+from backend.config import MAX_UPLOAD_MB, UPLOAD_CHUNK_SIZE
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,80 +26,377 @@ logger = logging.getLogger("UploadRouter")
 UPLOAD_DIR = os.getenv("UPLOAD_DIR")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
 
-@router.post("/upload_file")
-async def upload_pdf(file: UploadFile = File(...)):
-    db = SessionLocal()
 
-    file_name = file.filename  # <---- SEARCH BASED ON THIS
+def _existing_response(existing_file):
+    return {
+        "message": "File already exists",
+        "file_id": existing_file.file_id,
+        "file_name": existing_file.file_name,
+        "embedding_status": existing_file.embedding_status,
+        "redirect_to": (
+            "query"
+            if existing_file.embedding_status
+            else "extract"
+        )
+    }
+
+
+def _find_by_hash(db: Session, content_hash: str):
+    existing_file = db.query(FileInfo).filter(FileInfo.content_hash == content_hash).first()
+    return _existing_response(existing_file) if existing_file else None
+
+
+def _insert_file(db: Session, entry: FileInfo):
+    """
+    Returns None once stored, or the existing file's response if its content
+    won a race. Any other constraint failure is a 409.
+    """
+    content_hash = entry.content_hash
+    db.add(entry)
+    bump_version(db)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        existing = _find_by_hash(db, content_hash)
+        if existing:
+            return existing
+        logger.error(f"❌ Could not record {entry.file_name}: {e.orig}")
+        raise HTTPException(409, "File could not be recorded: it conflicts with an existing record")
+    return None
+
+
+def count_pages(file_path):
+    with track_stage("page_count"):
+        pdf = fitz.open(file_path)
+        try:
+            return pdf.page_count
+        finally:
+            pdf.close()
+
 
-    # ✅ 1. Check if file already exists by file_name
-    existing_file = db.query(FileInfo).filter(FileInfo.file_name == file_name).first()
+def remove_quietly(path):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        logger.error(f"Failed to remove {path}: {e}")
 
-    if existing_file:
+
+# multipart framing (boundaries, part headers) on top of the file itself
+_MULTIPART_OVERHEAD = 64 * 1024
+
+# documents the form field for OpenAPI, since the body is parsed by hand
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
+
+
+class _FilePart:
+    """python-multipart callbacks that keep only the data of one form field."""
+
+    def __init__(self, field):
+        self.field = field
+        self.filename = None
+        self.found = False
+        self.pending = []  # data received since the last flush
+        self._wanted = False
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+
+    def callbacks(self):
         return {
-            "message": "File already exists",
-            "file_id": existing_file.file_id,
-            "file_name": existing_file.file_name,
-            "embedding_status": existing_file.embedding_status,
-            "redirect_to": (
-                "query"
-                if existing_file.embedding_status
-                else "extract"
-            )
+            "on_part_begin": self._part_begin,
+            "on_part_data": self._part_data,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
         }
 
-    # ---------- File does NOT exist → upload normally ---------- #
+    def _part_begin(self):
+        self._wanted = False
+        self._disposition = b""
+        self._header_field = self._header_value = b""
 
-    file_id = str(uuid.uuid4())
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
+    def _header_field_data(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        self._wanted = name == self.field and not self.found
+        if self._wanted:
+            self.found = True
+            self.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+
+    def _part_data(self, data, start, end):
+        if self._wanted:
+            self.pending.append(data[start:end])
+
+
+async def save_upload(request: Request, field: str = "file"):
+    """
+    Streams the multipart request body straight to a temporary file while
+    hashing the file field, so the upload is written to disk once and
+    memory stays at about one chunk no matter how large the PDF is. A body
+    whose Content-Length is over MAX_UPLOAD_MB is refused before anything
+    is read, and a chunked one as soon as the file passes the limit.
+    Returns (tmp_path, sha256 hex digest, size in bytes, filename).
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(400, "Expected a multipart/form-data upload")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD:
+        raise HTTPException(413, f"File exceeds the {MAX_UPLOAD_MB} MB upload limit")
+
+    part = _FilePart(field)
+    parser = MultipartParser(boundary, part.callbacks())
+    tmp_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.part")
+    hasher = hashlib.sha256()
+    size = 0
+
+    async def flush(out, force=False):
+        nonlocal size
+        if not part.pending or (not force and sum(map(len, part.pending)) < UPLOAD_CHUNK_SIZE):
+            return
+        chunk = b"".join(part.pending)
+        part.pending.clear()
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(413, f"File exceeds the {MAX_UPLOAD_MB} MB upload limit")
+        hasher.update(chunk)
+        await run_in_threadpool(out.write, chunk)
+
+    try:
+        with track_stage("upload_write"), open(tmp_path, "wb") as out:
+            try:
+                async for body in request.stream():
+                    parser.write(body)
+                    await flush(out)
+                parser.finalize()
+            except MultipartParseError:
+                raise HTTPException(400, "Malformed multipart body")
+            await flush(out, force=True)
+
+        if not part.found:
+            raise HTTPException(400, f"No '{field}' file in the upload")
+        if size == 0:
+            raise HTTPException(400, "Empty PDF uploaded")
+    except BaseException:
+        remove_quietly(tmp_path)
+        raise
+
+    BYTES.inc(size, kind="upload")
+    return tmp_path, hasher.hexdigest(), size, part.filename
+
+
+@router.post("/upload_file", openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_pdf(request: Request):
+    tmp_path, content_hash, size, file_name = await save_upload(request)
+
+    # ✅ 1. Byte-identical file already uploaded → reuse it, skip extract/embed
+    existing = await run_db(_find_by_hash, content_hash)
 
-    # Save file
-    contents = await file.read()
-    if len(contents) == 0:
-        raise HTTPException(400, "Empty PDF uploaded")
+    if existing:
+        remove_quietly(tmp_path)
+        logger.info(f"♻️ Duplicate content for {file_name}, reusing {existing['file_id']}")
+        return existing
 
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    # ---------- New content → keep the file ---------- #
+
+    file_id = str(uuid.uuid4())
+    file_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
+    os.replace(tmp_path, file_path)
 
     # Extract metadata safely
-    pdf = fitz.open(file_path)
-    num_pages = pdf.page_count
-    pdf.close()
+    try:
+        num_pages = await run_in_threadpool(count_pages, file_path)
+    except Exception:
+        remove_quietly(file_path)
+        raise HTTPException(400, "Uploaded file is not a readable PDF")
+
+    uploaded_at = datetime.utcnow().isoformat()
 
     # Save record into DB
     new_entry = FileInfo(
         file_id=file_id,
         file_name=file_name,
-        num_pages=num_pages,    
-        uploaded_at=datetime.utcnow().isoformat(),
-        embedding_status=False  # default
-        
+        num_pages=num_pages,
+        uploaded_at=uploaded_at,
+        embedding_status=False,  # default
+        content_hash=content_hash,
+        file_size=size,
     )
-    db.add(new_entry)
-    db.commit()
+    try:
+        existing = await run_db(_insert_file, new_entry)
+    except BaseException:
+        remove_quietly(file_path)  # no row points at it
+        raise
+    if existing:
+        # the same bytes were uploaded concurrently and won the race
+        remove_quietly(file_path)
+        return existing
 
     return {
         "message": "PDF uploaded successfully",
         "file_id": file_id,
         "file_name": file_name,
         "num_pages": num_pages,
-        "uploaded_at": datetime.utcnow().isoformat(),
+        "uploaded_at": uploaded_at,
         "embedding_status": False,
         "redirect_to": "extract"
     }
 
+
+# sort key → column; ties are broken on file_id so the keyset is unique
+SORT_COLUMNS = {
+    "uploaded_at": FileInfo.uploaded_at,
+    "file_name": FileInfo.file_name,
+    "file_size": func.coalesce(FileInfo.file_size, 0),
+}
+
+
+def _encode_cursor(value, file_id):
+    return base64.urlsafe_b64encode(orjson.dumps([value, file_id])).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    try:
+        value, file_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+    return value, file_id
+
+
+def _file_row(f):
+    return {
+        "file_id": f.file_id,
+        "file_name": f.file_name,
+        "num_pages": f.num_pages,
+        "uploaded_at": f.uploaded_at,
+        "embedding_status": f.embedding_status,
+        "file_size": f.file_size,
+    }
+
+
+def _last_modified(updated_at: float):
+    """
+    Last-Modified for the library state. HTTP dates have one-second
+    resolution, so while the second of the last change is still running
+    another change can land in it; the header then names the second before,
+    and a revalidation against it sees that later change as a modification.
+    """
+    second = int(updated_at)
+    return second - 1 if int(time.time()) <= second else second
+
+
+def _listing_etag(version: int, params: dict):
+    """Weak ETag of one listing: the library version plus its query (filters, sort, cursor)."""
+    digest = hashlib.sha256(orjson.dumps(params, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+    return f'W/"lib-{version}-{digest}"'
+
+
+def _not_modified(request: Request, etag: str, updated_at: float):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(updated_at) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
 @router.get("/list_files")
-def list_files(db: Session = Depends(get_db)):
-    files = db.query(FileInfo).all()
-
-    return [
-        {
-            "file_id": f.file_id,
-            "file_name": f.file_name,
-            "num_pages": f.num_pages,
-            "uploaded_at": f.uploaded_at,
-            "embedding_status": f.embedding_status,
-        }
-        for f in files
-    ]
\ No newline at end of file
+def list_files(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[Literal["embedded", "pending"]] = None,
+    name_prefix: Optional[str] = None,
+    sort: Literal["uploaded_at", "file_name", "file_size"] = "uploaded_at",
+    order: Literal["asc", "desc"] = "desc",
+    db: Session = Depends(get_db),
+):
+    """
+    One page of the library, keyset-paginated: pass the returned next_cursor
+    to get the following page. Responses carry an ETag / Last-Modified tied
+    to the library version and the query, so unchanged listings come back
+    as 304.
+    """
+    version, updated_at = get_version(db)
+    etag = _listing_etag(version, {
+        "limit": limit, "cursor": cursor, "status": status,
+        "name_prefix": name_prefix or None, "sort": sort, "order": order,
+    })
+    cache_headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(_last_modified(updated_at), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, etag, updated_at):
+        return Response(status_code=304, headers=cache_headers)
+
+    sort_col = SORT_COLUMNS[sort]
+    query = db.query(FileInfo)
+
+    if status == "embedded":
+        query = query.filter(FileInfo.embedding_status.is_(True))
+    elif status == "pending":
+        query = query.filter(or_(FileInfo.embedding_status.is_(False), FileInfo.embedding_status.is_(None)))
+
+    if name_prefix:
+        escaped = name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(FileInfo.file_name.like(f"{escaped}%", escape="\\"))
+
+    if cursor:
+        value, file_id = _decode_cursor(cursor)
+        if order == "desc":
+            query = query.filter(or_(sort_col < value, and_(sort_col == value, FileInfo.file_id < file_id)))
+        else:
+            query = query.filter(or_(sort_col > value, and_(sort_col == value, FileInfo.file_id > file_id)))
+
+    if order == "desc":
+        query = query.order_by(sort_col.desc(), FileInfo.file_id.desc())
+    else:
+        query = query.order_by(sort_col.asc(), FileInfo.file_id.asc())
+
+    # one extra row tells whether another page exists
+    rows = query.limit(limit + 1).all()
+    items = [_file_row(f) for f in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        last_value = {"uploaded_at": last.uploaded_at, "file_name": last.file_name,
+                      "file_size": last.file_size or 0}[sort]
+        next_cursor = _encode_cursor(last_value, last.file_id)
+
+    return ORJSONResponse(
+        {"items": items, "next_cursor": next_cursor, "library_version": version},
+        headers=cache_headers,
+    )
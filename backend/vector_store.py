@@ -0,0 +1,208 @@
+import logging
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.config import CHROMA_HOST, CHROMA_PATH, CHROMA_PORT, VECTOR_LAYOUT, VECTOR_SHARDS, VECTOR_BACKEND
+from backend.clients import registry
+from backend.metrics import track_stage
+
+logger = logging.getLogger("VectorStore")
+
+LAYOUTS = ("single", "per_file", "sharded")
+LEGACY_COLLECTION = "pdf_collection"
+FILE_PREFIX = "file_"
+SHARD_PREFIX = "pdf_shard_"
+COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+# collections searched in parallel for one multi-collection query
+_QUERY_THREADS = 8
+
+
+def _file_filter(file_ids):
+    if len(file_ids) == 1:
+        return {"file_id": file_ids[0]}
+    return {"file_id": {"$in": list(file_ids)}}
+
+
+class VectorStore:
+    """
+    Routes every file to a Chroma collection according to `layout`:
+      single    all files share pdf_collection, queries filter on file_id
+      per_file  one collection per file, no metadata filter needed
+      sharded   files are hashed onto `shards` collections
+    Queries that span collections are fanned out and merged by distance.
+    """
+
+    def __init__(self, client, layout=VECTOR_LAYOUT, shards=VECTOR_SHARDS):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown VECTOR_LAYOUT: {layout}")
+        self.client = client
+        self.layout = layout
+        self.shards = shards
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    # ---------------- Routing ----------------
+
+    def collection_name(self, file_id):
+        if self.layout == "single":
+            return LEGACY_COLLECTION
+        if self.layout == "per_file":
+            return f"{FILE_PREFIX}{file_id}"
+        return f"{SHARD_PREFIX}{zlib.crc32(file_id.encode('utf-8')) % self.shards:03d}"
+
+    def _collection(self, name, create):
+        with self._lock:
+            collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        if create:
+            collection = self.client.get_or_create_collection(name=name, metadata=COLLECTION_METADATA)
+        else:
+            try:
+                collection = self.client.get_collection(name=name)
+            except Exception:
+                return None  # nothing stored there yet
+        with self._lock:
+            self._collections[name] = collection
+        return collection
+
+    def collection_for(self, file_id, create=True):
+        return self._collection(self.collection_name(file_id), create)
+
+    def _all_collection_names(self):
+        if self.layout == "single":
+            return [LEGACY_COLLECTION]
+        prefix = FILE_PREFIX if self.layout == "per_file" else SHARD_PREFIX
+        names = [c if isinstance(c, str) else c.name for c in self.client.list_collections()]
+        return [n for n in names if n.startswith(prefix)]
+
+    # ---------------- Writes ----------------
+
+    def add(self, file_id, ids, embeddings, documents, metadatas):
+        with track_stage("vector_add"):
+            self.collection_for(file_id).add(
+                ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas
+            )
+
+    def update_metadatas(self, file_id, ids, metadatas):
+        self.collection_for(file_id).update(ids=ids, metadatas=metadatas)
+
+    def delete(self, file_id, ids):
+        """Removes the given vector ids of file_id."""
+        collection = self.collection_for(file_id, create=False)
+        if collection is not None and ids:
+            collection.delete(ids=list(ids))
+
+    def delete_file(self, file_id):
+        """Removes every vector of file_id without touching other files' indexes."""
+        name = self.collection_name(file_id)
+        if self.layout == "per_file":
+            with self._lock:
+                self._collections.pop(name, None)
+            try:
+                self.client.delete_collection(name=name)
+            except Exception:
+                pass  # never embedded
+            return
+        collection = self._collection(name, create=False)
+        if collection is not None:
+            collection.delete(where={"file_id": file_id})
+
+    # ---------------- Reads ----------------
+
+    def get_ids(self, file_id):
+        """Ids of every vector currently stored for file_id."""
+        collection = self.collection_for(file_id, create=False)
+        if collection is None:
+            return []
+        return list(collection.get(where={"file_id": file_id}, include=[])["ids"])
+
+    def _plan(self, file_ids):
+        """Maps collection name → where clause for a query over file_ids (None = all)."""
+        if file_ids is None:
+            return {name: None for name in self._all_collection_names()}
+        if self.layout == "per_file":
+            return {self.collection_name(fid): None for fid in file_ids}
+        groups = {}
+        for fid in file_ids:
+            groups.setdefault(self.collection_name(fid), []).append(fid)
+        return {name: _file_filter(fids) for name, fids in groups.items()}
+
+    def query(self, query_embeddings, file_ids=None, n_results=3, include=("documents", "metadatas", "distances")):
+        """
+        Same result shape as Chroma's collection.query (one list per query
+        embedding), merged across every collection the file set touches.
+        """
+        query_embeddings = list(query_embeddings)
+        include = list(include)
+        if "distances" not in include:
+            include.append("distances")
+
+        plan = []
+        for name, where in self._plan(file_ids).items():
+            collection = self._collection(name, create=False)
+            if collection is not None:
+                plan.append((collection, where))
+
+        def run(item):
+            collection, where = item
+            return collection.query(
+                query_embeddings=query_embeddings, n_results=n_results, where=where, include=include
+            )
+
+        with track_stage("vector_query"):
+            if len(plan) <= 1:
+                partials = [run(item) for item in plan]
+            else:
+                with ThreadPoolExecutor(max_workers=min(_QUERY_THREADS, len(plan))) as pool:
+                    partials = list(pool.map(run, plan))
+
+        keys = ["ids"] + include
+        merged = {key: [] for key in keys}
+        for q in range(len(query_embeddings)):
+            rows = []
+            for part in partials:
+                ids = (part.get("ids") or [[]])[q]
+                for pos in range(len(ids)):
+                    rows.append({key: part[key][q][pos] for key in keys if part.get(key) is not None})
+            rows.sort(key=lambda r: r["distances"])
+            rows = rows[:n_results]
+            for key in keys:
+                merged[key].append([r.get(key) for r in rows])
+        return merged
+
+
+def _create_vector_store():
+    if VECTOR_BACKEND == "local":
+        from backend.local_index import LocalVectorIndex
+
+        store = LocalVectorIndex()
+        logger.info(f"🗄️ Vector store ready: local index, precision={store.precision}, path={store.root}")
+        return store
+    if VECTOR_BACKEND != "chroma":
+        raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+
+    if CHROMA_HOST:
+        # a Chroma server shared by every worker; the embedded client below
+        # must only ever be opened by one process
+        from chromadb import HttpClient
+
+        client, location = HttpClient(host=CHROMA_HOST, port=CHROMA_PORT), f"http://{CHROMA_HOST}:{CHROMA_PORT}"
+    else:
+        from chromadb import PersistentClient
+
+        client, location = PersistentClient(path=CHROMA_PATH), CHROMA_PATH
+
+    store = VectorStore(client)
+    logger.info(f"🗄️ Vector store ready: layout={store.layout}, at {location}")
+    return store
+
+
+registry.register("vector_store", _create_vector_store)
+
+
+def get_vector_store():
+    """Process-wide store on one shared Chroma client."""
+    return registry.get("vector_store")
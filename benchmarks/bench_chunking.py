@@ -0,0 +1,169 @@
+"""
+Chunks-per-document and retrieval hit rate for each chunking strategy.
+
+    python -m benchmarks.bench_chunking                       # built-in synthetic sample
+    python -m benchmarks.bench_chunking --sample labelled.json --retriever embed
+
+A labelled sample is JSON of the form
+    {"documents": [{"id": "doc1", "pages": ["page 1 text", ...]}],
+     "questions": [{"doc": "doc1", "question": "...", "answer": "text the chunk must contain"}]}
+
+A question is a hit when one of the top-k retrieved chunks of its document
+contains the answer string. The default "lexical" retriever (TF-IDF cosine)
+runs offline; "embed" uses the configured embedder (EMBEDDER_BACKEND).
+"""
+import argparse
+import json
+import math
+import random
+import re
+from collections import Counter
+
+from backend.chunking import FixedWindowChunker, SentenceChunker, TokenBudgetChunker, chunk_pages, count_tokens
+
+WORD_RE = re.compile(r"\w+")
+
+FILLER = (
+    "The parties acknowledge the terms set out in this agreement. "
+    "Each party shall keep the other informed of material changes. "
+    "Invoices are payable according to the schedule agreed in writing. "
+    "Nothing in this section limits the remedies available under law. "
+    "Reports are delivered at the end of every calendar quarter. "
+    "Confidential information must be protected with reasonable care. "
+).split(". ")
+
+FACTS = [
+    ("The termination notice period for contract {n} is {v} days.",
+     "What is the termination notice period for contract {n}?", "{v} days"),
+    ("Contract {n} carries a liability cap of {v} thousand dollars.",
+     "What is the liability cap of contract {n}?", "{v} thousand dollars"),
+    ("Payment for contract {n} is due within {v} business days of invoice.",
+     "When is payment due for contract {n}?", "{v} business days"),
+]
+
+
+def synthetic_sample(docs=12, pages=8, facts_per_doc=6, seed=11):
+    rng = random.Random(seed)
+    documents, questions = [], []
+    for d in range(docs):
+        doc_id = f"doc{d}"
+        page_texts = []
+        for _ in range(pages):
+            paragraphs = []
+            for _ in range(rng.randint(3, 6)):
+                sentences = [rng.choice(FILLER).strip().rstrip(".") + "." for _ in range(rng.randint(3, 8))]
+                paragraphs.append(" ".join(sentences))
+            page_texts.append(paragraphs)
+        for _ in range(facts_per_doc):
+            n, v = rng.randint(100, 999), rng.randint(10, 90)
+            fact, question, answer = rng.choice(FACTS)
+            page = rng.choice(page_texts)
+            para = rng.randrange(len(page))
+            page[para] = page[para] + " " + fact.format(n=n, v=v)
+            questions.append({"doc": doc_id, "question": question.format(n=n), "answer": answer.format(v=v)})
+        documents.append({"id": doc_id, "pages": ["\n\n".join(p) for p in page_texts]})
+    return {"documents": documents, "questions": questions}
+
+
+class LexicalRetriever:
+    def __init__(self, texts):
+        self.docs = [Counter(w.lower() for w in WORD_RE.findall(t)) for t in texts]
+        df = Counter(w for d in self.docs for w in d)
+        self.idf = {w: math.log((len(texts) + 1) / (c + 0.5)) for w, c in df.items()}
+        self.norms = [self._norm(d) for d in self.docs]
+
+    def _weights(self, counts):
+        return {w: c * self.idf.get(w, 0.0) for w, c in counts.items()}
+
+    def _norm(self, counts):
+        return math.sqrt(sum(v * v for v in self._weights(counts).values())) or 1.0
+
+    def top_k(self, question, k):
+        q = self._weights(Counter(w.lower() for w in WORD_RE.findall(question)))
+        scores = []
+        for i, d in enumerate(self.docs):
+            dot = sum(v * d[w] * self.idf.get(w, 0.0) for w, v in q.items() if w in d)
+            scores.append((dot / self.norms[i], i))
+        return [i for _, i in sorted(scores, reverse=True)[:k]]
+
+
+class EmbeddingRetriever:
+    def __init__(self, texts):
+        from backend.embedder import embed_texts, get_embedder
+
+        self.embedder = get_embedder()
+        self.vectors = embed_texts(texts)
+
+    def top_k(self, question, k):
+        q = self.embedder.embed_query(question)
+        scores = [(sum(a * b for a, b in zip(q, v)), i) for i, v in enumerate(self.vectors)]
+        return [i for _, i in sorted(scores, reverse=True)[:k]]
+
+
+def evaluate(chunker, sample, retriever_cls, k):
+    by_doc = {}
+    for doc in sample["documents"]:
+        pages = enumerate(doc["pages"], start=1)
+        by_doc[doc["id"]] = [c.text for c in chunk_pages(pages, chunker)]
+
+    hits = 0
+    retrievers = {doc_id: retriever_cls(chunks) for doc_id, chunks in by_doc.items()}
+    for q in sample["questions"]:
+        chunks = by_doc[q["doc"]]
+        top = retrievers[q["doc"]].top_k(q["question"], k)
+        if any(q["answer"].lower() in chunks[i].lower() for i in top):
+            hits += 1
+
+    all_chunks = [c for chunks in by_doc.values() for c in chunks]
+    return {
+        "strategy": chunker.name,
+        "chunks_per_doc": round(len(all_chunks) / len(by_doc), 1),
+        "avg_chunk_chars": round(sum(map(len, all_chunks)) / len(all_chunks)),
+        "embed_tokens": sum(count_tokens(c) for c in all_chunks),
+        "hit_rate": round(hits / len(sample["questions"]), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sample", help="labelled sample JSON (default: synthetic)")
+    parser.add_argument("--retriever", choices=["lexical", "embed"], default="lexical")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    if args.sample:
+        with open(args.sample, "r", encoding="utf-8") as f:
+            sample = json.load(f)
+    else:
+        sample = synthetic_sample()
+
+    chunkers = [
+        FixedWindowChunker(700, 100),
+        FixedWindowChunker(1200, 150),
+        SentenceChunker(700),
+        SentenceChunker(1200),
+        TokenBudgetChunker(160, 20),
+        TokenBudgetChunker(256, 32),
+    ]
+    retriever_cls = LexicalRetriever if args.retriever == "lexical" else EmbeddingRetriever
+
+    results = []
+    for chunker in chunkers:
+        row = evaluate(chunker, sample, retriever_cls, args.k)
+        row["params"] = {k: v for k, v in vars(chunker).items() if not k.startswith("_")}
+        results.append(row)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'strategy':<10}{'params':<42}{'chunks/doc':>11}{'avg chars':>10}{'tokens':>9}{'hit rate':>10}")
+    for r in results:
+        params = ", ".join(f"{k}={v}" for k, v in r["params"].items())
+        print(f"{r['strategy']:<10}{params:<42}{r['chunks_per_doc']:>11}{r['avg_chunk_chars']:>10}"
+              f"{r['embed_tokens']:>9}{r['hit_rate']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Pages/sec of each extraction engine and worker count on a synthetic PDF.
+
+    python -m benchmarks.bench_extract --pages 400 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from backend.pdf_extract import extract_pages
+
+WORDS = (
+    "agreement party clause term payment invoice notice liability warranty "
+    "termination schedule delivery service confidential governing law section "
+    "amount period obligation breach remedy report quarter revenue margin"
+).split()
+
+
+def make_pdf(path, pages, lines_per_page=45, seed=7):
+    """Writes a text-heavy synthetic PDF with PyMuPDF."""
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page()
+        lines = [f"Page {page_no + 1}"]
+        for _ in range(lines_per_page):
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(12)))
+        page.insert_text((40, 40), "\n".join(lines), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--engines", nargs="+", default=["pymupdf", "pypdf2"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "synthetic.pdf")
+        make_pdf(pdf_path, args.pages)
+
+        for engine in args.engines:
+            for workers in args.workers:
+                # warm-up also starts the process pool outside the timed runs
+                extract_pages(pdf_path, engine=engine, workers=workers, min_parallel_pages=1)
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    pages = extract_pages(pdf_path, engine=engine, workers=workers, min_parallel_pages=1)
+                    timings.append(time.perf_counter() - start)
+                best = min(timings)
+                results.append({
+                    "engine": engine,
+                    "workers": workers,
+                    "pages": len(pages),
+                    "best_seconds": round(best, 4),
+                    "pages_per_sec": round(len(pages) / best, 1),
+                })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'engine':<10}{'workers':>8}{'pages':>8}{'seconds':>10}{'pages/sec':>12}")
+    for r in results:
+        print(f"{r['engine']:<10}{r['workers']:>8}{r['pages']:>8}{r['best_seconds']:>10}{r['pages_per_sec']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Local memory-mapped index vs. Chroma: memory, query latency and recall per precision.
+
+    python -m benchmarks.bench_local_index --files 20 --chunks-per-file 2000 --dim 768
+    python -m benchmarks.bench_local_index --precisions float32 int8 --dims 0 256 --no-chroma
+
+Clustered random vectors stand in for real embeddings; each query is a
+perturbed stored vector aimed at one file, as /query does. recall@k is
+measured against exact float32 search. scan_mb is what a query reads per
+file set (the resident working set), disk_mb what the index occupies.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from backend.local_index import LocalVectorIndex
+from backend.vector_store import VectorStore
+
+
+def make_corpus(files, chunks_per_file, dim, rng):
+    corpus = {}
+    for n in range(files):
+        centers = rng.standard_normal((16, dim)).astype(np.float32)
+        vectors = centers[rng.integers(16, size=chunks_per_file)]
+        vectors += 0.5 * rng.standard_normal((chunks_per_file, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        corpus[f"file{n:05d}"] = vectors
+    return corpus
+
+
+def make_queries(corpus, count, rng):
+    file_ids = list(corpus)
+    queries = []
+    for _ in range(count):
+        file_id = file_ids[rng.integers(len(file_ids))]
+        vectors = corpus[file_id]
+        q = vectors[rng.integers(len(vectors))] + 0.3 * rng.standard_normal(vectors.shape[1]).astype(np.float32)
+        queries.append((file_id, q / np.linalg.norm(q)))
+    return queries
+
+
+def exact_top(corpus, queries, k):
+    return [set(np.argsort(-(corpus[fid] @ q))[:k].tolist()) for fid, q in queries]
+
+
+def load(store, corpus):
+    for file_id, vectors in corpus.items():
+        store.add(
+            file_id,
+            ids=[f"{file_id}_{i}" for i in range(len(vectors))],
+            embeddings=vectors if isinstance(store, LocalVectorIndex) else vectors.tolist(),
+            documents=[""] * len(vectors),
+            metadatas=[{"file_id": file_id, "chunk_id": i} for i in range(len(vectors))],
+        )
+
+
+def measure(store, queries, truth, k):
+    timings, found = [], 0
+    for (file_id, q), expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = store.query([q.tolist()], file_ids=[file_id], n_results=k)
+        timings.append((time.perf_counter() - start) * 1000)
+        found += len({int(i.rsplit("_", 1)[1]) for i in result["ids"][0]} & expected)
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        f"recall@{k}": round(found / (k * len(queries)), 4),
+    }
+
+
+def disk_mb(path):
+    total = 0
+    for root, _, names in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+    return round(total / 2**20, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--chunks-per-file", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--precisions", nargs="+", default=["float32", "float16", "int8"])
+    parser.add_argument("--dims", type=int, nargs="+", default=[0, 256], help="scanned dimensions, 0 = all")
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--no-chroma", action="store_true", help="skip the Chroma per_file baseline")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = make_corpus(args.files, args.chunks_per_file, args.dim, rng)
+    queries = make_queries(corpus, args.queries, rng)
+    truth = exact_top(corpus, queries, args.top_k)
+    float32_mb = sum(v.nbytes for v in corpus.values()) / 2**20
+
+    configs = [] if args.no_chroma else [("chroma", None, None)]
+    configs += [("local", p, d) for p in args.precisions for d in args.dims]
+
+    results = []
+    for backend, precision, scan_dim in configs:
+        with tempfile.TemporaryDirectory() as tmp:
+            if backend == "chroma":
+                from chromadb import PersistentClient
+
+                store = VectorStore(PersistentClient(path=tmp), layout="per_file")
+            else:
+                store = LocalVectorIndex(root=tmp, precision=precision, scan_dim=scan_dim,
+                                         rescore_factor=args.rescore_factor)
+            start = time.perf_counter()
+            load(store, corpus)
+            row = {
+                "backend": backend,
+                "precision": precision or "float32",
+                "scan_dim": scan_dim or args.dim,
+                "load_s": round(time.perf_counter() - start, 2),
+                "disk_mb": disk_mb(tmp),
+            }
+            if backend == "local":
+                scan = sum(store.memory_stats(fid)["scan_bytes"] for fid in corpus) / 2**20
+                row["scan_mb"] = round(scan, 2)
+                row["scan_saved"] = round(1 - scan / float32_mb, 3)
+            row.update(measure(store, queries, truth, args.top_k))
+            results.append(row)
+            if not args.json:
+                print(f"{backend:<6} {row['precision']:<8} dim={row['scan_dim']:<5} disk={row['disk_mb']:>8}MB "
+                      f"scan={row.get('scan_mb', '-'):>8}MB p50={row['p50_ms']:>8}ms p95={row['p95_ms']:>8}ms "
+                      f"recall@{args.top_k}={row[f'recall@{args.top_k}']}", flush=True)
+
+    if args.json:
+        print(json.dumps({"float32_mb": round(float32_mb, 2), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
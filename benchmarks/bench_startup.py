@@ -0,0 +1,129 @@
+"""
+Import time of backend.main and time until a fresh uvicorn server answers.
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --runs 5 --ref HEAD~1   # compare with an older commit
+
+Each run uses a fresh interpreter and a throwaway data directory with the
+fake embedder and LLM, so the numbers cover imports, DB setup and the
+chosen WARMUP_CLIENTS, not network calls. --ref checks the given commit
+out into a temporary git worktree and measures it the same way.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import backend.main; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _env(workdir, warmup):
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'files.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploaded_pdfs"),
+        "EXTRACT_DIR": os.path.join(workdir, "extracted_text"),
+        "CHROMA_PATH": os.path.join(workdir, "chroma_db"),
+        "LEXICAL_INDEX_DIR": os.path.join(workdir, "lexical_index"),
+        "LOCAL_INDEX_DIR": os.path.join(workdir, "local_index"),
+        "LOCK_DIR": os.path.join(workdir, "locks"),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "EMBEDDER_BACKEND": "fake",
+        "LLM_BACKEND": "fake",
+        "WARMUP_CLIENTS": warmup,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(root, warmup):
+    with tempfile.TemporaryDirectory() as workdir:
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], cwd=root, env=_env(workdir, warmup),
+            capture_output=True, text=True, check=True,
+        )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_ready(root, warmup, timeout=120):
+    """Seconds from process start until /ready (or, on older trees, /docs) answers 200."""
+    with tempfile.TemporaryDirectory() as workdir:
+        port = _free_port()
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=root, env=_env(workdir, warmup), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            paths = ["/ready", "/docs"]
+            while time.perf_counter() - start < timeout:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"server in {root} exited during startup")
+                for path in paths:
+                    try:
+                        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as resp:
+                            if resp.status == 200:
+                                return time.perf_counter() - start
+                    except urllib.error.HTTPError as e:
+                        if e.code == 404 and path == "/ready":
+                            paths = ["/docs"]  # tree predates /ready
+                    except OSError:
+                        pass
+                time.sleep(0.05)
+            raise RuntimeError(f"server in {root} not ready after {timeout}s")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+def bench(root, runs, warmup):
+    imports = [measure_import(root, warmup) for _ in range(runs)]
+    ready = [measure_ready(root, warmup) for _ in range(runs)]
+    return {
+        "import_s_median": round(statistics.median(imports), 3),
+        "ready_s_median": round(statistics.median(ready), 3),
+        "import_s": [round(v, 3) for v in imports],
+        "ready_s": [round(v, 3) for v in ready],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", default="", help="WARMUP_CLIENTS for the measured server")
+    parser.add_argument("--ref", help="also measure this git ref (e.g. HEAD~1) for a before/after comparison")
+    args = parser.parse_args()
+
+    results = {"current": bench(REPO_ROOT, args.runs, args.warmup)}
+
+    if args.ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            tree = os.path.join(tmp, "tree")
+            subprocess.run(["git", "worktree", "add", "--detach", tree, args.ref],
+                           cwd=REPO_ROOT, check=True, capture_output=True)
+            try:
+                results[args.ref] = bench(tree, args.runs, args.warmup)
+            finally:
+                subprocess.run(["git", "worktree", "remove", "--force", tree], cwd=REPO_ROOT, check=True)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Single-file query latency against corpus size for each vector layout.
+
+    python -m benchmarks.bench_vector_layout --sizes 10000 50000 100000
+
+Random unit vectors are loaded into a throwaway Chroma directory per
+layout; every query targets one random file, as /query does.
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from backend.vector_store import VectorStore
+
+
+def build(layout, total, chunks_per_file, dim, shards, rng, path):
+    from chromadb import PersistentClient
+
+    store = VectorStore(PersistentClient(path=path), layout=layout, shards=shards)
+    files = [f"file{n:06d}" for n in range(max(1, total // chunks_per_file))]
+    for file_id in files:
+        vectors = rng.standard_normal((chunks_per_file, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        store.add(
+            file_id,
+            ids=[f"{file_id}_chunk_{i}" for i in range(chunks_per_file)],
+            embeddings=vectors.tolist(),
+            documents=[""] * chunks_per_file,
+            metadatas=[{"file_id": file_id, "chunk_id": i} for i in range(chunks_per_file)],
+        )
+    return store, files
+
+
+def measure(store, files, dim, queries, rng):
+    timings = []
+    for _ in range(queries):
+        file_id = files[rng.integers(len(files))]
+        q = rng.standard_normal(dim).astype(np.float32)
+        start = time.perf_counter()
+        store.query([q.tolist()], file_ids=[file_id], n_results=3)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--layouts", nargs="+", default=["single", "sharded", "per_file"])
+    parser.add_argument("--chunks-per-file", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for layout in args.layouts:
+            rng = np.random.default_rng(0)
+            with tempfile.TemporaryDirectory() as tmp:
+                start = time.perf_counter()
+                store, files = build(layout, size, args.chunks_per_file, args.dim, args.shards, rng, tmp)
+                load_s = time.perf_counter() - start
+                row = {"vectors": size, "layout": layout, "files": len(files), "load_s": round(load_s, 1)}
+                row.update(measure(store, files, args.dim, args.queries, rng))
+                results.append(row)
+                if not args.json:
+                    print(f"{size:>9} {layout:<9} files={row['files']:<5} load={row['load_s']:>6}s "
+                          f"p50={row['p50_ms']:>8}ms p95={row['p95_ms']:>8}ms", flush=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
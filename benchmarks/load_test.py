@@ -0,0 +1,347 @@
+"""
+End-to-end load test: upload → extract → embed → query against a real
+uvicorn server running with the offline fake embedder and LLM.
+
+    python -m benchmarks.load_test --docs 20 --pages 30 --concurrency 4 --output run.json
+    python -m benchmarks.load_test --compare baseline.json --output run.json
+    python -m benchmarks.load_test --workers 4 --vector-backend local --duplicate-embeds --verify
+
+Everything (database, uploads, Chroma, indexes) lives in a throwaway
+directory, unless --database-url / --chroma-host point at servers (use an
+empty database and a fresh Chroma server). Results are JSON: throughput
+and p50/p95/p99 per endpoint plus peak RSS of the server; --compare flags
+latency/throughput regressions against an earlier run and exits with
+status 1.
+
+For several workers, --duplicate-embeds sends every embed request twice
+at once (usually landing on different workers) and --verify re-embeds
+every document afterwards; both check that each chunk was stored exactly
+once, and any mismatch also exits with status 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_extract import make_pdf
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What are the payment terms?",
+    "When can the agreement be terminated?",
+    "Which law governs this contract?",
+    "What does the warranty cover?",
+    "Summarise the delivery schedule.",
+]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def start_server(workdir, port, args):
+    env = {
+        **os.environ,
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'files.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploaded_pdfs"),
+        "EXTRACT_DIR": os.path.join(workdir, "extracted_text"),
+        "CHROMA_PATH": os.path.join(workdir, "chroma_db"),
+        "CHROMA_HOST": args.chroma_host or "",
+        "CHROMA_PORT": str(args.chroma_port),
+        "VECTOR_BACKEND": args.vector_backend,
+        "LOCAL_INDEX_DIR": os.path.join(workdir, "local_index"),
+        "LEXICAL_INDEX_DIR": os.path.join(workdir, "lexical_index"),
+        "LOCK_DIR": os.path.join(workdir, "locks"),
+        "WORKERS": str(args.workers),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "EMBEDDER_BACKEND": "fake",
+        "LLM_BACKEND": "fake",
+        "FAKE_EMBED_LATENCY_MS": str(args.embed_latency_ms),
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+    }
+    cmd = [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+           "--port", str(port), "--log-level", "warning", "--workers", str(args.workers)]
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited during startup, see {log.name}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                return proc, log
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"Server did not become ready in {args.startup_timeout}s, see {log.name}")
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+        self.mismatches = []  # documents whose chunks were not stored exactly once
+
+    async def call(self, endpoint, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.record(endpoint, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    def record(self, endpoint, elapsed, ok):
+        self.timings.setdefault(endpoint, []).append(elapsed)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, wall_seconds):
+        result = {}
+        for endpoint, values in self.timings.items():
+            values = sorted(values)
+            result[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "throughput_rps": round(len(values) / wall_seconds, 3),
+                "mean_ms": round(statistics.fmean(values) * 1000, 2),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+            }
+        return result
+
+
+async def ingest_and_query(client, recorder, pdf_path, queries, duplicate_embeds=False):
+    with open(pdf_path, "rb") as f:
+        payload = f.read()
+    resp = await recorder.call("upload", client.post(
+        "/upload/upload_file", files={"file": (os.path.basename(pdf_path), payload, "application/pdf")}
+    ))
+    if resp is None:
+        return False
+    file_id = resp.json()["file_id"]
+
+    if await recorder.call("extract", client.get(f"/extract/{file_id}")) is None:
+        return False
+    if duplicate_embeds:
+        # the second request waits for the first one's file lock; by then the
+        # extracted text is consumed, so it either 404s or adds nothing
+        async def embed_once():
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"/embed/{file_id}")
+            except httpx.HTTPError:
+                response = None
+            ok = response is not None and response.status_code in (200, 404)
+            recorder.record("embed", time.perf_counter() - start, ok)
+            return response if ok else None
+
+        responses = await asyncio.gather(embed_once(), embed_once())
+        results = [r.json() for r in responses if r is not None and r.status_code == 200]
+        if not results:
+            return False
+        added = sum(r["added_chunks"] for r in results)
+        if added != results[0]["total_chunks"]:
+            recorder.mismatches.append({"file_id": file_id, "check": "duplicate_embed",
+                                        "total_chunks": results[0]["total_chunks"], "added_chunks": added})
+    elif await recorder.call("embed", client.post(f"/embed/{file_id}")) is None:
+        return False
+
+    for i in range(queries):
+        await recorder.call("query", client.post(
+            "/query/", json={"question": QUESTIONS[i % len(QUESTIONS)], "file_id": file_id}
+        ))
+    return file_id
+
+
+async def verify(client, recorder, file_ids):
+    """Re-extracts and re-embeds every document: nothing may be added or removed."""
+    # outside the timed run, so it doesn't count towards the endpoint stats
+    for file_id in file_ids:
+        try:
+            (await client.get(f"/extract/{file_id}")).raise_for_status()
+            resp = await client.post(f"/embed/{file_id}")
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            recorder.mismatches.append({"file_id": file_id, "check": "verify", "error": str(e)})
+            continue
+        result = resp.json()
+        if result["added_chunks"] or result["removed_chunks"] or result["unchanged_chunks"] != result["total_chunks"]:
+            recorder.mismatches.append({"file_id": file_id, "check": "verify", **{
+                k: result[k] for k in ("total_chunks", "added_chunks", "removed_chunks", "unchanged_chunks")
+            }})
+
+
+async def drive(port, pdf_paths, args):
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.request_timeout,
+                                 limits=limits) as client:
+        async def one(path):
+            async with semaphore:
+                return await ingest_and_query(client, recorder, path, args.queries_per_doc, args.duplicate_embeds)
+
+        start = time.perf_counter()
+        file_ids = await asyncio.gather(*(one(p) for p in pdf_paths))
+        wall = time.perf_counter() - start
+
+        if args.verify:
+            await verify(client, recorder, [f for f in file_ids if f])
+    return recorder, [bool(f) for f in file_ids], wall
+
+
+def _process_tree(pid):
+    """pid plus every descendant (Linux /proc), so multi-worker servers are covered."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def _peak_rss_mb(proc):
+    """Summed peak RSS (VmHWM) of the server process tree; None where /proc is unavailable."""
+    if not os.path.isdir("/proc"):
+        return None
+    total_kb = 0
+    for pid in _process_tree(proc.pid):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            pass
+    return round(total_kb / 1024, 1)
+
+
+def compare(current, baseline, tolerance):
+    """Lists endpoints whose p95 grew or throughput shrank by more than tolerance."""
+    regressions = []
+    for endpoint, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {before['p95_ms']} → {now['p95_ms']} ms")
+        if before["throughput_rps"] and now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint}: throughput {before['throughput_rps']} → {now['throughput_rps']} rps")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=30, help="pages per synthetic PDF")
+    parser.add_argument("--concurrency", type=int, default=4, help="documents in flight")
+    parser.add_argument("--queries-per-doc", type=int, default=5)
+    parser.add_argument("--embed-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--database-url", help="e.g. postgresql://user:pw@localhost/chatz_load (default: SQLite)")
+    parser.add_argument("--vector-backend", choices=("chroma", "local"), default="chroma")
+    parser.add_argument("--chroma-host", help="Chroma server to use instead of the embedded store")
+    parser.add_argument("--chroma-port", type=int, default=8001)
+    parser.add_argument("--duplicate-embeds", action="store_true", help="send each embed request twice at once")
+    parser.add_argument("--verify", action="store_true", help="re-embed every document and check nothing changes")
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="earlier JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_dir = os.path.join(workdir, "pdfs")
+        os.makedirs(pdf_dir)
+        pdf_paths = []
+        for n in range(args.docs):
+            path = os.path.join(pdf_dir, f"doc{n:04d}.pdf")
+            make_pdf(path, args.pages, seed=n)  # distinct seeds → distinct content hashes
+            pdf_paths.append(path)
+
+        port = _free_port()
+        proc, log = start_server(workdir, port, args)
+        try:
+            recorder, outcomes, wall = asyncio.run(drive(port, pdf_paths, args))
+            server_rss = _peak_rss_mb(proc)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+            log.close()
+
+    if server_rss is None:
+        server_rss = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "python": platform.python_version(),
+        "wall_seconds": round(wall, 3),
+        "documents_completed": sum(outcomes),
+        "documents_per_second": round(sum(outcomes) / wall, 3),
+        "pages_per_second": round(sum(outcomes) * args.pages / wall, 2),
+        "peak_rss_mb": {
+            "server": server_rss,
+            "client": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        "endpoints": recorder.summary(wall),
+        "mismatches": recorder.mismatches,
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+    if recorder.mismatches:
+        print(f"MISMATCH {len(recorder.mismatches)} documents were not stored exactly once", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Rate-limit scheduler against a local fake embedding endpoint with a quota.
+
+    python -m benchmarks.sim_rate_limit --files 4 --chunks 400 --duration 20
+    python -m benchmarks.sim_rate_limit --no-limits   # only react to 429s
+
+The fake endpoint allows --quota requests per --window seconds and answers
+429 with a Retry-After header beyond that. Background ingests (one thread
+pool per file, as embed_file does) and a steady stream of interactive
+query embeddings share it through backend.rate_limit. The report shows the
+429s the endpoint served, interactive latency, each file's ingest time and
+the scheduler's queue statistics.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from backend import rate_limit
+from backend.embedder import Embedder, FakeEmbedder, embed_query, embed_texts
+
+
+class QuotaEndpoint:
+    """Sliding-window quota: `quota` requests per `window` seconds."""
+
+    def __init__(self, quota, window, latency):
+        self.quota = quota
+        self.window = window
+        self.latency = latency
+        self.recent = deque()
+        self.lock = threading.Lock()
+        self.served = 0
+        self.rejected = 0
+        self.vectors = FakeEmbedder(dim=64)
+
+    def admit(self):
+        """None if admitted, else seconds until the oldest request leaves the window."""
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] >= self.window:
+                self.recent.popleft()
+            if len(self.recent) >= self.quota:
+                self.rejected += 1
+                return self.window - (now - self.recent[0])
+            self.recent.append(now)
+            self.served += 1
+            return None
+
+    def serve(self):
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                wait = endpoint.admit()
+                if wait is not None:
+                    payload = json.dumps({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}).encode()
+                    self.send_response(429)
+                    self.send_header("Retry-After", f"{wait:.3f}")
+                else:
+                    time.sleep(endpoint.latency)
+                    payload = json.dumps({"embeddings": [endpoint.vectors._vector(t) for t in body["texts"]]}).encode()
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class HttpEmbedder(Embedder):
+    """Talks to the fake endpoint; a 429 surfaces as httpx.HTTPStatusError."""
+
+    model_name = "fake-quota"
+
+    def __init__(self, url):
+        self.url = url
+        self.client = httpx.Client(timeout=30, limits=httpx.Limits(max_connections=64))
+
+    def embed_documents(self, texts):
+        response = self.client.post(self.url, json={"texts": list(texts)})
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1) if values else None
+
+
+def run_ingests(embedder, args, results):
+    def ingest(n):
+        file_id = f"file{n}"
+        texts = [f"{file_id} chunk {i}" for i in range(args.chunks)]
+        start = time.perf_counter()
+        try:
+            embed_texts(texts, embedder=embedder, batch_size=args.batch_size, max_concurrency=4,
+                        use_cache=False, key=file_id)
+            results[file_id] = {"seconds": round(time.perf_counter() - start, 2), "error": None}
+        except Exception as e:
+            results[file_id] = {"seconds": round(time.perf_counter() - start, 2), "error": str(e)[:120]}
+
+    threads = [threading.Thread(target=ingest, args=(n,)) for n in range(args.files)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+async def run_queries(embedder, args):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + args.duration
+    n = 0
+
+    async def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            await embed_query(f"interactive question {i}", embedder=embedder, timeout=args.query_timeout)
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+
+    tasks = []
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(one(n)))
+        n += 1
+        await asyncio.sleep(1 / args.qps)
+    await asyncio.gather(*tasks)
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=4, help="concurrent background ingests")
+    parser.add_argument("--chunks", type=int, default=400, help="chunks per file")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--quota", type=int, default=20, help="requests the endpoint allows per window")
+    parser.add_argument("--window", type=float, default=1.0, help="quota window in seconds")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--qps", type=float, default=2, help="interactive queries per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of interactive traffic")
+    parser.add_argument("--query-timeout", type=float, default=10)
+    parser.add_argument("--headroom", type=float, default=0.9, help="fraction of the quota the scheduler uses")
+    parser.add_argument("--no-limits", action="store_true", help="no RPM bucket, only 429 backoff")
+    args = parser.parse_args()
+
+    endpoint = QuotaEndpoint(args.quota, args.window, args.latency_ms / 1000)
+    server = endpoint.serve()
+    embedder = HttpEmbedder(f"http://127.0.0.1:{server.server_address[1]}/embed")
+
+    rpm = 0 if args.no_limits else int(args.quota * 60 / args.window * args.headroom)
+    # burst sized so rate × window + burst stays within the endpoint's quota
+    scheduler = rate_limit.configure("embedding", rpm=rpm, max_retries=20, backoff_seconds=args.window / 4,
+                                     burst_seconds=args.window * (1 - args.headroom))
+
+    ingests = {}
+    start = time.perf_counter()
+    threads = run_ingests(embedder, args, ingests)
+    latencies, errors = asyncio.run(run_queries(embedder, args))
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    report = {
+        "config": {**vars(args), "scheduler_rpm": rpm},
+        "wall_seconds": round(wall, 2),
+        "endpoint": {"served": endpoint.served, "rejected_429": endpoint.rejected},
+        "interactive": {
+            "queries": len(latencies) + errors,
+            "errors": errors,
+            "p50_ms": _pct(latencies, 0.50),
+            "p95_ms": _pct(latencies, 0.95),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else None,
+        },
+        "ingests": ingests,
+        "scheduler": scheduler.stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
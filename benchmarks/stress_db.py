@@ -0,0 +1,116 @@
+"""
+Concurrency stress test for the database layer.
+
+    python -m benchmarks.stress_db --threads 32 --ops 200 --async-tasks 200
+
+Runs against a throwaway SQLite file: writer/reader threads hammer
+file_info and ingest_job through session_scope(), then async tasks go
+through run_db(). Fails (exit 1) on any "database is locked" error or if
+pooled connections are still checked out at the end.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=200, help="operations per thread")
+    parser.add_argument("--async-tasks", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    # must be set before backend.database creates its engine
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+
+    from sqlalchemy.exc import OperationalError
+
+    from backend.database import Base, engine, ensure_schema, run_db, session_scope
+    from backend.models import FileInfo, IngestJob
+
+    Base.metadata.create_all(bind=engine)
+    ensure_schema()
+
+    errors = {"locked": 0, "other": 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def record(start, exc=None):
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            if exc is not None:
+                errors["locked" if "locked" in str(exc) else "other"] += 1
+
+    def write(db):
+        file_id = str(uuid.uuid4())
+        db.add(FileInfo(file_id=file_id, file_name=f"{file_id[:8]}.pdf", content_hash=file_id,
+                        embedding_status=random.random() < 0.5))
+        db.add(IngestJob(job_id=str(uuid.uuid4()), file_id=file_id, kind="ingest", status="running"))
+        db.commit()
+        db.query(IngestJob).filter(IngestJob.file_id == file_id).update({"status": "done"})
+        db.commit()
+
+    def read(db):
+        db.query(FileInfo).filter(FileInfo.embedding_status.is_(True)).limit(50).all()
+        db.query(IngestJob).filter(IngestJob.status == "running").count()
+
+    def worker(_):
+        for _ in range(args.ops):
+            op = write if random.random() < args.write_ratio else read
+            start = time.perf_counter()
+            try:
+                with session_scope() as db:
+                    op(db)
+                record(start)
+            except OperationalError as e:
+                record(start, e)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(worker, range(args.threads)))
+    thread_elapsed = time.perf_counter() - started
+
+    async def async_phase():
+        async def one():
+            start = time.perf_counter()
+            try:
+                await run_db(write if random.random() < args.write_ratio else read)
+                record(start)
+            except OperationalError as e:
+                record(start, e)
+
+        await asyncio.gather(*(one() for _ in range(args.async_tasks)))
+
+    started = time.perf_counter()
+    asyncio.run(async_phase())
+    async_elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    checked_out = engine.pool.checkedout()
+    result = {
+        "operations": len(latencies),
+        "thread_phase_s": round(thread_elapsed, 2),
+        "async_phase_s": round(async_elapsed, 2),
+        "ops_per_s": round(len(latencies) / (thread_elapsed + async_elapsed), 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        "locked_errors": errors["locked"],
+        "other_errors": errors["other"],
+        "connections_checked_out": checked_out,
+    }
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if errors["locked"] or errors["other"] or checked_out else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,19 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import json
+import time
 
 API_URL = "http://127.0.0.1:8000"
 
+# (connect, read) timeouts in seconds
+TIMEOUT = (3.05, 30)
+UPLOAD_TIMEOUT = (3.05, 300)
+QUERY_TIMEOUT = (3.05, 120)
+LIST_TTL_SECONDS = 30
+JOB_POLL_SECONDS = 1.0
+
 st.set_page_config(page_title="ChatZ", layout="wide")
 st.title("📚 ChatZ – PDF AI Assistant")
 
@@ -13,6 +24,68 @@ if "extracted" not in st.session_state:
     st.session_state.extracted = False
 if "embeddings_done" not in st.session_state:
     st.session_state.embeddings_done = False
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}  # kind -> job_id of this file's latest job
+
+# ----------------------------
+# HTTP CLIENT
+# ----------------------------
+
+@st.cache_resource
+def get_session():
+    """One pooled session shared by every rerun; idempotent GETs retry on 502/503/504."""
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+    return session
+
+
+def api(method, path, timeout=TIMEOUT, **kwargs):
+    return get_session().request(method, f"{API_URL}{path}", timeout=timeout, **kwargs)
+
+
+@st.cache_data(ttl=LIST_TTL_SECONDS, show_spinner=False)
+def fetch_file_page(params):
+    """One page of /upload/list_files; cached so idle reruns don't hit the backend."""
+    resp = api("GET", "/upload/list_files", params=params)
+    resp.raise_for_status()  # errors are not cached
+    return resp.json()
+
+
+def submit_job(fid, kind):
+    resp = api("POST", f"/jobs/{fid}", params={"kind": kind})
+    resp.raise_for_status()
+    job = resp.json()
+    st.session_state.jobs[kind] = job["job_id"]
+    return job
+
+
+def poll_job(job_id, label):
+    """Shows a progress bar until the job finishes; returns the final job."""
+    bar = st.progress(0.0, text=label)
+    while True:
+        try:
+            resp = api("GET", f"/jobs/{job_id}")
+            resp.raise_for_status()
+            job = resp.json()
+        except requests.RequestException as e:
+            bar.empty()
+            return {"status": "failed", "error": f"Lost contact with the server: {e}"}
+
+        if job["chunks_total"]:
+            done, total, unit = job["chunks_done"] or 0, job["chunks_total"], "chunks embedded"
+        elif job["pages_total"]:
+            done, total, unit = job["pages_done"] or 0, job["pages_total"], "pages extracted"
+        else:
+            done, total, unit = 0, 0, job["status"]
+        fraction = min(1.0, done / total) if total else 0.0
+        bar.progress(fraction, text=f"{label} {done}/{total} {unit}" if total else f"{label} {unit}")
+
+        if job["status"] not in ("queued", "running"):
+            bar.empty()
+            return job
+        time.sleep(JOB_POLL_SECONDS)
 
 # ----------------------------
 # ACCESS CONTROL
@@ -63,18 +136,50 @@ restrict(page)
 if page == "Upload":
     st.header("📤 Upload PDF")
 
-    # ---- Fetch existing uploaded PDFs from DB ----
+    # ---- Fetch existing uploaded PDFs from DB (one page at a time) ----
+    if "list_cursors" not in st.session_state:
+        st.session_state.list_cursors = [None]  # cursor of every page seen so far
+
+    col_name, col_status = st.columns(2)
+    name_prefix = col_name.text_input("Filter by name prefix")
+    status_label = col_status.selectbox("Status", ["All", "Embedded", "Pending"])
+
+    params = {"limit": 50}
+    if name_prefix:
+        params["name_prefix"] = name_prefix
+    if status_label != "All":
+        params["status"] = status_label.lower()
+
+    # filters changed → back to the first page
+    if st.session_state.get("list_params") != params:
+        st.session_state.list_params = params
+        st.session_state.list_cursors = [None]
+
+    cursor = st.session_state.list_cursors[-1]
+    next_cursor = None
     try:
-        list_resp = requests.get(f"{API_URL}/upload/list_files")
-        if list_resp.status_code == 200:
-            pdf_files = list_resp.json()
-        else:
-            pdf_files = []
-            st.warning("Could not load existing files.")
-    except:
+        listing = fetch_file_page({**params, **({"cursor": cursor} if cursor else {})})
+        pdf_files = listing["items"]
+        next_cursor = listing["next_cursor"]
+    except requests.HTTPError:
+        pdf_files = []
+        st.warning("Could not load existing files.")
+    except requests.RequestException:
         pdf_files = []
         st.warning("Server not reachable.")
 
+    if st.button("🔄 Refresh list"):
+        fetch_file_page.clear()
+        st.rerun()
+
+    col_prev, col_next = st.columns(2)
+    if len(st.session_state.list_cursors) > 1 and col_prev.button("⬅️ Previous page"):
+        st.session_state.list_cursors.pop()
+        st.rerun()
+    if next_cursor and col_next.button("Next page ➡️"):
+        st.session_state.list_cursors.append(next_cursor)
+        st.rerun()
+
     # ---- Show dropdown of uploaded PDFs ----
     st.subheader("📂 Existing Uploaded PDFs")
 
@@ -104,15 +209,21 @@ if page == "Upload":
     if uploaded and st.button("Upload File"):
         with st.spinner("⏳ Uploading your file... Please wait"):
             files = {"file": uploaded}
-            resp = requests.post(f"{API_URL}/upload/upload_file", files=files)
+            try:
+                resp = api("POST", "/upload/upload_file", timeout=UPLOAD_TIMEOUT, files=files)
+            except requests.RequestException as e:
+                st.error(f"Upload failed: {e}")
+                st.stop()
 
         if resp.status_code == 200:
             data = resp.json()
+            fetch_file_page.clear()  # the new file belongs in the list
 
             st.session_state.file_id = data["file_id"]
             st.session_state.file_name = data["file_name"]
             st.session_state.embeddings_done = data["embedding_status"]
             st.session_state.extracted = False
+            st.session_state.jobs = {}
 
             if st.session_state.embeddings_done:
                 st.success("🎉 File exists and embeddings already available. Go to Query!")
@@ -128,18 +239,22 @@ if page == "Upload":
 elif page == "Extract":
     st.header("📑 Extract Text")
 
+    fid = st.session_state.file_id
+    # runs as a background job; a job still running from an earlier visit is resumed
+    job_id = st.session_state.jobs.get("extract")
     if st.button("Extract Text"):
-        with st.spinner("⏳ Extracting text... Please wait"):
-            fid = st.session_state.file_id
-            resp = requests.get(f"{API_URL}/extract/{fid}")
-
-        if resp.status_code == 200:
-            data = resp.json()
-            st.success("Text extracted!")
-            st.text_area("Preview", data["preview_text"])
+        try:
+            job_id = submit_job(fid, "extract")["job_id"]
+        except requests.RequestException as e:
+            st.error(f"Could not start extraction: {e}")
+
+    if job_id:
+        job = poll_job(job_id, "⏳ Extracting text...")
+        if job["status"] == "done":
+            st.success(f"Text extracted! ({job['pages_total']} pages)")
             st.session_state.extracted = True
         else:
-            st.error(resp.text)
+            st.error(job["error"] or "Extraction failed.")
 
 # ----------------------------
 # PAGE: EMBED
@@ -150,16 +265,22 @@ elif page == "Embed":
     if not st.session_state.extracted:
         st.warning("Extract text first!")
     else:
+        fid = st.session_state.file_id
+        job_id = st.session_state.jobs.get("embed")
         if st.button("Create Embeddings"):
-            with st.spinner("⏳ Creating AI embeddings... Please wait"):
-                fid = st.session_state.file_id
-                resp = requests.post(f"{API_URL}/embed/{fid}")
-
-            if resp.status_code == 200:
+            try:
+                job_id = submit_job(fid, "embed")["job_id"]
+            except requests.RequestException as e:
+                st.error(f"Could not start embedding: {e}")
+
+        if job_id:
+            job = poll_job(job_id, "⏳ Creating AI embeddings...")
+            if job["status"] == "done":
                 st.success("Embeddings created!")
                 st.session_state.embeddings_done = True
+                fetch_file_page.clear()  # embedding status changed
             else:
-                st.error(resp.text)
+                st.error(job["error"] or "Embedding failed.")
 
 
 # ----------------------------
@@ -169,15 +290,63 @@ elif page == "Query":
     st.header("💬 Ask Questions")
 
     q = st.text_input("Your question:")
+    stream_answer = st.checkbox("Stream answer", value=True)
 
     if st.button("Ask"):
-        with st.spinner("⏳ Thinking... generating answer"):
-            fid = st.session_state.file_id
-            resp = requests.post(f"{API_URL}/query/", json={"question": q, "file_id": fid})
-
-        if resp.status_code == 200:
-            data = resp.json()
-            st.success(data["answer"])
+        fid = st.session_state.file_id
+
+        if stream_answer:
+            answer_box = st.empty()
+            answer = ""
+            sources = []
+            error = None
+
+            with st.spinner("⏳ Thinking... generating answer"):
+                try:
+                    resp = api("POST", "/query/stream", timeout=QUERY_TIMEOUT,
+                               json={"question": q, "file_id": fid}, stream=True)
+                except requests.RequestException as e:
+                    st.error(f"Server not reachable: {e}")
+                    st.stop()
+
+            if resp.status_code != 200:
+                st.error(resp.text)
+            else:
+                # Server-sent events: "event: <name>" then "data: <json>"
+                event = None
+                for line in resp.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        payload = json.loads(line[len("data:"):])
+                        if event == "sources":
+                            sources = payload.get("sources", [])
+                        elif event == "token":
+                            answer += payload["text"]
+                            answer_box.success(answer + " ▌")
+                        elif event == "error":
+                            error = payload.get("detail")
+
+                if error:
+                    st.error(error)
+                else:
+                    answer_box.success(answer)
+
+                pages = sorted({s["page"] for s in sources if s.get("page")})
+                if pages:
+                    st.caption("Sources: page " + ", ".join(str(p) for p in pages))
 
         else:
-            st.error(resp.text)
+            with st.spinner("⏳ Thinking... generating answer"):
+                try:
+                    resp = api("POST", "/query/", timeout=QUERY_TIMEOUT, json={"question": q, "file_id": fid})
+                except requests.RequestException as e:
+                    st.error(f"Server not reachable: {e}")
+                    st.stop()
+
+            if resp.status_code == 200:
+                data = resp.json()
+                st.success(data["answer"])
+
+            else:
+                st.error(resp.text)